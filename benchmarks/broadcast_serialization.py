@@ -0,0 +1,88 @@
+"""
+Compares the per-recipient CPU cost of delivering one group broadcast when every
+recipient serializes and encodes the event itself (the previous handlers) with
+forwarding the frame the sender encoded once (MessageProtocolMixin.forward).
+
+Usage: python benchmarks/broadcast_serialization.py [--recipients N] [--rounds N]
+Run it from the project root with the same environment as manage.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wiperino.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework import serializers  # noqa: E402
+from playerhub.consumers import WipecounterConsumer  # noqa: E402
+
+PAYLOAD = {'type': 'wipe_update', 'segment_id': 42, 'count': 17, 'user': 'streamer'}
+
+
+class WipeUpdateBroadcastSerializer(serializers.Serializer):
+    """The DRF serializer every recipient used to run on a wipe_update event."""
+    type = serializers.ChoiceField(choices=['wipe_update'])
+    segment_id = serializers.IntegerField(min_value=1)
+    count = serializers.IntegerField(min_value=0)
+    user = serializers.CharField()
+
+
+class Recipient(WipecounterConsumer):
+    """
+    Dashboard consumer whose socket only counts the frames it is given. Its
+    handlers forward events directly; overlays queue them in an outbox first.
+    """
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        self.sent += 1
+
+
+async def deliver_serialized(recipients, event):
+    for recipient in recipients:
+        serializer = WipeUpdateBroadcastSerializer(instance=event)
+        await recipient.send(text_data=json.dumps(serializer.data))
+
+
+async def deliver_forwarded(recipients, event):
+    for recipient in recipients:
+        await recipient.wipe_update(event)
+
+
+async def measure(deliver, recipients, event, rounds):
+    started = time.process_time()
+    for _ in range(rounds):
+        await deliver(recipients, event)
+    return time.process_time() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--recipients', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    recipients = [Recipient() for _ in range(args.recipients)]
+    deliveries = args.recipients * args.rounds
+
+    before = await measure(deliver_serialized, recipients, PAYLOAD, args.rounds)
+
+    event = {'type': 'wipe_update', 'text': json.dumps(
+        WipeUpdateBroadcastSerializer(instance=PAYLOAD).data)}
+    after = await measure(deliver_forwarded, recipients, event, args.rounds)
+
+    for name, elapsed in [('serialize per recipient', before), ('encode once, forward', after)]:
+        print(f'{name:>24}: {elapsed / deliveries * 1e6:8.2f} us CPU per recipient')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
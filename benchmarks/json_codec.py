@@ -0,0 +1,61 @@
+"""
+Compares the JSON codec backends in playerhub.codec on payload shapes the
+application sends: a vote_update with 10 answers and a 500-segment timer list.
+
+Usage: python benchmarks/json_codec.py [--rounds N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playerhub import codec  # noqa: E402
+
+ANSWERS = [f'Answer number {index}' for index in range(1, 11)]
+VOTE_UPDATE = {
+    'type': 'vote',
+    'question_id': 'q-3f9a1c',
+    'answers': ANSWERS,
+    'votes': {answer: index * 37 for index, answer in enumerate(ANSWERS)},
+}
+TIMER_LIST = [
+    {
+        'id': index,
+        'run': 'Any% glitchless',
+        'segment_name': f'Segment {index}',
+        'elapsed_time': index * 61.375,
+        'is_finished': index % 3 == 0,
+    }
+    for index in range(1, 501)
+]
+
+
+def measure(function, payload, rounds):
+    started = time.process_time()
+    for _ in range(rounds):
+        function(payload)
+    return (time.process_time() - started) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    backends = [codec.StdlibBackend]
+    if codec.orjson is not None:
+        backends.append(codec.OrjsonBackend)
+
+    for payload_name, payload in [('vote_update', VOTE_UPDATE), ('timer list', TIMER_LIST)]:
+        encoded = codec.StdlibBackend.dumps(payload)
+        for backend in backends:
+            dumps = measure(backend.dumps, payload, args.rounds)
+            loads = measure(backend.loads, encoded, args.rounds)
+            print(f'{payload_name:>11} {backend.name:>6}: '
+                  f'dumps {dumps:9.2f} us, loads {loads:9.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares validating an inbound WebSocket message and building its broadcast with
+DRF serializers (the previous consumer code) and with playerhub.schemas.
+
+Usage: python benchmarks/message_validation.py [--messages N]
+Run it from the project root with the same environment as manage.py.
+"""
+import argparse
+import os
+from datetime import datetime, timezone
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wiperino.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework import serializers  # noqa: E402
+from playerhub import schemas  # noqa: E402
+
+MESSAGE = {'type': 'start_timer', 'segment_id': 3}
+
+# The segment state the timer engine returns for the action, see timer_engine.apply().
+STATE = {'segment_id': 3, 'elapsed_time': 12.5, 'is_finished': False,
+         'started_at': datetime(2025, 5, 1, 18, 30, tzinfo=timezone.utc)}
+
+
+class TimerStartSerializer(serializers.Serializer):
+    segment_id = serializers.IntegerField(min_value=1)
+    type = serializers.ChoiceField(choices=['start_timer'])
+
+
+class TimerBroadcastSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(
+        choices=['start_timer', 'timer_update', 'finish_timer', 'pause_timer', 'run_finished'])
+    segment_id = serializers.IntegerField(min_value=1, required=False)
+    segment_name = serializers.CharField(max_length=50, required=False)
+    elapsed_time = serializers.FloatField(min_value=0.0, required=False)
+    user = serializers.CharField()
+    started_at = serializers.DateTimeField(required=False, allow_null=True)
+    is_finished = serializers.BooleanField(default=False)
+
+
+def with_drf(message):
+    serializer = TimerStartSerializer(data=message)
+    serializer.is_valid()
+    payload = {'type': serializer.validated_data['type'], **STATE, 'user': 'streamer'}
+    return TimerBroadcastSerializer(instance=payload).data
+
+
+def with_schemas(message):
+    validated_data, _ = schemas.TIMER_START.validate(message)
+    payload = {'type': validated_data['type'], **STATE, 'user': 'streamer'}
+    return schemas.TIMER_BROADCAST.dump(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    assert dict(with_drf(MESSAGE)) == with_schemas(MESSAGE), 'Outputs differ'
+
+    for name, handle in [('DRF serializers', with_drf), ('compiled schemas', with_schemas)]:
+        started = time.process_time()
+        for _ in range(args.messages):
+            handle(MESSAGE)
+        elapsed = time.process_time() - started
+        print(f'{name:>16}: {elapsed / args.messages * 1e6:8.2f} us CPU per message')
+
+
+if __name__ == '__main__':
+    main()
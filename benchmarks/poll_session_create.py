@@ -0,0 +1,70 @@
+"""
+Compares poll session creation throughput of the previous layout (a JSON session
+blob and three token maps written with four separate SETs) with
+poll_store.create_session (one MULTI/EXEC pipeline and a session hash).
+
+Usage: python benchmarks/poll_session_create.py [--sessions N] [--redis-url URL]
+Run it against a throwaway Redis database; created keys are deleted afterwards.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+import redis
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playerhub import poll_store  # noqa: E402
+
+
+def session_tokens(session_id):
+    return {
+        'moderator': f'{session_id}-mod-{uuid.uuid4().hex[:6]}',
+        'viewer': f'{session_id}-viewer',
+        'overlay': f'{session_id}-overlay',
+    }
+
+
+def create_with_separate_sets(client, session_id, tokens):
+    session_data = {'session_id': session_id, 'published_question_id': None}
+    client.set(poll_store.session_key(session_id), json.dumps(session_data), ex=86400)
+    for token in tokens.values():
+        client.set(poll_store.token_map_key(token), session_id, ex=86400)
+
+
+def run(client, create, sessions):
+    created = []
+    started = time.perf_counter()
+    for _ in range(sessions):
+        session_id = f'bench-{uuid.uuid4().hex[:6]}'
+        tokens = session_tokens(session_id)
+        create(client, session_id, tokens)
+        created.append((session_id, tokens))
+    elapsed = time.perf_counter() - started
+
+    for session_id, tokens in created:
+        client.delete(poll_store.session_key(session_id),
+                      *(poll_store.token_map_key(token) for token in tokens.values()))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--redis-url', default=os.environ.get('REDIS_URL',
+                                                              'redis://127.0.0.1:6379/0'))
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    for name, create in [('separate SETs', create_with_separate_sets),
+                         ('pipelined hash', poll_store.create_session)]:
+        elapsed = run(client, create, args.sessions)
+        print(f'{name:>15}: {args.sessions / elapsed:10.0f} sessions/s '
+              f'({elapsed / args.sessions * 1000:.3f} ms per session)')
+
+
+if __name__ == '__main__':
+    main()
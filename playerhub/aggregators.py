@@ -0,0 +1,43 @@
+import asyncio
+from .protocol import sequenced_event
+
+
+class VoteAggregator:
+    """
+    Collects the latest vote tallies per poll question and broadcasts them
+    to the session group at most once per flush interval.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = {}
+        self._task = None
+
+    def add(self, channel_layer, group_name, message):
+        """
+        Queues a vote update for broadcasting. Updates for the same question
+        received before the next flush replace each other.
+        """
+        key = (group_name, message['question_id'])
+        queued = self._pending.get(key)
+        if queued and sum(queued[1]['votes'].values()) > sum(message['votes'].values()):
+            return
+
+        self._pending[key] = (channel_layer, message)
+
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Votes queued while a flush is broadcasting go out with the next one.
+        while self._pending:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        """Sends one vote_update per question queued since the previous flush."""
+        pending, self._pending = self._pending, {}
+        for (group_name, _), (channel_layer, message) in pending.items():
+            await channel_layer.group_send(
+                group_name, await sequenced_event(group_name, 'vote_update', message))
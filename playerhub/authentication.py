@@ -0,0 +1,13 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from . import revocation
+
+
+class RevocableJWTAuthentication(JWTAuthentication):
+    """JWT authentication that rejects tokens revoked before they expired, e.g. on logout."""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocation.is_revoked(token):
+            raise InvalidToken('Token is revoked')
+        return token
@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import OrderedDict
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from . import poll_store
+from .models import Run
+from .redis_client import sync_redis as r
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries expire after a time to live.
+    Safe to share between request threads and the consumers' event loop.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value, or None when it is missing or has expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores the value for at most `ttl` seconds, capped at the cache's own TTL.
+        The least recently used entry is evicted once the cache is full.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+token_sessions = TTLCache(settings.POLL_TOKEN_CACHE_SIZE, settings.POLL_TOKEN_CACHE_TTL)
+users = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+
+def _remaining_ttl(pttl):
+    # PTTL is -1 for keys without expiry; those are cached for the cache's own TTL.
+    return None if pttl < 0 else pttl / 1000
+
+
+def get_token_session(client, token):
+    """
+    Resolves a poll token to its session id with the sync Redis client.
+    Lookups are cached for no longer than the token mapping has left to live,
+    so expired sessions are not served from the cache. Unknown tokens are not cached.
+    """
+    session_id = token_sessions.get(token)
+    if session_id is not None:
+        return session_id
+
+    pipe = client.pipeline(transaction=False)
+    pipe.get(poll_store.token_map_key(token))
+    pipe.pttl(poll_store.token_map_key(token))
+    session_id, pttl = pipe.execute()
+    if session_id:
+        token_sessions.set(token, session_id, _remaining_ttl(pttl))
+    return session_id
+
+
+async def aget_token_session(client, token):
+    """Asyncio counterpart of get_token_session."""
+    session_id = token_sessions.get(token)
+    if session_id is not None:
+        return session_id
+
+    pipe = client.pipeline(transaction=False)
+    pipe.get(poll_store.token_map_key(token))
+    pipe.pttl(poll_store.token_map_key(token))
+    session_id, pttl = await pipe.execute()
+    if session_id:
+        token_sessions.set(token, session_id, _remaining_ttl(pttl))
+    return session_id
+
+
+def invalidate_user(user_id):
+    """Drops the cached user of WebSocket authentication, e.g. after the user was saved."""
+    users.delete(user_id)
+
+
+def run_owner_key(run_id):
+    return f'run:owner:{run_id}'
+
+
+def run_owner_generation_key(run_id):
+    return f'run:owner:{run_id}:generation'
+
+
+def _load_run_owner(run_id):
+    return Run.objects.filter(id=run_id).values_list('user_id', flat=True).first() or 0
+
+
+async def aget_run_owner(client, script, run_id):
+    """
+    Returns the id of the user owning a run, or None if the run does not exist.
+    Owners are cached in Redis for RUN_OWNER_CACHE_TTL seconds, so reconnecting
+    sockets are authorized without a query. `script` is SNAPSHOT_SET_SCRIPT
+    registered on the asyncio client: an owner is only cached if the run's
+    owner generation, which only Run saves and deletes bump, did not change
+    while it was read, so a transfer cannot be undone by a lookup that read
+    the previous owner.
+    """
+    key = run_owner_key(run_id)
+    pipe = client.pipeline(transaction=False)
+    pipe.get(key)
+    pipe.get(run_owner_generation_key(run_id))
+    owner, generation = await pipe.execute()
+    if owner is None:
+        owner = await database_sync_to_async(_load_run_owner)(run_id)
+        await script(
+            keys=[key, run_owner_generation_key(run_id)],
+            args=[generation or '0', owner, settings.RUN_OWNER_CACHE_TTL],
+        )
+    return int(owner) or None
+
+
+def _drop_run_owner(run_id):
+    pipe = r.pipeline(transaction=False)
+    pipe.incr(run_owner_generation_key(run_id))
+    # The generation must outlive any owner that could have been read against it.
+    pipe.expire(run_owner_generation_key(run_id), settings.RUN_OWNER_CACHE_TTL * 2)
+    pipe.delete(run_owner_key(run_id))
+    pipe.execute()
+
+
+def invalidate_run_owner(run_id):
+    """
+    Drops the cached owner of a run that was created, transferred or deleted,
+    again once the surrounding transaction commits.
+    """
+    _drop_run_owner(run_id)
+    transaction.on_commit(lambda: _drop_run_owner(run_id))
@@ -0,0 +1,66 @@
+"""
+JSON encoding for WebSocket frames, poll data stored in Redis and REST responses.
+
+The backend is chosen once, at startup, from the JSON_CODEC setting. 'orjson'
+uses orjson when it is installed and falls back to the standard library json
+module otherwise; 'stdlib' always uses the json module.
+"""
+import json
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DecodeError = json.JSONDecodeError
+
+
+class StdlibBackend:
+    name = 'stdlib'
+
+    @staticmethod
+    def dumps(obj, default=None):
+        return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':'))
+
+    @staticmethod
+    def dumpb(obj, default=None):
+        return StdlibBackend.dumps(obj, default).encode()
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+
+class OrjsonBackend:
+    name = 'orjson'
+
+    @staticmethod
+    def dumps(obj, default=None):
+        return OrjsonBackend.dumpb(obj, default).decode()
+
+    @staticmethod
+    def dumpb(obj, default=None):
+        # Validation errors of list fields are keyed by item index; like the json
+        # module, encode such keys as strings instead of rejecting them.
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+    @staticmethod
+    def loads(data):
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError.
+        return orjson.loads(data)
+
+
+def get_backend(name):
+    """Returns the backend for a JSON_CODEC value, falling back to the stdlib one."""
+    if name == 'orjson' and orjson is not None:
+        return OrjsonBackend
+    return StdlibBackend
+
+
+# Scripts such as the benchmarks import the poll storage without Django settings.
+backend = get_backend(settings.JSON_CODEC if settings.configured else 'orjson')
+
+dumps = backend.dumps
+dumpb = backend.dumpb
+loads = backend.loads
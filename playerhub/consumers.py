@@ -1,22 +1,221 @@
-import json
-import redis
+import uuid
+from urllib.parse import parse_qs
 from django.conf import settings
+from django.core import signing
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 import playerhub.serializers as ph_serializers
-from asgiref.sync import sync_to_async
+from playerhub import codec
+from playerhub import schemas
+from playerhub import poll_store
+from playerhub import streams
+from playerhub import timer_engine
+from playerhub.aggregators import VoteAggregator
+from playerhub.caches import aget_run_owner, aget_token_session
+from playerhub.outbox import CoalescingOutbox
+from playerhub.counters import (INCREMENT_PENDING_SCRIPT, aincrement_pending_count,
+                                apending_counts, aqueue_count, seed_pending_count)
+from playerhub.middleware import resolve_user
+from playerhub.protocol import MessageProtocolMixin, coalesce_key
+from playerhub.redis_client import get_redis, get_script
+from playerhub.run_snapshots import SNAPSHOT_SET_SCRIPT, aget_snapshot
+from playerhub.write_behind import (WriteBehindBuffer, finish_timer_run, finish_wipecounter_run,
+                                    write_timers, write_wipe_counters)
+
+vote_aggregator = VoteAggregator(settings.POLL_VOTE_FLUSH_INTERVAL)
+wipe_counter_buffer = WriteBehindBuffer(settings.WIPE_COUNT_FLUSH_INTERVAL, write_wipe_counters)
+timer_buffer = WriteBehindBuffer(settings.TIMER_FLUSH_INTERVAL, write_timers)
+voter_signer = signing.Signer(salt='playerhub.polls.voter')
+
+# Client roles encoded in poll tokens and the roles each poll event is delivered to.
+POLL_TOKEN_ROLES = {
+    '-mod': 'moderator',
+    '-viewer': 'viewer',
+    '-overlay': 'overlay',
+}
+POLL_EVENT_ROLES = {
+    'publish_question': ('moderator', 'overlay'),
+    'unpublish_question': ('moderator', 'overlay'),
+    'vote_update': ('overlay',),
+    'questions_diff': ('viewer',),
+    'delete_question': ('moderator', 'viewer'),
+}
+
+
+# Schemas of the messages clients send to the run consumers, and of the events broadcast for them.
+WIPECOUNTER_SCHEMAS = {
+    'wipe_update': schemas.WIPE_UPDATE,
+    'wipe_increment': schemas.WIPE_INCREMENT,
+    'new_segment': schemas.NEW_SEGMENT,
+    'segment_finished': schemas.SEGMENT_FINISHED,
+    'run_finished': schemas.RUN_FINISHED,
+}
+WIPECOUNTER_BROADCAST_SCHEMAS = {
+    'wipe_update': schemas.WIPE_UPDATE_BROADCAST,
+    'new_segment': schemas.NEW_SEGMENT_BROADCAST,
+    'segment_finished': schemas.SEGMENT_FINISHED_BROADCAST,
+    'run_finished': schemas.RUN_FINISHED_BROADCAST,
+}
+TIMER_SCHEMAS = {
+    'start_timer': schemas.TIMER_START,
+    'pause_timer': schemas.TIMER_PAUSE,
+    'finish_timer': schemas.TIMER_FINISH,
+    'run_finished': schemas.RUN_FINISHED,
+    'new_segment': schemas.NEW_TIMER_SEGMENT,
+}
+RUN_CHANNEL_SCHEMAS = {
+    'subscribe': schemas.STREAM_SUBSCRIBE,
+    'unsubscribe': schemas.STREAM_UNSUBSCRIBE,
+}
+# Groups and snapshot kinds of the run channel's run streams. The poll stream
+# follows the overlay group of the poll session whose token it was subscribed with.
+RUN_STREAM_GROUPS = {
+    'wipe': 'run_{run_id}',
+    'timer': 'timer_{run_id}',
+}
+RUN_STREAM_SNAPSHOTS = {
+    'wipe': 'wipecounters',
+    'timer': 'timers',
+}
+# Timer engine action applied for each timer message.
+TIMER_ACTIONS = {
+    'start_timer': timer_engine.START,
+    'pause_timer': timer_engine.PAUSE,
+    'finish_timer': timer_engine.FINISH,
+}
+
+
+def poll_group_name(session_id, role):
+    return f'poll_{session_id}_{role}'
+
+
+def poll_token_role(client_token):
+    """Returns the client role a poll token was issued for, or None."""
+    return next(
+        (role for marker, role in POLL_TOKEN_ROLES.items() if marker in client_token), None)
+
+
+async def published_question_message(session_id):
+    """
+    Returns the state a poll overlay renders: the session's published question,
+    or its unpublishing, numbered with the overlay group's current sequence number.
+    """
+    client = get_redis()
+    seq = await streams.current_seq(client, poll_group_name(session_id, 'overlay'))
+    question_id = await client.hget(poll_store.session_key(session_id), 'published_question_id')
+    question_data = (await poll_store.afetch_question(client, session_id, question_id)
+                     if question_id else None)
+    if question_data:
+        message = schemas.PUBLISHED_QUESTION.dump({
+            'type': 'publish_question',
+            'question_id': question_id,
+            'question_data': question_data
+        })
+    else:
+        message = schemas.UNPUBLISH_QUESTION.dump({'type': 'unpublish_question'})
+    return {**message, 'seq': seq}
+
+
+class RunSnapshotMixin:
+    """
+    Sends overlays the current state of their run as the first frame, so they
+    render without fetching it over HTTP and do not miss updates broadcast
+    between that fetch and joining the group. Overlays that reconnect with
+    ?since= are sent the events they missed instead, when those are still buffered.
+    """
+    snapshot_kind = None
+    outbox = None
 
-r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    def open_outbox(self):
+        """
+        Queues group events for this overlay, coalescing superseded ones.
+        An overlay that falls too far behind is sent a fresh snapshot instead.
+        """
+        self.outbox = CoalescingOutbox(
+            self.forward, settings.OVERLAY_OUTBOX_SIZE, self.send_run_snapshot)
 
+    def close_outbox(self):
+        if self.outbox is not None:
+            self.outbox.close()
 
-class WipecounterConsumer(AsyncWebsocketConsumer):
+    async def enqueue(self, event):
+        """Queues a group event for the overlay instead of sending it immediately."""
+        self.outbox.put(event, event.get('key'))
+
+    async def send_run_snapshot(self):
+        """
+        Sends the run snapshot numbered with the group's current sequence number,
+        which the client passes as ?since= when it reconnects.
+        """
+        snapshot = await self.build_run_snapshot(self.snapshot_kind, self.room_group_name)
+        if snapshot is None:
+            error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                'type': 'error',
+                'error': 'Run not found'
+            })
+            await self.send_message(error_serializer.data)
+            return
+        await self.send_message(snapshot)
+
+    async def build_run_snapshot(self, kind, group_name):
+        """
+        Returns the run snapshot of the given kind numbered with the current sequence
+        number of the group its events are broadcast to, or None if the run does not exist.
+        Wipe counter snapshots carry the counts that are not persisted yet,
+        and timer snapshots the live state of the timer engine.
+        """
+        client = get_redis()
+        seq = await streams.current_seq(client, group_name)
+        # Read before the snapshot, so a count flushed in between is in the snapshot.
+        counts = await apending_counts(client, self.run_id) if kind == 'wipecounters' else {}
+        snapshot = await aget_snapshot(client, get_script(SNAPSHOT_SET_SCRIPT), self.run_id, kind)
+        if snapshot is None:
+            return None
+        snapshot = codec.loads(snapshot)
+        for segment in snapshot['segments']:
+            if segment['id'] in counts:
+                segment['count'] = counts[segment['id']]
+        if kind == 'timers':
+            states = await timer_engine.run_state(client, self.run_id)
+            for segment in snapshot['segments']:
+                state = states.get(segment['id'])
+                if state is not None:
+                    segment.update(schemas.TIMER_SEGMENT_STATE.dump(state))
+                    del segment['segment_id']
+        return {**snapshot, 'seq': seq}
+
+
+class RunOwnerMixin:
+    """Authorizes the sockets of a run's dashboards, which only its owner may open."""
+
+    async def is_run_owner(self):
+        """
+        Returns whether the connected user owns the run, using the cached owner of the run.
+        Resolves scope['user'], which the rest of the consumer reads.
+        """
+        user = await resolve_user(self.scope)
+        if not user.is_authenticated:
+            return False
+        owner_id = await aget_run_owner(get_redis(), get_script(SNAPSHOT_SET_SCRIPT), self.run_id)
+        return owner_id == user.id
+
+
+class WipecounterConsumer(RunOwnerMixin, MessageProtocolMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for authenticated users interacting with wipe counter sessions.
     Handles segment updates, creation, finishing, and run finalization.
     """
 
     async def connect(self):
-        """Joins the user to a group based on the run ID."""
+        """
+        Joins the user to a group based on the run ID.
+        Sockets of users other than the run's owner are rejected before joining it.
+        """
         self.run_id = self.scope['url_route']['kwargs']['run_id']
+        if not await self.is_run_owner():
+            await self.close()
+            return
+
         self.room_group_name = f'run_{self.run_id}'
 
         await self.channel_layer.group_add(
@@ -24,102 +223,160 @@ class WipecounterConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        await self.accept()
+        await self.accept_client()
 
     async def disconnect(self, close_code):
-        """Leaves the group when the WebSocket connection is closed."""
+        """
+        Writes the run's queued wipe counts and leaves the group
+        when the WebSocket connection is closed.
+        """
         if hasattr(self, 'room_group_name'):
+            run_id = int(self.run_id)
+            await wipe_counter_buffer.flush(lambda key: key[0] == run_id)
             await self.channel_layer.group_discard(
                 self.room_group_name,
                 self.channel_name
             )
 
-
     async def receive(self, text_data=None, bytes_data=None):
         """
         Handles incoming messages from the client and dispatches them to the group.
         Supports wipe updates, segment creation, finishing segments, and finishing runs.
+        Wipe counts and finished states are persisted from here, see persist().
         """
         try:
-            data = json.loads(text_data)
-        except json.JSONDecodeError:
+            data = self.decode_message(text_data, bytes_data)
+        except ValueError:
             error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                 'type': 'error',
                 'error': 'Wrong JSON format'
             })
-            await self.send(text_data=json.dumps(error_serializer.data))
+            await self.send_message(error_serializer.data)
             return
 
         message_type = data.get('type')
 
-        serializer_map = {
-            'wipe_update': ph_serializers.WipeUpdateSerializer,
-            'new_segment': ph_serializers.NewSegmentSerializer,
-            'segment_finished': ph_serializers.SegmentFinishedSerializer,
-            'run_finished': ph_serializers.RunFinishedSerializer
-        }
-
-        serializer_class = serializer_map.get(message_type)
-        if not serializer_class:
+        schema = WIPECOUNTER_SCHEMAS.get(message_type)
+        if not schema:
             error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                 'type': 'error',
                 'error': 'Invalid message type'
             })
-            await self.send(text_data=json.dumps(error_serializer.data))
+            await self.send_message(error_serializer.data)
             return
 
-        serializer = serializer_class(data=data)
-        if not serializer.is_valid():
+        validated_data, errors = schema.validate(data)
+        if errors:
             error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                 'type': 'error',
-                'error': serializer.errors
+                'error': errors
             })
-            await self.send(text_data=json.dumps(error_serializer.data))
+            await self.send_message(error_serializer.data)
+            return
+
+        if message_type == 'wipe_increment':
+            await self.apply_increment(validated_data)
             return
 
-        validated_data = serializer.validated_data
+        await self.persist(message_type, validated_data)
+
         payload = {'type': message_type, **validated_data, 'user': self.scope['user'].username}
+        broadcast_schema = WIPECOUNTER_BROADCAST_SCHEMAS[message_type]
 
-        broadcast_serializer_map = {
-            'wipe_update': ph_serializers.WipeUpdateBroadcastSerializer,
-            'new_segment': ph_serializers.NewSegmentBroadcastSerializer,
-            'segment_finished': ph_serializers.SegmentFinishedBroadcastSerializer,
-            'run_finished': ph_serializers.RunFinishedBroadcastSerializer
-        }
+        await self.group_broadcast(self.room_group_name, message_type,
+                                   broadcast_schema.dump(payload),
+                                   key=coalesce_key(message_type, payload))
+
+    async def persist(self, message_type, data):
+        """
+        Queues wipe counts of the user's run for write-behind persistence, so a
+        click costs no database write of its own. Queued counts are recorded in
+        Redis, where snapshots built by any process pick them up. Finishing a segment or the run
+        writes the queued changes before the event is broadcast.
+        """
+        user = self.scope['user']
+        if not user.is_authenticated:
+            return
+
+        run_id = int(self.run_id)
+        if message_type == 'wipe_update':
+            await aqueue_count(get_redis(), run_id, data['segment_id'], data['count'])
+            wipe_counter_buffer.add((run_id, user.id, data['segment_id']), count=data['count'])
 
-        out_serializer_class = broadcast_serializer_map.get(message_type)
-        out_serializer = out_serializer_class(instance=payload)
+        elif message_type == 'segment_finished':
+            key = (run_id, user.id, data['segment_id'])
+            wipe_counter_buffer.add(key, is_finished=True)
+            await wipe_counter_buffer.flush(lambda queued: queued == key)
+
+        elif message_type == 'run_finished':
+            await wipe_counter_buffer.flush(lambda queued: queued[0] == run_id)
+            await database_sync_to_async(finish_wipecounter_run)(run_id, user.id)
+
+    async def apply_increment(self, data):
+        """
+        Applies a wipe count delta atomically to the segment's pending count in
+        Redis and broadcasts the resulting count as a wipe_update, so increments
+        sent at the same time are never lost. The count is persisted write-behind,
+        like absolute counts; only a segment without a pending count is read from
+        the database first.
+        """
+        user = self.scope['user']
+        run_id = int(self.run_id)
+        segment_id = data['segment_id']
+
+        count = None
+        if user.is_authenticated:
+            count = await aincrement_pending_count(
+                get_script(INCREMENT_PENDING_SCRIPT), run_id, segment_id, data['delta'])
+            if count is None:
+                count = await database_sync_to_async(seed_pending_count)(
+                    run_id, user.id, segment_id, data['delta'])
+            if count is not None:
+                wipe_counter_buffer.add((run_id, user.id, segment_id), count=count)
+
+        if count is None:
+            error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                'type': 'error',
+                'error': 'Segment not found'
+            })
+            await self.send_message(error_serializer.data)
+            return
 
-        await self.channel_layer.group_send(self.room_group_name, out_serializer.data)
+        payload = {'type': 'wipe_update', 'segment_id': segment_id, 'count': count,
+                   'user': user.username}
+        await self.group_broadcast(self.room_group_name, 'wipe_update',
+                                   schemas.WIPE_UPDATE_BROADCAST.dump(payload),
+                                   key=coalesce_key('wipe_update', payload))
 
     async def wipe_update(self, event):
         """Broadcasts a wipe counter update to all group members."""
-        serializer = ph_serializers.WipeUpdateBroadcastSerializer(instance=event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
     async def new_segment(self, event):
         """Broadcasts a new segment to all group members."""
-        serializer = ph_serializers.NewSegmentBroadcastSerializer(instance=event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
     async def segment_finished(self, event):
         """Broadcasts that a segment has been marked as finished."""
-        serializer = ph_serializers.SegmentFinishedBroadcastSerializer(instance=event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
     async def run_finished(self, event):
         """Broadcasts that the entire run has been finished."""
-        serializer = ph_serializers.RunFinishedBroadcastSerializer(instance=event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
 
-class OverlayConsumer(AsyncWebsocketConsumer):
+class OverlayConsumer(RunSnapshotMixin, MessageProtocolMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for public overlays (no authentication).
     Receives and broadcasts updates for OBS overlays in real time.
     """
+    snapshot_kind = 'wipecounters'
+
     async def connect(self):
-        """Joins a group based on run ID for receiving real-time updates."""
+        """
+        Joins a group based on run ID for receiving real-time updates,
+        then sends the run's wipe counters or the events missed since ?since=.
+        """
         self.run_id = self.scope['url_route']['kwargs']['run_id']
         self.room_group_name = f'run_{self.run_id}'
 
@@ -128,10 +385,14 @@ class OverlayConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        await self.accept()
+        await self.accept_client()
+        if not await self.replay_events(self.room_group_name):
+            await self.send_run_snapshot()
+        self.open_outbox()
 
     async def disconnect(self, close_code):
         """Leaves the group when the WebSocket connection is closed."""
+        self.close_outbox()
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
@@ -139,47 +400,88 @@ class OverlayConsumer(AsyncWebsocketConsumer):
 
     async def wipe_update(self, event):
         """Sends wipe count updates to the overlay client."""
-        serializer = ph_serializers.WipeUpdateBroadcastSerializer(instance=event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.enqueue(event)
 
     async def new_segment(self, event):
         """Sends new segment data to the overlay client."""
-        serializer = ph_serializers.NewSegmentBroadcastSerializer(instance=event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.enqueue(event)
 
     async def segment_finished(self, event):
         """Sends notification that a segment is finished."""
-        serializer = ph_serializers.SegmentFinishedBroadcastSerializer(instance=event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.enqueue(event)
 
     async def run_finished(self, event):
         """Sends notification that the run has ended."""
-        serializer = ph_serializers.RunFinishedBroadcastSerializer(instance=event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.enqueue(event)
 
 
-class PollConsumer(AsyncWebsocketConsumer):
+class PollConsumer(MessageProtocolMixin, AsyncWebsocketConsumer):
     """
     Websocket consumer for users interacting with poll sessions.
     Receives and broadcasts updates for poll questions in real time.
     """
     async def connect(self):
-        """Joins a group based on poll session ID for receiving real-time updates."""
+        """
+        Joins the group of the client's role within the poll session,
+        so it only receives the events that role renders.
+        """
         self.client_token = self.scope['url_route']['kwargs']['client_token']
-        self.session_id = r.get(f'poll:token_map:{self.client_token}')
+        self.session_id = await aget_token_session(get_redis(), self.client_token)
+        self.role = poll_token_role(self.client_token)
 
-        if not self.session_id:
+        if not self.session_id or not self.role:
             await self.close()
             return
 
-        self.room_group_name = f'poll_{self.session_id}'
+        self.room_group_name = poll_group_name(self.session_id, self.role)
 
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
 
-        await self.accept()
+        await self.accept_client()
+
+        if self.role == 'viewer':
+            self.voter_id = self.get_voter_id()
+            if self.voter_id is None:
+                self.voter_id = uuid.uuid4().hex[:12]
+                await self.send_message(schemas.VOTER_IDENTITY.dump({
+                    'type': 'voter_identity',
+                    'voter_token': voter_signer.sign(self.voter_id)
+                }))
+
+        if self.get_since() is not None and not await self.replay_events(self.room_group_name):
+            await self.send_resync()
+
+    async def send_resync(self):
+        """
+        Tells a client that missed more events than the replay buffer holds
+        to reload its state. Overlays only render the published question,
+        so they are sent that question, or its unpublishing, instead.
+        """
+        if self.role != 'overlay':
+            seq = await streams.current_seq(get_redis(), self.room_group_name)
+            await self.send_message(schemas.RESYNC.dump({'type': 'resync', 'seq': seq}))
+            return
+        await self.send_message(await published_question_message(self.session_id))
+
+    def get_voter_id(self):
+        """
+        Returns the voter id from the signed 'voter' query parameter
+        issued on a previous connection, or None if it is missing or forged.
+        The id identifies a browser, not a person: a viewer who reconnects
+        without it, e.g. from a private window, is issued a new id and can
+        vote again. It only keeps page reloads from granting extra votes.
+        """
+        query_string = parse_qs(self.scope['query_string'].decode())
+        voter_token = query_string.get('voter', [None])[0]
+        if not voter_token:
+            return None
+        try:
+            return voter_signer.unsign(voter_token)
+        except signing.BadSignature:
+            return None
 
     async def disconnect(self, close_code):
         """Leaves the group when the WebSocket connection is closed."""
@@ -195,263 +497,288 @@ class PollConsumer(AsyncWebsocketConsumer):
         Supports publishing a question and unpublishing a question to OBS overlay and votes view.
         """
         try:
-            data = json.loads(text_data)
-        except json.JSONDecodeError:
+            data = self.decode_message(text_data, bytes_data)
+        except ValueError:
             error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                 'type': 'error',
                 'error': 'Wrong JSON format'
             })
-            await self.send(text_data=json.dumps(error_serializer.data))
+            await self.send_message(error_serializer.data)
             return
 
         message_type = data.get('type')
 
         if (message_type in ['publish_question', 'unpublish_question']
-                and '-mod' not in self.client_token):
+                and self.role != 'moderator'):
             serializer = ph_serializers.WebSocketErrorSerializer({
                 'type': 'error',
                 'error': 'Only moderators can perform this action'
             })
-            await self.send(text_data=json.dumps(serializer.data))
+            await self.send_message(serializer.data)
+            return
+
+        if message_type == 'vote' and self.role != 'viewer':
+            serializer = ph_serializers.WebSocketErrorSerializer({
+                'type': 'error',
+                'error': 'Only viewers can vote'
+            })
+            await self.send_message(serializer.data)
             return
 
         if data.get('type') == 'publish_question':
             question_id = data['question_id']
-            redis_key = f'poll:question:{question_id}'
 
-            question_data_raw = await sync_to_async(r.get)(redis_key)
-            if not question_data_raw:
-                serializer = ph_serializers.WebSocketErrorSerializer({
-                    'type': 'error',
-                    'error': 'Question not found'
-                })
-                await self.send(text_data=json.dumps(serializer.data))
-                return
-
-            question_data = json.loads(question_data_raw)
-
-            if 'votes' not in question_data:
-                question_data['votes'] = {answer: 0 for answer in question_data['answers']}
+            question_data = await poll_store.afetch_question(
+                get_redis(), self.session_id, question_id)
 
             if not question_data:
                 serializer = ph_serializers.WebSocketErrorSerializer({
                     'type': 'error',
                     'error': 'Question not found'
                 })
-                await self.send(text_data=json.dumps(serializer.data))
+                await self.send_message(serializer.data)
                 return
 
-            session_key = f'poll:session:{self.session_id}'
-            session_data_raw = await sync_to_async(r.get)(session_key)
-            if not session_data_raw:
+            session_updated = await get_script(poll_store.SESSION_SET_SCRIPT)(
+                keys=[poll_store.session_key(self.session_id)],
+                args=['published_question_id', question_id])
+            if not session_updated:
                 serializer = ph_serializers.WebSocketErrorSerializer({
                     'type': 'error',
                     'error': 'Session not found'
                 })
-                await self.send(text_data=json.dumps(serializer.data))
+                await self.send_message(serializer.data)
                 return
 
-            session_data = json.loads(session_data_raw)
-            session_data['published_question_id'] = question_id
-            await sync_to_async(r.set)(session_key, json.dumps(session_data), ex=86400)
-
             message_payload = {
                 'type': 'publish_question',
                 'question_id': question_id,
                 'question_data': question_data
             }
 
-            serializer = ph_serializers.PublishedQuestionSerializer(data=message_payload)
-
-            if not serializer.is_valid():
+            validated_data, errors = schemas.PUBLISHED_QUESTION.validate(message_payload)
+            if errors:
                 error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                     'type': 'error',
-                    'error': serializer.errors
+                    'error': errors
                 })
-                await self.send(text_data=json.dumps(error_serializer.data))
+                await self.send_message(error_serializer.data)
                 return
 
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'publish_question',
-                    'message': serializer.data
-                }
-            )
+            await self.broadcast('publish_question',
+                                 schemas.PUBLISHED_QUESTION.dump(validated_data))
 
         elif data.get('type') == 'unpublish_question':
-            session_key = f'poll:session:{self.session_id}'
-            session_data_raw = await sync_to_async(r.get)(session_key)
-            if not session_data_raw:
+            session_updated = await get_script(poll_store.SESSION_SET_SCRIPT)(
+                keys=[poll_store.session_key(self.session_id)],
+                args=['published_question_id', ''])
+            if not session_updated:
                 serializer = ph_serializers.WebSocketErrorSerializer({
                     'type': 'error',
                     'error': 'Session not found'
                 })
-                await self.send(text_data=json.dumps(serializer.data))
+                await self.send_message(serializer.data)
                 return
 
-            session_data = json.loads(session_data_raw)
-            session_data['published_question_id'] = None
-            await sync_to_async(r.set)(session_key, json.dumps(session_data), ex=86400)
-
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'unpublish_question',
-                }
-            )
+            await self.broadcast('unpublish_question',
+                                 schemas.UNPUBLISH_QUESTION.dump({'type': 'unpublish_question'}))
 
         elif data.get('type') == 'vote':
-            serializer = ph_serializers.PollVoteSerializer(data=data)
-            if not serializer.is_valid():
+            validated_data, errors = schemas.POLL_VOTE.validate(data)
+            if errors:
                 error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                     'type': 'error',
-                    'error': serializer.errors
+                    'error': errors
                 })
 
-                await self.send(text_data=json.dumps(error_serializer.data))
+                await self.send_message(error_serializer.data)
                 return
 
-            validated_data = serializer.validated_data
             question_id = validated_data['question_id']
             answer = validated_data['answer']
 
-            question_data_raw = await sync_to_async(r.get)(f'poll:question:{question_id}')
+            result = await get_script(poll_store.VOTE_SCRIPT)(
+                keys=poll_store.vote_keys(self.session_id, question_id),
+                args=[question_id, answer, self.voter_id])
+            vote_status, answers, votes = poll_store.parse_vote_result(result)
 
-            if not question_data_raw:
+            if vote_status == poll_store.VOTE_QUESTION_NOT_FOUND:
                 serializer = ph_serializers.WebSocketErrorSerializer({
                     'type': 'error',
                     'error': 'Question not found'
                 })
-                await self.send(text_data=json.dumps(serializer.data))
+                await self.send_message(serializer.data)
                 return
 
-            question = json.loads(question_data_raw)
-
-            if answer not in question.get('answers', []):
+            if vote_status == poll_store.VOTE_ANSWER_NOT_FOUND:
                 serializer = ph_serializers.WebSocketErrorSerializer({
                     'type': 'error',
                     'error': 'Answer not found'
                 })
-                await self.send(text_data=json.dumps(serializer.data))
+                await self.send_message(serializer.data)
                 return
 
-            question['votes'][answer] += 1
-
-            await sync_to_async(r.set)(f'poll:question:{question_id}',
-                                       json.dumps(question),
-                                       ex=86400)
+            if vote_status == poll_store.VOTE_ALREADY_CAST:
+                serializer = ph_serializers.WebSocketErrorSerializer({
+                    'type': 'error',
+                    'error': 'You have already voted for this question'
+                })
+                await self.send_message(serializer.data)
+                return
 
             vote_data = {
                 'type': 'vote',
                 'question_id': question_id,
-                'answers': question['answers'],
-                'votes': question['votes']
+                'answers': answers,
+                'votes': votes
             }
 
-            out_serializer = ph_serializers.VoteUpdateSerializer(data=vote_data)
-            if not out_serializer.is_valid():
+            validated_data, errors = schemas.VOTE_UPDATE.validate(vote_data)
+            if errors:
                 error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                     'type': 'error',
-                    'error': out_serializer.errors
+                    'error': errors
                 })
-                await self.send(text_data=json.dumps(error_serializer.data))
+                await self.send_message(error_serializer.data)
                 return
 
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'vote_update',
-                    'message': out_serializer.data
-                }
-            )
+            vote_update = schemas.VOTE_UPDATE.dump(validated_data)
+            await self.send_message(vote_update)
+            if vote_status == poll_store.VOTE_UNCHANGED:
+                return
+
+            for role in POLL_EVENT_ROLES['vote_update']:
+                vote_aggregator.add(self.channel_layer,
+                                    poll_group_name(self.session_id, role),
+                                    vote_update)
+
+        elif data.get('type') == 'sync_questions' and self.role == 'moderator':
+            questions = await poll_store.afetch_questions(get_redis(), self.session_id)
+            version = max((question.get('version', 0) for question in questions), default=0)
 
-        elif data.get('type') == 'sync_questions' and '-mod' in self.client_token:
-            questions_ids = r.lrange(f'poll:session:{self.session_id}:questions', 0, -1)
-            for qid in questions_ids:
-                q_raw = r.get(f'poll:question:{qid}')
-                if not q_raw:
-                    error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
-                        'type': 'error',
-                        'error': 'Question not found'
-                    })
-                    await self.send(text_data=json.dumps(error_serializer.data))
-                    return
-
-                question = json.loads(q_raw)
-
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'new_question',
-                        'message': {
-                            'type': 'new_question',
-                            'question': question
-                        }
-                    }
-                )
-
-        elif data.get('type') == 'delete_question' and '-mod' in self.client_token:
-            serializer = ph_serializers.DeleteQuestionSerializer(data={
+            snapshot = schemas.QUESTIONS_SNAPSHOT.dump({
+                'type': 'questions_snapshot',
+                'version': version,
+                'questions': questions
+            })
+            await self.send_message(snapshot)
+
+            previous_version = await get_script(poll_store.SYNC_CURSOR_SCRIPT)(
+                keys=[poll_store.session_key(self.session_id),
+                      poll_store.session_synced_version_key(self.session_id)],
+                args=[poll_store.session_ttl_arg(), version])
+            added = [q for q in questions if q.get('version', 0) > previous_version]
+            if added:
+                await self.broadcast('questions_diff', schemas.QUESTIONS_DIFF.dump({
+                    'type': 'questions_diff',
+                    'since': previous_version,
+                    'version': version,
+                    'questions': added
+                }))
+
+        elif data.get('type') == 'delete_question' and self.role == 'moderator':
+            validated_data, errors = schemas.DELETE_QUESTION.validate({
                 'type': 'delete_question',
                 'question_id': data.get('question_id')
             })
-            if not serializer.is_valid():
+            if errors:
                 error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                     'type': 'error',
-                    'error': serializer.errors
+                    'error': errors
                 })
-                await self.send(text_data=json.dumps(error_serializer.data))
+                await self.send_message(error_serializer.data)
                 return
 
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'delete_question',
-                    'message': serializer.data
-                }
-            )
+            await self.broadcast('delete_question', schemas.DELETE_QUESTION.dump(validated_data))
+
+    async def broadcast(self, event_type, data):
+        """Sends the event to the groups of every role that renders it."""
+        for role in POLL_EVENT_ROLES[event_type]:
+            await self.group_broadcast(poll_group_name(self.session_id, role), event_type, data)
 
     async def publish_question(self, event):
         """Broadcasts a publishing trigger for a question to all group members."""
-        serializer = ph_serializers.PublishedQuestionSerializer(event['message'])
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
     async def unpublish_question(self, event):
         """Broadcasts an unpublishing trigger for a question to all group members."""
-        serializer = ph_serializers.UnpublishQuestionSerializer({'type': 'unpublish_question'})
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
     async def vote_update(self, event):
         """Broadcasts a vote update for a question to all group members."""
-        serializer = ph_serializers.VoteUpdateSerializer(event['message'])
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
-    async def new_question(self, event):
-        """Broadcasts a new question to all group members."""
-        serializer = ph_serializers.NewQuestionSerializer(event['message'])
-        await self.send(text_data=json.dumps(serializer.data))
+    async def questions_diff(self, event):
+        """Broadcasts questions added since the previous sync to all group members."""
+        await self.forward(event)
 
     async def delete_question(self, event):
         """Broadcasts a delete question to all group members."""
-        serializer = ph_serializers.DeleteQuestionSerializer(event['message'])
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
+
+
+class ClockSyncMixin:
+    """
+    Answers clock_sync messages with the time of the clock timers are stamped
+    with. Clients estimate their offset to it from the round trip and render
+    running timers from their start timestamp, without per-tick messages.
+    """
+
+    async def reply_clock_sync(self, data):
+        validated_data, errors = schemas.CLOCK_SYNC.validate(data)
+        if errors:
+            error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                'type': 'error',
+                'error': errors
+            })
+            await self.send_message(error_serializer.data)
+            return
+        await self.send_message(schemas.CLOCK_SYNC_REPLY.dump({
+            **validated_data,
+            'server_time': await timer_engine.server_time(get_redis()),
+        }))
 
 
-class TimerConsumer(AsyncWebsocketConsumer):
+class TimerConsumer(RunOwnerMixin, ClockSyncMixin, MessageProtocolMixin, AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for the runner's speedrun timers. Start, pause and
+    finish are applied by the timer engine at the server's time and broadcast
+    with the resulting state, so every client renders the same timer.
+    Stopped times are persisted from here through a write-behind buffer.
+    """
+
     async def connect(self):
-        """Joins a group based on timer ID for receiving real-time updates."""
+        """
+        Joins a group based on timer ID for receiving real-time updates,
+        then sends the state of the run's timers.
+        Sockets of users other than the run's owner are rejected before joining it.
+        """
         self.run_id = self.scope['url_route']['kwargs']['run_id']
+        if not await self.is_run_owner():
+            await self.close()
+            return
+
         self.room_group_name = f'timer_{self.run_id}'
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
-        await self.accept()
+        await self.accept_client()
+
+        states = await timer_engine.run_state(get_redis(), self.run_id)
+        await self.send_message(schemas.TIMER_STATE.dump({
+            'type': 'timer_state',
+            'segments': list(states.values()),
+        }))
 
     async def disconnect(self, close_code):
-        """Leaves the group when the WebSocket connection is closed."""
+        """
+        Writes the run's queued timer changes and leaves the group
+        when the WebSocket connection is closed.
+        """
         if hasattr(self, 'room_group_name'):
+            run_id = int(self.run_id)
+            await timer_buffer.flush(lambda key: key[0] == run_id)
             await self.channel_layer.group_discard(
                 self.room_group_name,
                 self.channel_name
@@ -464,44 +791,45 @@ class TimerConsumer(AsyncWebsocketConsumer):
         to all group members using a broadcast serializer.
         """
         try:
-            data = json.loads(text_data)
-        except json.JSONDecodeError:
+            data = self.decode_message(text_data, bytes_data)
+        except ValueError:
             error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                 'type': 'error',
                 'error': 'Invalid JSON format'
             })
-            await self.send(text_data=json.dumps(error_serializer.data))
+            await self.send_message(error_serializer.data)
             return
 
         message_type = data.get('type')
 
-        input_serializer_map = {
-            'start_timer': ph_serializers.TimerStartSerializer,
-            'pause_timer': ph_serializers.TimerPauseSerializer,
-            'finish_timer': ph_serializers.TimerFinishSerializer,
-            'run_finished': ph_serializers.RunFinishedSerializer,
-            'new_segment': ph_serializers.NewTimerSegmentSerializer,
-        }
+        if message_type == 'clock_sync':
+            await self.reply_clock_sync(data)
+            return
 
-        serializer_class = input_serializer_map.get(message_type)
-        if not serializer_class:
+        schema = TIMER_SCHEMAS.get(message_type)
+        if not schema:
             error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                 'type': 'error',
                 'error': 'Invalid message type'
             })
-            await self.send(text_data=json.dumps(error_serializer.data))
+            await self.send_message(error_serializer.data)
             return
 
-        serializer = serializer_class(data=data)
-        if not serializer.is_valid():
+        validated_data, errors = schema.validate(data)
+        if errors:
             error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
                 'type': 'error',
-                'error': serializer.errors
+                'error': errors
             })
-            await self.send(text_data=json.dumps(error_serializer.data))
+            await self.send_message(error_serializer.data)
             return
 
-        validated_data = serializer.validated_data
+        if message_type in TIMER_ACTIONS:
+            await self.apply_timer_action(message_type, validated_data['segment_id'])
+            return
+
+        if message_type == 'run_finished':
+            await self.finish_timers()
 
         payload = {
             'type': message_type,
@@ -510,89 +838,347 @@ class TimerConsumer(AsyncWebsocketConsumer):
         }
 
         if message_type == 'new_segment':
-            broadcast = ph_serializers.NewTimerSegmentSerializer(instance=payload)
+            broadcast = schemas.NEW_TIMER_SEGMENT.dump(payload)
         else:
-            broadcast = ph_serializers.TimerBroadcastSerializer(instance=payload)
+            broadcast = schemas.TIMER_BROADCAST.dump(payload)
 
-        await self.channel_layer.group_send(self.room_group_name, broadcast.data)
+        await self.group_broadcast(self.room_group_name, message_type, broadcast)
+
+    async def apply_timer_action(self, message_type, segment_id):
+        """
+        Starts, pauses or finishes a segment in the timer engine and broadcasts
+        its new state. The segment is loaded from the database the first time.
+        """
+        action = TIMER_ACTIONS[message_type]
+        script = get_script(timer_engine.TIMER_SCRIPT)
+        state = await timer_engine.apply(script, self.run_id, segment_id, action)
+        if state is None:
+            initial = await database_sync_to_async(timer_engine.load_segment)(
+                self.run_id, self.scope['user'].id, segment_id)
+            if initial is not None:
+                state = await timer_engine.apply(
+                    script, self.run_id, segment_id, action, initial)
+
+        if state is None or (action == timer_engine.START and state['is_finished']):
+            error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                'type': 'error',
+                'error': 'Segment not found' if state is None else 'Segment is finished'
+            })
+            await self.send_message(error_serializer.data)
+            return
+
+        if action != timer_engine.START:
+            self.persist(state)
+
+        payload = {'type': message_type, **state, 'user': self.scope['user'].username}
+        await self.group_broadcast(self.room_group_name, message_type,
+                                   schemas.TIMER_BROADCAST.dump(payload),
+                                   key=coalesce_key(message_type, payload))
+
+    async def finish_timers(self):
+        """
+        Stops and finishes the run's segments, broadcasting each one's final time,
+        and marks the run and all of its segments as finished in the database.
+        """
+        script = get_script(timer_engine.FINISH_RUN_SCRIPT)
+        for state in await timer_engine.finish_run(script, self.run_id):
+            self.persist(state)
+            payload = {'type': 'finish_timer', **state, 'user': self.scope['user'].username}
+            await self.group_broadcast(self.room_group_name, 'finish_timer',
+                                       schemas.TIMER_BROADCAST.dump(payload),
+                                       key=coalesce_key('finish_timer', payload))
+
+        user = self.scope['user']
+        if user.is_authenticated:
+            run_id = int(self.run_id)
+            await timer_buffer.flush(lambda key: key[0] == run_id)
+            await database_sync_to_async(finish_timer_run)(run_id, user.id)
+
+    def persist(self, state):
+        """
+        Queues the stopped time of a segment for write-behind persistence.
+        Changes to the same segment are merged until the next flush, which
+        writes every queued segment in one transaction.
+        """
+        user = self.scope['user']
+        if user.is_authenticated:
+            timer_buffer.add((int(self.run_id), user.id, state['segment_id']),
+                             elapsed_time=state['elapsed_time'],
+                             is_finished=state['is_finished'])
 
     async def start_timer(self, event):
         """
         Handles broadcasting of 'start_timer' events to the client.
         Used to synchronize timer start between dashboard and overlay.
         """
-        serializer = ph_serializers.TimerBroadcastSerializer(event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
     async def pause_timer(self, event):
         """
         Handles broadcasting of 'pause_timer' events to the client.
         Used to stop the live update of the timer and sync elapsed time.
         """
-        serializer = ph_serializers.TimerBroadcastSerializer(event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
     async def finish_timer(self, event):
         """
         Handles broadcasting of 'finish_timer' events to the client.
         Used to mark a timer segment as completed and stop updates.
         """
-        serializer = ph_serializers.TimerBroadcastSerializer(event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
     async def run_finished(self, event):
         """
         Handles broadcasting of 'run_finished' events to overlay or other clients.
         Signals that the run session has been completed.
         """
-        serializer = ph_serializers.TimerBroadcastSerializer(event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
 
     async def new_segment(self, event):
         """
         Broadcasts a newly added segment to all connected clients in the run group.
         Used to synchronize table updates between multiple views.
         """
-        serializer = ph_serializers.NewTimerSegmentSerializer(event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.forward(event)
+
 
+class OverlayTimerConsumer(RunSnapshotMixin, ClockSyncMixin, MessageProtocolMixin,
+                           AsyncWebsocketConsumer):
+    snapshot_kind = 'timers'
 
-class OverlayTimerConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        """Joins a group based on timer ID for receiving real-time updates."""
+        """
+        Joins a group based on timer ID for receiving real-time updates,
+        then sends the run's timer segments or the events missed since ?since=.
+        """
         self.run_id = self.scope['url_route']['kwargs']['run_id']
         self.room_group_name = f'timer_{self.run_id}'
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
-        await self.accept()
+        await self.accept_client()
+        if not await self.replay_events(self.room_group_name):
+            await self.send_run_snapshot()
+        self.open_outbox()
 
     async def disconnect(self, close_code):
         """
         Handles WebSocket disconnection and removes the client from the timer group.
         """
+        self.close_outbox()
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
 
+    async def receive(self, text_data=None, bytes_data=None):
+        """Answers clock_sync messages, the only messages overlays send."""
+        try:
+            data = self.decode_message(text_data, bytes_data)
+        except ValueError:
+            error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                'type': 'error',
+                'error': 'Invalid JSON format'
+            })
+            await self.send_message(error_serializer.data)
+            return
+
+        if data.get('type') != 'clock_sync':
+            error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                'type': 'error',
+                'error': 'Invalid message type'
+            })
+            await self.send_message(error_serializer.data)
+            return
+
+        await self.reply_clock_sync(data)
+
     async def start_timer(self, event):
-        serializer = ph_serializers.TimerBroadcastSerializer(event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.enqueue(event)
 
     async def pause_timer(self, event):
-        serializer = ph_serializers.TimerBroadcastSerializer(event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.enqueue(event)
 
     async def finish_timer(self, event):
-        serializer = ph_serializers.TimerBroadcastSerializer(event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.enqueue(event)
 
     async def new_segment(self, event):
-        serializer = ph_serializers.NewTimerSegmentSerializer(event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.enqueue(event)
 
     async def run_finished(self, event):
-        serializer = ph_serializers.TimerBroadcastSerializer(event)
-        await self.send(text_data=json.dumps(serializer.data))
+        await self.enqueue(event)
+
+
+class RunChannelConsumer(RunSnapshotMixin, ClockSyncMixin, MessageProtocolMixin,
+                         AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for public viewers that carries the wipe counter and timer
+    events of a run, and the events of a poll overlay, as sub-streams of one
+    connection. Clients subscribe to the streams they render instead of opening
+    a socket per overlay, and every message is sent as a [stream, message] pair.
+    """
+
+    async def connect(self):
+        """Accepts the connection. Streams are joined when the client subscribes to them."""
+        self.run_id = self.scope['url_route']['kwargs']['run_id']
+        self.stream_groups = {}
+        self.poll_session_id = None
+        await self.accept_client()
+        self.outbox = CoalescingOutbox(
+            self.send_stream_event, settings.OVERLAY_OUTBOX_SIZE, self.resend_streams)
+
+    async def disconnect(self, close_code):
+        """Leaves the groups of every subscribed stream."""
+        self.close_outbox()
+        for group_name in self.stream_groups.values():
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """Handles subscribe, unsubscribe and clock_sync messages."""
+        try:
+            data = self.decode_message(text_data, bytes_data)
+        except ValueError:
+            error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                'type': 'error',
+                'error': 'Invalid JSON format'
+            })
+            await self.send_message(error_serializer.data)
+            return
+
+        message_type = data.get('type')
+
+        if message_type == 'clock_sync':
+            await self.reply_clock_sync(data)
+            return
+
+        schema = RUN_CHANNEL_SCHEMAS.get(message_type)
+        if not schema:
+            error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                'type': 'error',
+                'error': 'Invalid message type'
+            })
+            await self.send_message(error_serializer.data)
+            return
+
+        validated_data, errors = schema.validate(data)
+        if errors:
+            error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                'type': 'error',
+                'error': errors
+            })
+            await self.send_message(error_serializer.data)
+            return
+
+        if message_type == 'subscribe':
+            await self.subscribe(validated_data['stream'], validated_data.get('since'),
+                                 validated_data.get('token'))
+        else:
+            await self.unsubscribe(validated_data['stream'])
+
+    async def subscribe(self, stream, since=None, token=None):
+        """
+        Joins the group of a stream and sends its current state, or the events
+        missed since `since` while they are still buffered.
+        The poll stream needs the overlay token of a poll session.
+        """
+        if stream == 'poll':
+            session_id = await aget_token_session(get_redis(), token) if token else None
+            if not session_id or poll_token_role(token) != 'overlay':
+                error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                    'type': 'error',
+                    'error': 'Invalid poll token'
+                })
+                await self.send_message(error_serializer.data)
+                return
+            self.poll_session_id = session_id
+            group_name = poll_group_name(session_id, 'overlay')
+        else:
+            group_name = RUN_STREAM_GROUPS[stream].format(run_id=self.run_id)
+
+        previous_group = self.stream_groups.get(stream)
+        if previous_group is not None and previous_group != group_name:
+            await self.channel_layer.group_discard(previous_group, self.channel_name)
+        await self.channel_layer.group_add(group_name, self.channel_name)
+        self.stream_groups[stream] = group_name
+        await self.send_stream_message(stream, schemas.STREAM_ACK.dump({'type': 'subscribed'}))
+
+        if since is not None:
+            _, events = await streams.events_since(get_redis(), group_name, since)
+            if events is not None:
+                for text in events:
+                    await self.send_stream_encoded(stream, text)
+                return
+        await self.send_stream_state(stream)
+
+    async def unsubscribe(self, stream):
+        """Leaves the group of a stream. Its events still queued are dropped when sent."""
+        group_name = self.stream_groups.pop(stream, None)
+        if group_name is not None:
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+        await self.send_stream_message(stream, schemas.STREAM_ACK.dump({'type': 'unsubscribed'}))
+
+    async def send_stream_state(self, stream):
+        """Sends the state a subscribed stream renders: a run snapshot or the published question."""
+        if stream == 'poll':
+            await self.send_stream_message(
+                stream, await published_question_message(self.poll_session_id))
+            return
+
+        snapshot = await self.build_run_snapshot(
+            RUN_STREAM_SNAPSHOTS[stream], self.stream_groups[stream])
+        if snapshot is None:
+            error_serializer = ph_serializers.WebSocketErrorSerializer(instance={
+                'type': 'error',
+                'error': 'Run not found'
+            })
+            await self.send_message(error_serializer.data)
+            return
+        await self.send_stream_message(stream, snapshot)
+
+    async def resend_streams(self):
+        """Sends the state of every subscribed stream to a client that fell too far behind."""
+        for stream in list(self.stream_groups):
+            await self.send_stream_state(stream)
+
+    async def route(self, event):
+        """Queues a group event under the stream whose group it was broadcast to."""
+        stream = next((stream for stream, group_name in self.stream_groups.items()
+                       if group_name == event.get('group')), None)
+        if stream is not None:
+            self.outbox.put((stream, event), event.get('key'))
+
+    async def send_stream_event(self, item):
+        stream, event = item
+        if self.stream_groups.get(stream) == event['group']:
+            await self.forward_stream(stream, event)
+
+    async def wipe_update(self, event):
+        await self.route(event)
+
+    async def segment_finished(self, event):
+        await self.route(event)
+
+    async def start_timer(self, event):
+        await self.route(event)
+
+    async def pause_timer(self, event):
+        await self.route(event)
+
+    async def finish_timer(self, event):
+        await self.route(event)
+
+    async def new_segment(self, event):
+        await self.route(event)
+
+    async def run_finished(self, event):
+        await self.route(event)
+
+    async def publish_question(self, event):
+        await self.route(event)
+
+    async def unpublish_question(self, event):
+        await self.route(event)
+
+    async def vote_update(self, event):
+        await self.route(event)
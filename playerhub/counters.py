@@ -0,0 +1,147 @@
+"""
+Atomic wipe count changes shared by the run consumer and the REST API.
+
+Counts changed over the WebSocket, absolute or by a delta, are persisted
+write-behind. Until a count is written, it is kept in a per-run Redis hash of
+pending counts, which every process reads: overlay snapshots are patched with
+it, and the flush writes the value it holds.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from .models import WipeCounter
+from .run_snapshots import invalidate_run_snapshots
+from .redis_client import sync_redis as r
+
+# Pending counts outlive the flush interval by far; the TTL only bounds counts
+# left behind by a process that died before flushing them.
+PENDING_COUNTS_TTL = 3600
+
+# KEYS: pending counts; ARGV: segment id, count, ... as written to the database.
+# Drops the counts that were not changed since, and returns the ids of the others.
+CLEAR_PENDING_SCRIPT = """
+local changed = {}
+for i = 1, #ARGV, 2 do
+    local count = redis.call('HGET', KEYS[1], ARGV[i])
+    if count == ARGV[i + 1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    elseif count then
+        table.insert(changed, ARGV[i])
+    end
+end
+return changed
+"""
+
+# KEYS: pending counts; ARGV: segment id, delta, TTL, [stored count].
+# Adds the delta to a pending count, never going below zero. A segment without
+# a pending count starts from the stored count, if one is given.
+# Returns the new count, or nil if the segment has no count to start from.
+INCREMENT_PENDING_SCRIPT = """
+local count = redis.call('HGET', KEYS[1], ARGV[1]) or ARGV[4]
+if not count then
+    return nil
+end
+count = math.max(tonumber(count) + tonumber(ARGV[2]), 0)
+redis.call('HSET', KEYS[1], ARGV[1], count)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return count
+"""
+
+clear_pending_script = r.register_script(CLEAR_PENDING_SCRIPT)
+increment_pending_script = r.register_script(INCREMENT_PENDING_SCRIPT)
+
+
+def pending_counts_key(run_id):
+    return f'run:pending_counts:{run_id}'
+
+
+async def aqueue_count(client, run_id, segment_id, count):
+    """Records the count of a segment that is queued for write-behind persistence."""
+    pipe = client.pipeline(transaction=False)
+    pipe.hset(pending_counts_key(run_id), segment_id, count)
+    pipe.expire(pending_counts_key(run_id), PENDING_COUNTS_TTL)
+    await pipe.execute()
+
+
+async def aincrement_pending_count(script, run_id, segment_id, delta):
+    """
+    Adds `delta` to a segment's pending count with INCREMENT_PENDING_SCRIPT.
+    Returns the new count, or None if the segment has no pending count,
+    see seed_pending_count().
+    """
+    count = await script(keys=[pending_counts_key(run_id)],
+                         args=[segment_id, delta, PENDING_COUNTS_TTL])
+    return None if count is None else int(count)
+
+
+def seed_pending_count(run_id, user_id, segment_id, delta):
+    """
+    Adds `delta` to a segment's count as a pending count, starting from the
+    stored count if the segment has no pending count. Returns the new count,
+    or None if the segment does not belong to a run of the user.
+    """
+    with transaction.atomic():
+        # The row stays locked until the pending count exists, so a concurrent
+        # increment_wipe_count() adds its delta to the pending count as well.
+        stored = WipeCounter.objects.select_for_update(of=('self',)).filter(
+            id=segment_id, run_id=run_id, run__user_id=user_id
+        ).values_list('count', flat=True).first()
+        if stored is None:
+            return None
+        count = increment_pending_script(keys=[pending_counts_key(run_id)],
+                                         args=[segment_id, delta, PENDING_COUNTS_TTL, stored])
+    return int(count)
+
+
+async def apending_counts(client, run_id):
+    """Returns the not yet persisted counts of a run's segments by segment id."""
+    counts = await client.hgetall(pending_counts_key(run_id))
+    return {int(segment_id): int(count) for segment_id, count in counts.items()}
+
+
+def pending_counts(run_id, segment_ids):
+    """Returns the pending counts of the given segments, omitting segments without one."""
+    counts = r.hmget(pending_counts_key(run_id), segment_ids)
+    return {segment_id: int(count)
+            for segment_id, count in zip(segment_ids, counts) if count is not None}
+
+
+def clear_pending_counts(run_id, written):
+    """
+    Drops the pending counts that were written, given as segment id -> count.
+    Returns the ids of segments whose pending count changed in the meantime.
+    """
+    args = [value for segment_id, count in written.items() for value in (segment_id, count)]
+    changed = clear_pending_script(keys=[pending_counts_key(run_id)], args=args)
+    return [int(segment_id) for segment_id in changed]
+
+
+def drop_pending_count(run_id, segment_id):
+    """Drops the pending count of a segment that was saved or deleted through the ORM."""
+    r.hdel(pending_counts_key(run_id), segment_id)
+
+
+def increment_wipe_count(run_id, user_id, segment_id, delta):
+    """
+    Adds `delta` to a segment's count with a single UPDATE, never going below zero,
+    so concurrent increments cannot overwrite each other. Returns the new count,
+    or None if the segment does not belong to a run of the user.
+
+    A count still queued for write-behind persistence gets the delta as well,
+    since the flush writes the pending count over the stored one. The pending
+    count is then the segment's current count.
+    """
+    with transaction.atomic():
+        updated = WipeCounter.objects.filter(
+            id=segment_id, run_id=run_id, run__user_id=user_id
+        ).update(count=Greatest(F('count') + delta, 0))
+        if not updated:
+            return None
+        # Changed while the row is locked, so a concurrent flush writes the sum.
+        count = increment_pending_script(keys=[pending_counts_key(run_id)],
+                                         args=[segment_id, delta, PENDING_COUNTS_TTL])
+        if count is None:
+            # The row stays locked by the UPDATE until commit, so this is the count it produced.
+            count = WipeCounter.objects.filter(id=segment_id).values_list('count', flat=True).get()
+    invalidate_run_snapshots(run_id)
+    return int(count)
@@ -0,0 +1,37 @@
+import time
+from django.core.management.base import BaseCommand
+from playerhub.redis_client import sync_redis
+from playerhub.sweeper import sweep_step
+
+
+class Command(BaseCommand):
+    help = (
+        'Reclaims poll Redis keys that outlived their session or have no expiry. '
+        'Walks the keyspace with SCAN in small steps, so Redis is never blocked.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500,
+                            help='Keys examined per SCAN step.')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between SCAN steps.')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds between full passes. Runs a single pass when 0.')
+
+    def handle(self, *args, **options):
+        while True:
+            totals = {}
+            cursor = 0
+            while True:
+                cursor, stats = sweep_step(sync_redis, cursor, options['count'])
+                for name, value in stats.items():
+                    totals[name] = totals.get(name, 0) + value
+                if cursor == 0:
+                    break
+                time.sleep(options['pause'])
+
+            self.stdout.write(', '.join(f'{name}: {value}' for name, value in totals.items()))
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -1,40 +1,76 @@
-import jwt
 from urllib.parse import parse_qs
+from channels.auth import UserLazyObject
 from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
 from django.contrib.auth.models import AnonymousUser
-from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils.functional import empty
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.exceptions import TokenError
+from . import revocation
+from .caches import users
+from .redis_client import get_redis
 User = get_user_model()
 
 
-@database_sync_to_async
-def get_user(user_id):
+def _load_user(user_id):
     try:
         return User.objects.get(pk=user_id)
     except User.DoesNotExist:
         return AnonymousUser()
 
 
+async def get_user(user_id):
+    """
+    Returns the user with the given id, or AnonymousUser if there is none.
+    Users are cached in-process for USER_CACHE_TTL seconds, so reconnecting
+    dashboards are authenticated without a query.
+    """
+    user = users.get(user_id)
+    if user is None:
+        user = await database_sync_to_async(_load_user)(user_id)
+        if user.is_authenticated:
+            users.set(user_id, user)
+    return user
+
+
+async def token_user_id(token):
+    """Verifies a token and returns the id of its user, or None if it is invalid or revoked."""
+    try:
+        validated = UntypedToken(token)
+    except TokenError:
+        return None
+    if await revocation.ais_revoked(get_redis(), validated):
+        return None
+    return validated.get(api_settings.USER_ID_CLAIM)
+
+
+async def resolve_user(scope):
+    """
+    Loads the user of a connection that JWTAuthMiddleware left unresolved.
+    Consumers reading scope['user'] await this once, usually in connect().
+    """
+    user = scope['user']
+    if user._wrapped is empty:
+        user_id = scope.get('user_id')
+        user._wrapped = AnonymousUser() if user_id is None else await get_user(user_id)
+    return user
+
+
 class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket connections by their ?token= query parameter.
+    The token is verified once here, but its user is only loaded by consumers
+    that call resolve_user(), so overlays and poll sockets cost no lookup.
+    """
+
     async def __call__(self, scope, receive, send):
         query_string = parse_qs(scope['query_string'].decode())
         token = query_string.get('token', [None])[0]
 
-        if token is None:
-            scope['user'] = AnonymousUser()
-            return await super().__call__(scope, receive, send)
-
-        try:
-            UntypedToken(token)
-            decoded_data = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            user = await get_user(decoded_data['user_id'])
-            scope['user'] = user
-        except (InvalidToken, TokenError, jwt.DecodeError, KeyError):
-            scope['user'] = AnonymousUser()
-
+        scope['user_id'] = None if token is None else await token_user_id(token)
+        scope['user'] = UserLazyObject()
         return await super().__call__(scope, receive, send)
 
 
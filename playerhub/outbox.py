@@ -0,0 +1,117 @@
+"""
+Per-connection outbound queues of the overlay consumers.
+
+Overlays only render the latest state, so an event that is superseded by a
+newer one with the same key before it was sent is dropped. The channel layer
+is drained as fast as events arrive, and a slow socket can hold at most one
+queue of bounded depth in memory instead of filling its channel to capacity.
+"""
+import asyncio
+import itertools
+import logging
+import weakref
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxMetrics:
+    """Counters shared by all outboxes of the process."""
+
+    def __init__(self):
+        self.outboxes = weakref.WeakSet()
+        self.reset()
+
+    def reset(self):
+        self.enqueued = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.overflows = 0
+        self.max_depth = 0
+
+    def as_dict(self):
+        outboxes = list(self.outboxes)
+        return {
+            'open_outboxes': len(outboxes),
+            'queued': sum(len(outbox) for outbox in outboxes),
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'sent': self.sent,
+            'overflows': self.overflows,
+            'max_depth': self.max_depth,
+        }
+
+
+metrics = OutboxMetrics()
+
+
+class CoalescingOutbox:
+    """
+    Queue of events waiting to be sent to one client by a background task.
+
+    An event queued under the key of an unsent one replaces it and moves to the
+    back, so events still go out in the order they were broadcast. Events without
+    a key are never coalesced. Once more than `maxsize` events are waiting, the
+    queue is discarded and `on_overflow` is awaited instead, e.g. to send the
+    client a fresh snapshot of the state it fell behind on.
+    """
+
+    def __init__(self, send, maxsize, on_overflow):
+        self.maxsize = maxsize
+        self._send = send
+        self._on_overflow = on_overflow
+        self._queue = OrderedDict()
+        self._unique = itertools.count()
+        self._overflowed = False
+        self._ready = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._drain())
+        metrics.outboxes.add(self)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, event, key=None):
+        """Queues an event for sending, replacing an unsent event with the same key."""
+        if key is None:
+            key = next(self._unique)
+        elif key in self._queue:
+            del self._queue[key]
+            metrics.coalesced += 1
+
+        self._queue[key] = event
+        metrics.enqueued += 1
+        metrics.max_depth = max(metrics.max_depth, len(self._queue))
+
+        if len(self._queue) > self.maxsize:
+            self._queue.clear()
+            self._overflowed = True
+            metrics.overflows += 1
+            logger.warning('Outbound queue exceeded %d events, resending state instead.',
+                           self.maxsize)
+        self._ready.set()
+
+    async def _drain(self):
+        while True:
+            if not self._queue and not self._overflowed:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            # A failed send or resend drops that one event, not the whole outbox.
+            try:
+                if self._overflowed:
+                    self._overflowed = False
+                    await self._on_overflow()
+                    continue
+
+                _, event = self._queue.popitem(last=False)
+                await self._send(event)
+                metrics.sent += 1
+            except Exception:
+                logger.exception('Sending a queued event failed.')
+
+    def close(self):
+        """Stops sending and discards the events still queued."""
+        self._task.cancel()
+        self._queue.clear()
+        metrics.outboxes.discard(self)
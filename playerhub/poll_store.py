@@ -0,0 +1,299 @@
+"""
+Redis key layout and server-side scripts shared by the poll views and consumers.
+"""
+from . import codec
+
+VOTE_MODE_SINGLE = 'single'
+VOTE_MODE_CHANGE = 'change'
+VOTE_MODE_CHOICES = [
+    (VOTE_MODE_SINGLE, 'One vote per viewer'),
+    (VOTE_MODE_CHANGE, 'Viewers can change their vote'),
+]
+
+POLL_SESSION_TTL = 86400
+
+VOTE_OK = 1
+VOTE_UNCHANGED = 2
+VOTE_QUESTION_NOT_FOUND = 0
+VOTE_ANSWER_NOT_FOUND = -1
+VOTE_ALREADY_CAST = -2
+
+# Validates the answer against the stored question, checks the voter against
+# the question's voters hash and increments the tally in a single atomic step.
+# KEYS = question data, votes, question voters; ARGV = question id, answer, voter id.
+# The voters hash maps a voter id to the 1-based index of the chosen answer,
+# which keeps it small enough for Redis' compact hash encoding. Tallies of every
+# question of a session share one hash, with a '<question id>:<answer>' field per
+# answer, which is seeded from the question blob the first time a question
+# receives a vote, so older questions keep their counts.
+# Returns {status, answer_1, count_1, answer_2, count_2, ...} in answer order.
+VOTE_SCRIPT = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if not raw then
+    return {0}
+end
+
+local question = cjson.decode(raw)
+local answers = question['answers']
+local fields = {}
+local index
+for i, answer in ipairs(answers) do
+    fields[i] = ARGV[1] .. ':' .. answer
+    if answer == ARGV[2] then
+        index = i
+    end
+end
+if not index then
+    return {-1}
+end
+
+local status = 1
+local previous = tonumber(redis.call('HGET', KEYS[3], ARGV[3]))
+if previous and question['vote_mode'] ~= 'change' then
+    return {-2}
+end
+
+local ttl = redis.call('PTTL', KEYS[1])
+if redis.call('HEXISTS', KEYS[2], fields[1]) == 0 then
+    local seeded = question['votes']
+    for i, answer in ipairs(answers) do
+        local count = 0
+        if type(seeded) == 'table' and seeded[answer] then
+            count = seeded[answer]
+        end
+        redis.call('HSET', KEYS[2], fields[i], count)
+    end
+    if ttl > 0 and redis.call('PTTL', KEYS[2]) == -1 then
+        redis.call('PEXPIRE', KEYS[2], ttl)
+    end
+end
+
+if previous == index then
+    status = 2
+else
+    if previous then
+        redis.call('HINCRBY', KEYS[2], fields[previous], -1)
+    end
+    redis.call('HINCRBY', KEYS[2], fields[index], 1)
+    redis.call('HSET', KEYS[3], ARGV[3], index)
+    if ttl > 0 and redis.call('PTTL', KEYS[3]) == -1 then
+        redis.call('PEXPIRE', KEYS[3], ttl)
+    end
+end
+
+local counts = redis.call('HMGET', KEYS[2], unpack(fields))
+local result = {status}
+for i, answer in ipairs(answers) do
+    table.insert(result, answer)
+    table.insert(result, tonumber(counts[i]) or 0)
+end
+return result
+"""
+
+# Sets one field of the session hash, but only while the session still exists,
+# so a late write cannot recreate an expired session without a TTL.
+# Returns 1 when the field was written and 0 when the session does not exist.
+SESSION_SET_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+return 1
+"""
+
+# Every key of a session expires together with the session hash. The scripts
+# below read the remaining lifetime of KEYS[1], the session hash, and fall back
+# to ARGV[1], POLL_SESSION_TTL in milliseconds, for sessions without an expiry.
+SESSION_TTL_LUA = """
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl <= 0 then
+    ttl = tonumber(ARGV[1])
+end
+"""
+
+# Stores a new question, assigns it the next session version and appends it to
+# the session's question list. KEYS = session, questions list, version, question
+# data; ARGV = session ttl, question id, question json. Returns the assigned version.
+ADD_QUESTION_SCRIPT = SESSION_TTL_LUA + """
+local version = redis.call('INCR', KEYS[3])
+local question = cjson.decode(ARGV[3])
+question['version'] = version
+redis.call('HSET', KEYS[4], ARGV[2], cjson.encode(question))
+redis.call('RPUSH', KEYS[2], ARGV[2])
+redis.call('PEXPIRE', KEYS[2], ttl)
+redis.call('PEXPIRE', KEYS[3], ttl)
+redis.call('PEXPIRE', KEYS[4], ttl)
+return version
+"""
+
+# Removes a question with its tallies and voters from a session.
+# KEYS = questions list, question data, votes, question voters; ARGV = question id.
+DELETE_QUESTION_SCRIPT = """
+redis.call('LREM', KEYS[1], 0, ARGV[1])
+local raw = redis.call('HGET', KEYS[2], ARGV[1])
+if raw then
+    for _, answer in ipairs(cjson.decode(raw)['answers']) do
+        redis.call('HDEL', KEYS[3], ARGV[1] .. ':' .. answer)
+    end
+    redis.call('HDEL', KEYS[2], ARGV[1])
+end
+redis.call('DEL', KEYS[4])
+"""
+
+# Moves the session's "already broadcast" version forward, never backwards,
+# and returns the version that was stored before.
+# KEYS = session, synced version; ARGV = session ttl, version.
+SYNC_CURSOR_SCRIPT = SESSION_TTL_LUA + """
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if tonumber(ARGV[2]) > previous then
+    redis.call('SET', KEYS[2], ARGV[2], 'PX', ttl)
+end
+return previous
+"""
+
+
+def token_map_key(token):
+    return f'poll:token_map:{token}'
+
+
+def session_key(session_id):
+    return f'poll:session:{session_id}'
+
+
+def session_questions_key(session_id):
+    return f'poll:session:{session_id}:questions'
+
+
+def session_version_key(session_id):
+    return f'poll:session:{session_id}:version'
+
+
+def session_synced_version_key(session_id):
+    return f'poll:session:{session_id}:synced_version'
+
+
+def session_question_data_key(session_id):
+    return f'poll:session:{session_id}:question_data'
+
+
+def session_votes_key(session_id):
+    return f'poll:session:{session_id}:votes'
+
+
+def voters_key(session_id, question_id):
+    return f'poll:session:{session_id}:voters:{question_id}'
+
+
+def vote_keys(session_id, question_id):
+    """Returns the keys VOTE_SCRIPT reads and writes for a question."""
+    return [session_question_data_key(session_id), session_votes_key(session_id),
+            voters_key(session_id, question_id)]
+
+
+def delete_question_keys(session_id, question_id):
+    """Returns the keys DELETE_QUESTION_SCRIPT removes a question from."""
+    return [session_questions_key(session_id), session_question_data_key(session_id),
+            session_votes_key(session_id), voters_key(session_id, question_id)]
+
+
+def create_session(client, session_id, tokens):
+    """
+    Stores a new poll session in one MULTI/EXEC round trip. The session metadata
+    and the role of each token are kept in a single hash; the token maps used to
+    resolve a token back to its session are written and expired in the same
+    transaction, so every key of the session shares one TTL.
+    `tokens` maps a client role to its token.
+    """
+    record = {'session_id': session_id, 'published_question_id': ''}
+    record.update({f'{role}_token': token for role, token in tokens.items()})
+
+    pipe = client.pipeline(transaction=True)
+    pipe.hset(session_key(session_id), mapping=record)
+    pipe.expire(session_key(session_id), POLL_SESSION_TTL)
+    for token in tokens.values():
+        pipe.set(token_map_key(token), session_id, ex=POLL_SESSION_TTL)
+    pipe.execute()
+
+
+def session_ttl_arg():
+    """Returns the fallback session TTL passed to the session scripts, in milliseconds."""
+    return POLL_SESSION_TTL * 1000
+
+
+def parse_vote_result(result):
+    """
+    Splits the reply of VOTE_SCRIPT into its status, ordered answers and vote counts.
+    """
+    status = result[0]
+    answers = result[1::2]
+    votes = dict(zip(answers, result[2::2]))
+    return status, answers, votes
+
+
+def _questions_pipeline(client, session_id):
+    pipe = client.pipeline(transaction=True)
+    pipe.lrange(session_questions_key(session_id), 0, -1)
+    pipe.hgetall(session_question_data_key(session_id))
+    pipe.hgetall(session_votes_key(session_id))
+    return pipe
+
+
+def tallies_by_question(tallies):
+    """Splits the fields of a session's votes hash into tallies per question id."""
+    by_question = {}
+    for field, count in tallies.items():
+        question_id, _, answer = field.partition(':')
+        by_question.setdefault(question_id, {})[answer] = count
+    return by_question
+
+
+def parse_questions(replies):
+    """
+    Builds the ordered list of questions, with live tallies, from the replies
+    of the question list, the question data and the votes of a session.
+    Question ids without stored data are skipped.
+    """
+    question_ids, blobs, tallies = replies
+    by_question = tallies_by_question(tallies)
+    return [with_votes(codec.loads(blobs[question_id]), by_question.get(question_id, {}))
+            for question_id in question_ids if question_id in blobs]
+
+
+def fetch_questions(client, session_id):
+    """
+    Loads every question of a session in list order together with its tallies,
+    in a single MULTI/EXEC round trip.
+    """
+    return parse_questions(_questions_pipeline(client, session_id).execute())
+
+
+async def afetch_questions(client, session_id):
+    """Asyncio counterpart of fetch_questions."""
+    return parse_questions(await _questions_pipeline(client, session_id).execute())
+
+
+def with_votes(question, tallies):
+    """
+    Returns the question with vote counts taken from its tally hash.
+    Answers without a tally entry keep the count stored in the question itself.
+    """
+    stored = question.get('votes') or {}
+    question['votes'] = {
+        answer: int(tallies.get(answer, stored.get(answer, 0)))
+        for answer in question['answers']
+    }
+    return question
+
+
+async def afetch_question(client, session_id, question_id):
+    """
+    Loads a question of a session together with its live tallies in one
+    pipelined round trip. Returns None when the question does not exist.
+    """
+    pipe = client.pipeline(transaction=False)
+    pipe.hget(session_question_data_key(session_id), question_id)
+    pipe.hgetall(session_votes_key(session_id))
+    raw, tallies = await pipe.execute()
+    if not raw:
+        return None
+    return with_votes(codec.loads(raw), tallies_by_question(tallies).get(question_id, {}))
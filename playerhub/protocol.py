@@ -0,0 +1,159 @@
+"""
+Framing shared by the WebSocket consumers.
+
+Clients exchange JSON text frames by default. Clients that offer the 'msgpack'
+subprotocol during the handshake exchange MessagePack binary frames instead,
+which are smaller and cheaper to parse for high-frequency timer and vote traffic.
+
+Group events carry a per-group sequence number ('seq'). Clients that reconnect
+with ?since=<seq> are sent the events they missed from the group's replay buffer.
+
+Group events travel through the channel layer as JSON text only. Msgpack
+recipients transcode them when they are sent.
+
+Multiplexed sockets carry several sub-streams and send their messages as
+[stream, message] pairs, framed around the already encoded JSON message.
+"""
+from urllib.parse import parse_qs
+import msgpack
+from channels.layers import get_channel_layer
+from . import codec, streams
+from .redis_client import get_redis, get_script
+
+MSGPACK_SUBPROTOCOL = 'msgpack'
+
+
+# Run events a recipient can drop once a later event of the same group arrives for
+# the same segment, since only the segment's latest state is rendered.
+COALESCED_EVENTS = {
+    'wipe_update': 'wipe_update',
+    'start_timer': 'timer',
+    'pause_timer': 'timer',
+    'finish_timer': 'timer',
+}
+
+
+def coalesce_key(event_type, data):
+    group = COALESCED_EVENTS.get(event_type)
+    return f'{group}:{data["segment_id"]}' if group else None
+
+
+async def sequenced_event(group_name, event_type, data, key=None):
+    """
+    Builds the channel-layer event of a group broadcast, numbered with the
+    group's next sequence number and stored in its replay buffer.
+    The event carries the message already encoded as JSON, so recipients
+    forward it without serializing it again. Bundled clients all use JSON,
+    so the rare msgpack recipient transcodes the text itself rather than
+    every broadcast carrying a second encoding.
+    Recipients that only need the latest state may drop an unsent event
+    once another one with the same `key` arrives. The event names its group,
+    so multiplexed recipients can tell which sub-stream it belongs to.
+    """
+    _, text = await streams.append_event(
+        get_script(streams.APPEND_EVENT_SCRIPT), group_name, data)
+    event = {'type': event_type, 'text': text, 'group': group_name}
+    if key is not None:
+        event['key'] = key
+    return event
+
+
+async def broadcast(group_name, event_type, data, key=None):
+    """Sends a group event from outside a consumer, e.g. from a REST view."""
+    await get_channel_layer().group_send(
+        group_name, await sequenced_event(group_name, event_type, data, key))
+
+
+class MessageProtocolMixin:
+    """
+    Negotiates the frame format of a connection, decodes inbound frames, and
+    encodes outbound messages and group events in the negotiated format.
+    """
+    use_msgpack = False
+
+    async def accept_client(self):
+        """Accepts the connection, selecting the msgpack subprotocol if the client offers it."""
+        subprotocol = None
+        if MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', []):
+            self.use_msgpack = True
+            subprotocol = MSGPACK_SUBPROTOCOL
+        await self.accept(subprotocol)
+
+    def decode_message(self, text_data=None, bytes_data=None):
+        """
+        Decodes a text or binary frame into a message dict.
+        Raises ValueError for malformed frames and for frames that are not an object.
+        """
+        if bytes_data is not None:
+            try:
+                data = msgpack.unpackb(bytes_data)
+            except (msgpack.UnpackException, ValueError, TypeError) as error:
+                raise ValueError(str(error)) from error
+        else:
+            data = codec.loads(text_data)
+        if not isinstance(data, dict):
+            raise ValueError('Message is not an object')
+        return data
+
+    async def send_message(self, data):
+        """Sends a message to this client in its negotiated format."""
+        if self.use_msgpack:
+            await self.send(bytes_data=msgpack.packb(data))
+        else:
+            await self.send(text_data=codec.dumps(data))
+
+    async def send_encoded(self, text):
+        """Sends a message that is already encoded as JSON text."""
+        if self.use_msgpack:
+            await self.send(bytes_data=msgpack.packb(codec.loads(text)))
+        else:
+            await self.send(text_data=text)
+
+    async def group_broadcast(self, group_name, event_type, data, key=None):
+        """
+        Serializes a group event once, on the sending side, instead of each
+        recipient validating and encoding the same payload again.
+        """
+        await self.channel_layer.group_send(
+            group_name, await sequenced_event(group_name, event_type, data, key))
+
+    async def forward(self, event):
+        """Sends a frame that was encoded by the broadcasting consumer."""
+        await self.send_encoded(event['text'])
+
+    async def send_stream_message(self, stream, data):
+        """Sends a message of a multiplexed sub-stream."""
+        await self.send_message([stream, data])
+
+    async def send_stream_encoded(self, stream, text):
+        """Sends a message of a multiplexed sub-stream that is already encoded as JSON text."""
+        if self.use_msgpack:
+            await self.send(bytes_data=msgpack.packb([stream, codec.loads(text)]))
+        else:
+            await self.send(text_data=f'[{codec.dumps(stream)},{text}]')
+
+    async def forward_stream(self, stream, event):
+        """Sends a group event as a message of a multiplexed sub-stream, without re-encoding it."""
+        await self.send_stream_encoded(stream, event['text'])
+
+    def get_since(self):
+        """Returns the sequence number passed as ?since=, or None if it is missing or invalid."""
+        query_string = parse_qs(self.scope['query_string'].decode())
+        since = query_string.get('since', [None])[0]
+        return int(since) if since and since.isdigit() else None
+
+    async def replay_events(self, group_name):
+        """
+        Sends the group events numbered after the client's ?since= parameter.
+        Returns False when the client passed none, or the replay buffer no longer
+        holds every event it missed and it needs a snapshot instead.
+        """
+        since = self.get_since()
+        if since is None:
+            return False
+        _, events = await streams.events_since(get_redis(), group_name, since)
+        if events is None:
+            return False
+        for text in events:
+            await self.send_encoded(text)
+        return True
@@ -0,0 +1,51 @@
+import asyncio
+import weakref
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+_clients = weakref.WeakKeyDictionary()
+
+# The Redis client of views, signal handlers and the consumers' worker threads.
+# Like the asyncio clients, it draws from one pool per process, capped at
+# REDIS_MAX_CONNECTIONS, whose callers wait for a free connection.
+sync_redis = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT,
+    decode_responses=True,
+))
+
+
+def get_redis():
+    """
+    Returns the asyncio Redis client bound to the running event loop.
+    All consumers in a process share its connection pool, which is capped at
+    REDIS_MAX_CONNECTIONS and makes callers wait for a free connection instead
+    of opening new ones.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None:
+        pool = aioredis.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            decode_responses=True,
+        )
+        entry = (aioredis.Redis(connection_pool=pool), {})
+        _clients[loop] = entry
+    return entry[0]
+
+
+def get_script(source):
+    """
+    Returns a Lua script registered on the loop's client. Scripts are cached so
+    their SHA is computed once and every call is a single EVALSHA.
+    """
+    client = get_redis()
+    scripts = _clients[asyncio.get_running_loop()][1]
+    script = scripts.get(source)
+    if script is None:
+        script = scripts[source] = client.register_script(source)
+    return script
@@ -0,0 +1,32 @@
+from rest_framework.utils import encoders
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from . import codec
+
+
+class CodecJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by playerhub.codec. Values the codec cannot encode
+    natively are handled by DRF's JSONEncoder; indented output requested by the
+    client is left to DRF's renderer.
+    """
+    _default = staticmethod(encoders.JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return codec.dumpb(data, default=self._default)
+
+
+class CodecJSONParser(JSONParser):
+    """JSON parser backed by playerhub.codec."""
+    renderer_class = CodecJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return codec.loads(stream.read())
+        except codec.DecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,132 @@
+"""
+Revocation of JWTs before they expire, e.g. on logout.
+
+Revoked token ids (the 'jti' claim) are kept in a Redis sorted set scored by
+the token's expiry, so entries are dropped once the token would be rejected
+anyway. Each process mirrors the set in a Bloom filter. Every revocation bumps
+a version counter, which each process reads every
+TOKEN_REVOCATION_REFRESH_INTERVAL seconds, rebuilding its filter only when the
+version changed. Tokens the filter has never seen, nearly all of them, are
+accepted without further I/O; only possible hits are confirmed against Redis.
+A token revoked by another process is therefore accepted here for at most one
+refresh interval.
+"""
+import hashlib
+import math
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework_simplejwt.settings import api_settings
+from .redis_client import sync_redis as r
+
+REVOKED_KEY = 'jwt:revoked'
+VERSION_KEY = 'jwt:revoked:version'
+
+
+class BloomFilter:
+    """
+    Set of strings with no false negatives and a false positive rate of about
+    `error_rate` for up to `capacity` items.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+
+_filter = None
+_version = None
+_checked_at = -math.inf
+_refresh_lock = threading.Lock()
+
+
+def _is_due():
+    return time.monotonic() - _checked_at >= settings.TOKEN_REVOCATION_REFRESH_INTERVAL
+
+
+def _refresh():
+    """
+    Rebuilds the filter if the revocation list changed since it was built.
+    A single thread refreshes at a time; the others keep using the current filter.
+    """
+    global _filter, _version, _checked_at
+    if not _refresh_lock.acquire(blocking=False):
+        return
+    try:
+        if not _is_due():
+            return
+        # Read before the list, so a revocation in between triggers another rebuild.
+        version = r.get(VERSION_KEY)
+        if _filter is None or version != _version:
+            revoked = BloomFilter(settings.TOKEN_REVOCATION_BLOOM_CAPACITY,
+                                  settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE)
+            for token_id in r.zrangebyscore(REVOKED_KEY, time.time(), '+inf'):
+                revoked.add(token_id)
+            _filter, _version = revoked, version
+        _checked_at = time.monotonic()
+    finally:
+        _refresh_lock.release()
+
+
+def _might_be_revoked(token_id):
+    # Until the first filter is built, every token is a possible hit.
+    return _filter is None or token_id in _filter
+
+
+def reset():
+    """Makes the next check rebuild the filter from Redis."""
+    global _filter, _checked_at
+    _filter, _checked_at = None, -math.inf
+
+
+def revoke(token):
+    """Revokes a validated token until it expires."""
+    token_id = token.get(api_settings.JTI_CLAIM)
+    if token_id is None:
+        return
+    pipe = r.pipeline(transaction=False)
+    pipe.zadd(REVOKED_KEY, {token_id: token['exp']})
+    pipe.zremrangebyscore(REVOKED_KEY, '-inf', time.time())
+    pipe.incr(VERSION_KEY)
+    pipe.execute()
+    revoked = _filter
+    if revoked is not None:
+        revoked.add(token_id)
+
+
+def is_revoked(token):
+    """Returns whether a validated token was revoked, using the sync Redis client."""
+    token_id = token.get(api_settings.JTI_CLAIM)
+    if token_id is None:
+        return False
+    if _is_due():
+        _refresh()
+    return _might_be_revoked(token_id) and r.zscore(REVOKED_KEY, token_id) is not None
+
+
+async def ais_revoked(client, token):
+    """
+    Asyncio counterpart of is_revoked. The filter is refreshed in a worker
+    thread, so a rebuild does not block the event loop.
+    """
+    token_id = token.get(api_settings.JTI_CLAIM)
+    if token_id is None:
+        return False
+    if _is_due() and not _refresh_lock.locked():
+        await sync_to_async(_refresh, thread_sensitive=False)()
+    return _might_be_revoked(token_id) and await client.zscore(REVOKED_KEY, token_id) is not None
@@ -0,0 +1,99 @@
+"""
+Run state snapshots sent to overlays as the first frame after they connect.
+
+Snapshots are cached in Redis as encoded JSON, so overlay loads do not reach
+the database. Every change to a run or one of its segments bumps the run's
+generation and drops its snapshots. A snapshot built from rows read before
+that change is only stored if the generation it was built against is still
+current, which keeps a concurrent save from being overwritten by stale state.
+"""
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from . import codec
+from .models import Run, WipeCounter, Timer
+from .serializers import RunSerializer, WipeCounterSerializer, TimerSerializer
+from .redis_client import sync_redis as r
+
+# Segment model and serializer of each snapshot kind.
+SNAPSHOT_KINDS = {
+    'wipecounters': (WipeCounter, WipeCounterSerializer),
+    'timers': (Timer, TimerSerializer),
+}
+
+# KEYS: snapshot, generation; ARGV: generation read before building, snapshot, ttl.
+SNAPSHOT_SET_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def snapshot_key(run_id, kind):
+    return f'run:snapshot:{run_id}:{kind}'
+
+
+def generation_key(run_id):
+    return f'run:snapshot:{run_id}:generation'
+
+
+def build_snapshot(run_id, kind):
+    """
+    Serializes the run and its segments of the given kind from the database.
+    Returns the encoded snapshot, or None if the run does not exist.
+    """
+    run = Run.objects.select_related('game', 'user').filter(id=run_id).first()
+    if run is None:
+        return None
+
+    model, serializer_class = SNAPSHOT_KINDS[kind]
+    segments = model.objects.filter(run=run).select_related('run').order_by('id')
+    return codec.dumps({
+        'type': 'run_snapshot',
+        'run': RunSerializer(run).data,
+        'segments': serializer_class(segments, many=True).data,
+    })
+
+
+async def aget_snapshot(client, script, run_id, kind):
+    """
+    Returns the encoded snapshot of a run, building and caching it on a miss.
+    `script` is SNAPSHOT_SET_SCRIPT registered on the asyncio client.
+    Returns None if the run does not exist.
+    """
+    key = snapshot_key(run_id, kind)
+    pipe = client.pipeline(transaction=False)
+    pipe.get(key)
+    pipe.get(generation_key(run_id))
+    snapshot, generation = await pipe.execute()
+    if snapshot is not None:
+        return snapshot
+
+    snapshot = await database_sync_to_async(build_snapshot)(run_id, kind)
+    if snapshot is not None:
+        await script(
+            keys=[key, generation_key(run_id)],
+            args=[generation or '0', snapshot, settings.RUN_SNAPSHOT_TTL],
+        )
+    return snapshot
+
+
+def _drop_snapshots(run_id):
+    pipe = r.pipeline(transaction=False)
+    pipe.incr(generation_key(run_id))
+    # The generation must outlive any snapshot that could have been built against it.
+    pipe.expire(generation_key(run_id), settings.RUN_SNAPSHOT_TTL * 2)
+    pipe.delete(*(snapshot_key(run_id, kind) for kind in SNAPSHOT_KINDS))
+    pipe.execute()
+
+
+def invalidate_run_snapshots(run_id):
+    """
+    Drops the cached snapshots of a run. They are dropped again once the
+    surrounding transaction commits, so a snapshot built from rows read
+    before the commit does not outlive it.
+    """
+    _drop_snapshots(run_id)
+    transaction.on_commit(lambda: _drop_snapshots(run_id))
@@ -0,0 +1,540 @@
+"""
+Lightweight message schemas for the WebSocket protocol.
+
+The consumers validate every inbound frame and build every outbound one on the
+hot path, where DRF's per-instance field copies and ErrorDetail machinery cost
+tens of microseconds per message. These schemas are built once at import time
+and validate plain dicts with the same coercion rules and error messages as the
+DRF fields they replace. DRF serializers remain in use for the REST views.
+"""
+from datetime import timezone as dt_timezone
+from django.utils import dateparse, timezone
+from .poll_store import VOTE_MODE_CHOICES, VOTE_MODE_SINGLE
+
+MISSING = object()
+NON_FIELD_ERRORS = 'non_field_errors'
+
+
+class SchemaValidationError(Exception):
+    """Raised by fields and validators; `detail` is a message or a dict of nested errors."""
+
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class Field:
+    required_message = 'This field is required.'
+
+    def __init__(self, required=None, default=MISSING, allow_null=False,
+                 read_only=False, validators=()):
+        if required is None:
+            required = default is MISSING and not read_only
+        self.required = required
+        self.default = default
+        self.allow_null = allow_null
+        self.read_only = read_only
+        self.validators = tuple(validators)
+
+    def run(self, value):
+        if value is None:
+            if self.allow_null:
+                return None
+            raise SchemaValidationError('This field may not be null.')
+        value = self.to_internal(value)
+        for validator in self.validators:
+            value = validator(value)
+        return value
+
+    def to_internal(self, value):
+        return value
+
+    def to_representation(self, value):
+        return value
+
+
+class Integer(Field):
+    def __init__(self, min_value=None, max_value=None, **kwargs):
+        super().__init__(**kwargs)
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def to_internal(self, value):
+        if type(value) is not int:
+            if isinstance(value, bool):
+                raise SchemaValidationError('A valid integer is required.')
+            try:
+                as_float = float(value)
+                value = int(as_float)
+            except (TypeError, ValueError, OverflowError):
+                raise SchemaValidationError('A valid integer is required.')
+            if value != as_float:
+                raise SchemaValidationError('A valid integer is required.')
+        if self.min_value is not None and value < self.min_value:
+            raise SchemaValidationError(
+                f'Ensure this value is greater than or equal to {self.min_value}.')
+        if self.max_value is not None and value > self.max_value:
+            raise SchemaValidationError(
+                f'Ensure this value is less than or equal to {self.max_value}.')
+        return value
+
+    def to_representation(self, value):
+        return int(value)
+
+
+class Float(Field):
+    def __init__(self, min_value=None, **kwargs):
+        super().__init__(**kwargs)
+        self.min_value = min_value
+
+    def to_internal(self, value):
+        if isinstance(value, bool):
+            raise SchemaValidationError('A valid number is required.')
+        try:
+            value = float(value)
+        except (TypeError, ValueError, OverflowError):
+            raise SchemaValidationError('A valid number is required.')
+        if self.min_value is not None and value < self.min_value:
+            raise SchemaValidationError(
+                f'Ensure this value is greater than or equal to {self.min_value}.')
+        return value
+
+    def to_representation(self, value):
+        return float(value)
+
+
+class String(Field):
+    def __init__(self, max_length=None, **kwargs):
+        super().__init__(**kwargs)
+        self.max_length = max_length
+
+    def to_internal(self, value):
+        if type(value) is not str:
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise SchemaValidationError('Not a valid string.')
+            value = str(value)
+        value = value.strip()
+        if not value:
+            raise SchemaValidationError('This field may not be blank.')
+        if self.max_length is not None and len(value) > self.max_length:
+            raise SchemaValidationError(
+                f'Ensure this field has no more than {self.max_length} characters.')
+        return value
+
+    def to_representation(self, value):
+        return str(value)
+
+
+class Boolean(Field):
+    TRUE_VALUES = {True, 1, 'true', 'True', 'TRUE', 't', 'T', 'y', 'Y', 'yes', 'Yes', 'YES',
+                   'on', 'On', 'ON', '1'}
+    FALSE_VALUES = {False, 0, 'false', 'False', 'FALSE', 'f', 'F', 'n', 'N', 'no', 'No', 'NO',
+                    'off', 'Off', 'OFF', '0'}
+
+    def to_internal(self, value):
+        try:
+            if value in self.TRUE_VALUES:
+                return True
+            if value in self.FALSE_VALUES:
+                return False
+        except TypeError:
+            pass
+        raise SchemaValidationError('Must be a valid boolean.')
+
+    def to_representation(self, value):
+        return bool(value)
+
+
+class Choice(Field):
+    def __init__(self, choices, **kwargs):
+        super().__init__(**kwargs)
+        self.choices = frozenset(
+            choice[0] if isinstance(choice, (list, tuple)) else choice for choice in choices)
+
+    def to_internal(self, value):
+        try:
+            if value in self.choices:
+                return value
+        except TypeError:
+            pass
+        raise SchemaValidationError(f'"{value}" is not a valid choice.')
+
+
+class DateTime(Field):
+    """ISO 8601 datetimes, made aware in UTC like DRF's DateTimeField with USE_TZ."""
+
+    def to_internal(self, value):
+        parsed = dateparse.parse_datetime(value) if isinstance(value, str) else None
+        if parsed is None:
+            raise SchemaValidationError(
+                'Datetime has wrong format. Use one of these formats instead: '
+                'YYYY-MM-DDThh:mm[:ss[.uuuuuu]][+HH:MM|-HH:MM|Z].')
+        if timezone.is_naive(parsed):
+            return timezone.make_aware(parsed)
+        return parsed.astimezone(dt_timezone.utc)
+
+    def to_representation(self, value):
+        if isinstance(value, str):
+            return value
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+
+class List(Field):
+    def __init__(self, child, min_length=None, **kwargs):
+        super().__init__(**kwargs)
+        self.child = child
+        self.min_length = min_length
+
+    def to_internal(self, value):
+        if not isinstance(value, list):
+            raise SchemaValidationError(
+                f'Expected a list of items but got type "{type(value).__name__}".')
+        items, errors = [], {}
+        for index, item in enumerate(value):
+            try:
+                items.append(self.child.run(item))
+            except SchemaValidationError as error:
+                errors[index] = _as_list(error.detail)
+        if errors:
+            raise SchemaValidationError(errors)
+        if self.min_length is not None and len(items) < self.min_length:
+            raise SchemaValidationError(
+                f'Ensure this field has at least {self.min_length} elements.')
+        return items
+
+    def to_representation(self, value):
+        represent = self.child.to_representation
+        return [represent(item) for item in value]
+
+
+class Dict(Field):
+    def __init__(self, child, **kwargs):
+        super().__init__(**kwargs)
+        self.child = child
+
+    def to_internal(self, value):
+        if not isinstance(value, dict):
+            raise SchemaValidationError(
+                f'Expected a dictionary of items but got type "{type(value).__name__}".')
+        items, errors = {}, {}
+        for key, item in value.items():
+            try:
+                items[str(key)] = self.child.run(item)
+            except SchemaValidationError as error:
+                errors[str(key)] = _as_list(error.detail)
+        if errors:
+            raise SchemaValidationError(errors)
+        return items
+
+    def to_representation(self, value):
+        represent = self.child.to_representation
+        return {str(key): represent(item) for key, item in value.items()}
+
+
+class Nested(Field):
+    def __init__(self, schema, many=False, **kwargs):
+        super().__init__(**kwargs)
+        self.schema = schema
+        self.many = many
+
+    def to_internal(self, value):
+        if self.many:
+            if not isinstance(value, list):
+                raise SchemaValidationError(
+                    f'Expected a list of items but got type "{type(value).__name__}".')
+            results = [self.schema.validate(item) for item in value]
+            if any(errors for _, errors in results):
+                raise SchemaValidationError([errors or {} for _, errors in results])
+            return [cleaned for cleaned, _ in results]
+
+        cleaned, errors = self.schema.validate(value)
+        if errors:
+            raise SchemaValidationError(errors)
+        return cleaned
+
+    def to_representation(self, value):
+        if self.many:
+            return [self.schema.dump(item) for item in value]
+        return self.schema.dump(value)
+
+
+def _as_list(detail):
+    return [detail] if isinstance(detail, str) else detail
+
+
+class Schema:
+    """
+    A set of fields compiled into flat tuples once, at import time.
+    validate() returns (cleaned_data, None) or (None, errors), errors being
+    shaped like DRF's serializer.errors. dump() builds an outbound message.
+    """
+
+    def __init__(self, fields, validators=()):
+        self.fields = fields
+        self.validators = tuple(validators)
+        self._writable = tuple(
+            (name, field) for name, field in fields.items() if not field.read_only)
+        self._readable = tuple(fields.items())
+
+    def validate(self, data):
+        if not isinstance(data, dict):
+            return None, {NON_FIELD_ERRORS: [
+                f'Invalid data. Expected a dictionary, but got {type(data).__name__}.']}
+
+        cleaned, errors = {}, {}
+        for name, field in self._writable:
+            value = data.get(name, MISSING)
+            if value is MISSING:
+                if field.default is not MISSING:
+                    cleaned[name] = field.default
+                elif field.required:
+                    errors[name] = [field.required_message]
+                continue
+            try:
+                cleaned[name] = field.run(value)
+            except SchemaValidationError as error:
+                errors[name] = _as_list(error.detail)
+
+        if errors:
+            return None, errors
+
+        for validator in self.validators:
+            try:
+                validator(cleaned)
+            except SchemaValidationError as error:
+                return None, {NON_FIELD_ERRORS: _as_list(error.detail)}
+        return cleaned, None
+
+    def dump(self, obj):
+        data = {}
+        for name, field in self._readable:
+            value = obj.get(name, MISSING)
+            if value is MISSING:
+                if field.default is MISSING:
+                    continue
+                value = field.default
+            data[name] = None if value is None else field.to_representation(value)
+        return data
+
+
+def unique_items(message):
+    def validator(value):
+        if len(set(value)) != len(value):
+            raise SchemaValidationError(message)
+        return value
+    return validator
+
+
+def non_zero(value):
+    if value == 0:
+        raise SchemaValidationError('Ensure this value is not zero.')
+    return value
+
+
+def votes_match_answers(data):
+    missing = [key for key in data['votes'].keys() if key not in data['answers']]
+    if missing:
+        raise SchemaValidationError(f'Missing votes for answers: {missing}')
+
+
+# Wipe counter messages
+
+MAX_WIPE_DELTA = 100
+
+WIPE_UPDATE = Schema({
+    'segment_id': Integer(min_value=1),
+    'count': Integer(min_value=0),
+})
+
+WIPE_INCREMENT = Schema({
+    'segment_id': Integer(min_value=1),
+    'delta': Integer(min_value=-MAX_WIPE_DELTA, max_value=MAX_WIPE_DELTA, validators=[non_zero]),
+})
+
+NEW_SEGMENT = Schema({
+    'segment_id': Integer(min_value=1),
+    'segment_name': String(max_length=50),
+    'count': Integer(min_value=0),
+    'is_finished': Boolean(default=False),
+})
+
+SEGMENT_FINISHED = Schema({
+    'segment_id': Integer(min_value=1),
+})
+
+RUN_FINISHED = Schema({
+    'type': Choice(['run_finished']),
+})
+
+WIPE_UPDATE_BROADCAST = Schema({
+    'type': Choice(['wipe_update']),
+    'segment_id': Integer(min_value=1),
+    'count': Integer(min_value=0),
+    'user': String(),
+})
+
+NEW_SEGMENT_BROADCAST = Schema({
+    'type': Choice(['new_segment']),
+    'segment_id': Integer(min_value=1),
+    'segment_name': String(max_length=50),
+    'count': Integer(min_value=0),
+    'is_finished': Boolean(default=False),
+    'user': String(),
+})
+
+SEGMENT_FINISHED_BROADCAST = Schema({
+    'type': Choice(['segment_finished']),
+    'segment_id': Integer(min_value=1),
+    'user': String(),
+})
+
+RUN_FINISHED_BROADCAST = Schema({
+    'type': Choice(['run_finished']),
+    'user': String(),
+})
+
+# Timer messages
+
+TIMER_START = Schema({
+    'segment_id': Integer(min_value=1),
+    'type': Choice(['start_timer']),
+})
+
+TIMER_PAUSE = Schema({
+    'segment_id': Integer(min_value=1),
+    'type': Choice(['pause_timer']),
+})
+
+TIMER_FINISH = Schema({
+    'segment_id': Integer(min_value=1),
+    'type': Choice(['finish_timer']),
+})
+
+TIMER_BROADCAST = Schema({
+    'type': Choice(['start_timer', 'timer_update', 'finish_timer', 'pause_timer',
+                    'run_finished']),
+    'segment_id': Integer(min_value=1, required=False),
+    'segment_name': String(max_length=50, required=False),
+    'elapsed_time': Float(min_value=0.0, required=False),
+    'user': String(),
+    'started_at': DateTime(required=False, allow_null=True),
+    'is_finished': Boolean(default=False),
+})
+
+TIMER_SEGMENT_STATE = Schema({
+    'segment_id': Integer(min_value=1),
+    'elapsed_time': Float(min_value=0.0),
+    'started_at': DateTime(allow_null=True),
+    'is_finished': Boolean(),
+})
+
+TIMER_STATE = Schema({
+    'type': Choice(['timer_state']),
+    'segments': Nested(TIMER_SEGMENT_STATE, many=True),
+})
+
+CLOCK_SYNC = Schema({
+    'type': Choice(['clock_sync']),
+    'client_time': Float(min_value=0.0),
+})
+
+CLOCK_SYNC_REPLY = Schema({
+    'type': Choice(['clock_sync']),
+    'client_time': Float(min_value=0.0),
+    'server_time': Integer(min_value=0),
+})
+
+NEW_TIMER_SEGMENT = Schema({
+    'type': Choice(['new_segment']),
+    'segment_id': Integer(min_value=1),
+    'segment_name': String(max_length=50),
+    'elapsed_time': Float(min_value=0.0),
+    'is_finished': Boolean(default=False),
+    'user': String(required=False),
+})
+
+# Poll messages
+
+POLL_QUESTION = Schema({
+    'id': String(read_only=True),
+    'question': String(max_length=300),
+    'answers': List(String(max_length=100), min_length=2, validators=[
+        unique_items('Question cannot have duplicate answers.')]),
+    'votes': Dict(Integer(), required=False),
+    'vote_mode': Choice(VOTE_MODE_CHOICES, default=VOTE_MODE_SINGLE),
+    'version': Integer(read_only=True),
+})
+
+POLL_VOTE = Schema({
+    'question_id': String(max_length=100),
+    'answer': String(max_length=100),
+})
+
+VOTER_IDENTITY = Schema({
+    'type': Choice(['voter_identity']),
+    'voter_token': String(),
+})
+
+PUBLISHED_QUESTION = Schema({
+    'type': Choice(['publish_question']),
+    'question_id': String(max_length=100),
+    'question_data': Nested(POLL_QUESTION),
+})
+
+VOTE_UPDATE = Schema({
+    'type': Choice(['vote']),
+    'question_id': String(max_length=100),
+    'answers': List(String(max_length=100), min_length=2, validators=[
+        unique_items('Question cannot have duplicate answers.')]),
+    'votes': Dict(Integer(min_value=0)),
+}, validators=[votes_match_answers])
+
+QUESTIONS_SNAPSHOT = Schema({
+    'type': Choice(['questions_snapshot']),
+    'version': Integer(min_value=0),
+    'questions': Nested(POLL_QUESTION, many=True),
+})
+
+QUESTIONS_DIFF = Schema({
+    'type': Choice(['questions_diff']),
+    'since': Integer(min_value=0),
+    'version': Integer(min_value=0),
+    'questions': Nested(POLL_QUESTION, many=True),
+})
+
+DELETE_QUESTION = Schema({
+    'type': Choice(['delete_question']),
+    'question_id': String(max_length=100),
+})
+
+UNPUBLISH_QUESTION = Schema({
+    'type': Choice(['unpublish_question']),
+})
+
+RESYNC = Schema({
+    'type': Choice(['resync']),
+    'seq': Integer(min_value=0),
+})
+
+# Run channel messages
+
+RUN_CHANNEL_STREAMS = ['wipe', 'timer', 'poll']
+
+STREAM_SUBSCRIBE = Schema({
+    'type': Choice(['subscribe']),
+    'stream': Choice(RUN_CHANNEL_STREAMS),
+    'since': Integer(min_value=0, required=False),
+    'token': String(max_length=100, required=False),
+})
+
+STREAM_UNSUBSCRIBE = Schema({
+    'type': Choice(['unsubscribe']),
+    'stream': Choice(RUN_CHANNEL_STREAMS),
+})
+
+STREAM_ACK = Schema({
+    'type': Choice(['subscribed', 'unsubscribed']),
+})
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import counters, timer_engine
+from .caches import invalidate_run_owner, invalidate_user
+from .models import Run, WipeCounter, Timer
+from .run_snapshots import invalidate_run_snapshots
+
+
+@receiver([post_save, post_delete], sender=Run)
+def drop_run_snapshots(sender, instance, **kwargs):
+    """Drops cached overlay snapshots when a run is changed or deleted."""
+    invalidate_run_snapshots(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Run)
+def drop_run_owner(sender, instance, **kwargs):
+    """Drops the cached owner of a run when it is saved, e.g. transferred, or deleted."""
+    invalidate_run_owner(instance.id)
+
+
+@receiver([post_save, post_delete], sender=WipeCounter)
+@receiver([post_save, post_delete], sender=Timer)
+def drop_segment_run_snapshots(sender, instance, **kwargs):
+    """Drops cached overlay snapshots of the run a segment belongs to."""
+    invalidate_run_snapshots(instance.run_id)
+
+
+@receiver([post_save, post_delete], sender=WipeCounter)
+def drop_pending_count(sender, instance, **kwargs):
+    """Drops a queued count of a segment that was saved or deleted, e.g. through the REST API."""
+    counters.drop_pending_count(instance.run_id, instance.id)
+
+
+@receiver(post_save, sender=Timer)
+def reload_timer_state(sender, instance, **kwargs):
+    """Makes the timer engine load a saved segment again, unless its timer is running."""
+    timer_engine.drop_segment(instance.run_id, instance.id)
+
+
+@receiver(post_delete, sender=Timer)
+def drop_timer_state(sender, instance, **kwargs):
+    """Removes a deleted segment from the timer engine."""
+    timer_engine.drop_segment(instance.run_id, instance.id, force=True)
+
+
+@receiver(post_delete, sender=Run)
+def drop_run_timer_state(sender, instance, **kwargs):
+    """Removes the segments of a deleted run from the timer engine."""
+    timer_engine.drop_run(instance.id)
+
+
+@receiver(post_save, sender=Run)
+def clear_new_run_timer_state(sender, instance, created, **kwargs):
+    """Clears timer state left behind under the id of a new run, e.g. by a recreated database."""
+    if created:
+        timer_engine.drop_run(instance.id)
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def drop_cached_user(sender, instance, **kwargs):
+    """Drops the cached user of WebSocket authentication when the user is saved or deleted."""
+    invalidate_user(instance.id)
@@ -0,0 +1,76 @@
+"""
+Sequence numbers and replay buffers of the channel-layer groups.
+
+Every event broadcast to a group is numbered from a per-group counter and kept
+in a bounded buffer, a sorted set scored by sequence number. A client that
+reconnects with ?since=<seq> is sent the events it missed from that buffer
+instead of reloading its whole state.
+"""
+from django.conf import settings
+from . import codec
+
+# KEYS: seq, events; ARGV: event encoded as a compact JSON object, buffer length, ttl.
+# Assigning the number and buffering the event atomically keeps the buffer free
+# of gaps: two senders cannot store seq N+1 before seq N is stored.
+# The number is appended to the event as its last field.
+# Returns {seq, event json with the seq}.
+APPEND_EVENT_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+local fields = string.sub(ARGV[1], 2, -2)
+if fields ~= '' then
+    fields = fields .. ','
+end
+local text = '{' .. fields .. '"seq":' .. seq .. '}'
+redis.call('ZADD', KEYS[2], seq, text)
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[2]) - 1)
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return {seq, text}
+"""
+
+
+def seq_key(group_name):
+    return f'stream:{group_name}:seq'
+
+
+def events_key(group_name):
+    return f'stream:{group_name}:events'
+
+
+async def append_event(script, group_name, data):
+    """
+    Numbers an event with the group's next sequence number and adds it to the
+    group's replay buffer, in one step. `script` is APPEND_EVENT_SCRIPT
+    registered on the asyncio client. Returns (seq, the event encoded as JSON).
+    """
+    seq, text = await script(
+        keys=[seq_key(group_name), events_key(group_name)],
+        args=[codec.dumps(data), settings.EVENT_STREAM_LENGTH, settings.EVENT_STREAM_TTL],
+    )
+    return int(seq), text
+
+
+async def current_seq(client, group_name):
+    """Returns the sequence number of the group's latest event, 0 if it has none."""
+    return int(await client.get(seq_key(group_name)) or 0)
+
+
+async def events_since(client, group_name, since):
+    """
+    Returns (seq, events): the group's current sequence number and the encoded
+    events numbered after `since`, oldest first. `events` is None when the buffer
+    no longer holds all of them, or the stream restarted after expiring.
+    """
+    key = events_key(group_name)
+    pipe = client.pipeline(transaction=False)
+    pipe.get(seq_key(group_name))
+    pipe.zrange(key, 0, 0, withscores=True)
+    pipe.zrangebyscore(key, f'({since}', '+inf')
+    seq, oldest, events = await pipe.execute()
+    seq = int(seq or 0)
+
+    if since == seq:
+        return seq, []
+    if since > seq or not oldest or oldest[0][1] > since + 1:
+        return seq, None
+    return seq, events
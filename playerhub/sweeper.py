@@ -0,0 +1,87 @@
+"""
+Incremental reclamation of poll keys that outlived their session or never got an expiry.
+"""
+import re
+from . import poll_store
+
+SESSION_KEY_RE = re.compile(
+    r'^poll:session:([^:]+)'
+    r'(?::(questions|version|synced_version|question_data|votes|voters:[^:]+))?$')
+TOKEN_MAP_KEY_RE = re.compile(r'^poll:token_map:(.+)$')
+
+
+def _owner_key(client, key):
+    """
+    Returns the key whose lifetime `key` should share, or None when the key
+    has no owner and only needs the default session TTL.
+    """
+    match = SESSION_KEY_RE.match(key)
+    if match:
+        return poll_store.session_key(match.group(1)) if match.group(2) else None
+
+    match = TOKEN_MAP_KEY_RE.match(key)
+    if match:
+        session_id = client.get(key)
+        return poll_store.session_key(session_id) if session_id else None
+
+    return None
+
+
+def _prune_questions_list(client, session_id):
+    """Removes ids of questions that no longer exist from a session's question list."""
+    key = poll_store.session_questions_key(session_id)
+    pipe = client.pipeline(transaction=False)
+    pipe.lrange(key, 0, -1)
+    pipe.hkeys(poll_store.session_question_data_key(session_id))
+    question_ids, stored = pipe.execute()
+
+    stored = set(stored)
+    pruned = 0
+    for question_id in question_ids:
+        if question_id not in stored:
+            pruned += client.lrem(key, 0, question_id)
+    return pruned
+
+
+def sweep_step(client, cursor=0, count=500):
+    """
+    Runs one SCAN step over the poll keyspace and returns (next_cursor, stats).
+    A cursor of 0 in the result means a full pass has completed.
+
+    Keys without an expiry get the remaining lifetime of the key they belong to
+    (the session hash), or are deleted when that key is gone.
+    Keys without an owner get POLL_SESSION_TTL. Question lists drop ids of
+    questions that have expired.
+    """
+    stats = {'scanned': 0, 'expired': 0, 'deleted': 0, 'pruned': 0}
+    cursor, keys = client.scan(cursor=cursor, match='poll:*', count=count)
+    if not keys:
+        return cursor, stats
+
+    stats['scanned'] = len(keys)
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.pttl(key)
+    ttls = pipe.execute()
+
+    for key, ttl in zip(keys, ttls):
+        match = SESSION_KEY_RE.match(key)
+        if match and match.group(2) == 'questions' and ttl != -2:
+            stats['pruned'] += _prune_questions_list(client, match.group(1))
+
+        if ttl != -1:
+            continue
+
+        owner = _owner_key(client, key)
+        owner_ttl = client.pttl(owner) if owner else -1
+        if owner_ttl == -2:
+            client.delete(key)
+            stats['deleted'] += 1
+        elif owner_ttl > 0:
+            client.pexpire(key, owner_ttl)
+            stats['expired'] += 1
+        else:
+            client.expire(key, poll_store.POLL_SESSION_TTL)
+            stats['expired'] += 1
+
+    return cursor, stats
@@ -1,8 +1,16 @@
 import pytest
 from rest_framework.test import APIClient
+from playerhub.caches import token_sessions
 
 
 @pytest.fixture
 def client():
     client = APIClient()
     return client
+
+
+@pytest.fixture(autouse=True)
+def clear_token_sessions():
+    token_sessions.clear()
+    yield
+    token_sessions.clear()
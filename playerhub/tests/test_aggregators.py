@@ -0,0 +1,36 @@
+import asyncio
+import uuid
+import pytest
+from playerhub import codec
+from playerhub.aggregators import VoteAggregator
+
+
+class ChannelLayer:
+    """Records group sends; the first one waits until `release` is set."""
+
+    def __init__(self):
+        self.sent = []
+        self.sending = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def group_send(self, group_name, event):
+        if not self.sending.is_set():
+            self.sending.set()
+            await self.release.wait()
+        self.sent.append(codec.loads(event['text']))
+
+
+@pytest.mark.asyncio
+async def test_votes_queued_during_a_flush_are_broadcast():
+    group_name = f'poll_{uuid.uuid4().hex[:8]}'
+    channel_layer = ChannelLayer()
+    aggregator = VoteAggregator(0.01)
+
+    aggregator.add(channel_layer, group_name, {'question_id': 'q-1', 'votes': {'x': 1}})
+    await channel_layer.sending.wait()
+    aggregator.add(channel_layer, group_name, {'question_id': 'q-1', 'votes': {'x': 2}})
+    channel_layer.release.set()
+    await asyncio.sleep(0.1)
+
+    assert [message['votes'] for message in channel_layer.sent] == [{'x': 1}, {'x': 2}], \
+        'Queued tally was not broadcast'
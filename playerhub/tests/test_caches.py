@@ -0,0 +1,75 @@
+import time
+import uuid
+import pytest
+from django.conf import settings
+import redis
+from asgiref.sync import async_to_sync
+from playerhub.caches import (TTLCache, aget_run_owner, get_token_session, run_owner_key,
+                              run_owner_generation_key, token_sessions)
+from playerhub.redis_client import get_redis, get_script
+from playerhub.run_snapshots import SNAPSHOT_SET_SCRIPT
+from .factories import RunFactory, WipeCounterFactory
+r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1, 'Recently used entry was evicted'
+    assert cache.get('b') is None, 'Least recently used entry was not evicted'
+    assert cache.get('c') == 3, 'New entry was not stored'
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('a', 1, ttl=0.05)
+    assert cache.get('a') == 1, 'Entry expired too early'
+
+    time.sleep(0.1)
+    assert cache.get('a') is None, 'Entry did not expire'
+
+
+def test_token_session_cache_honours_key_expiry():
+    token = f'{uuid.uuid4().hex[:6]}-viewer'
+    r.set(f'poll:token_map:{token}', 'session', px=100)
+
+    assert get_token_session(r, token) == 'session', 'Token was not resolved'
+    assert token_sessions.get(token) == 'session', 'Token lookup was not cached'
+
+    time.sleep(0.2)
+    assert get_token_session(r, token) is None, 'Expired token was served from the cache'
+
+
+def test_token_session_cache_skips_unknown_tokens():
+    token = f'{uuid.uuid4().hex[:6]}-viewer'
+
+    assert get_token_session(r, token) is None, 'Unknown token was resolved'
+    assert token_sessions.get(token) is None, 'Unknown token was cached'
+
+
+async def get_run_owner(run_id):
+    return await aget_run_owner(get_redis(), get_script(SNAPSHOT_SET_SCRIPT), run_id)
+
+
+@pytest.mark.django_db
+def test_run_owner_is_cached():
+    run = RunFactory()
+    run_id = run.id
+
+    assert async_to_sync(get_run_owner)(run_id) == run.user_id, 'Wrong owner'
+    assert r.get(run_owner_key(run_id)) == str(run.user_id), 'Owner was not cached'
+
+    generation = r.get(run_owner_generation_key(run_id))
+    WipeCounterFactory(run=run)
+    assert r.get(run_owner_generation_key(run_id)) == generation, \
+        'Segment change invalidated the owner'
+
+    run.delete()
+    assert r.get(run_owner_key(run_id)) is None, 'Owner of a deleted run is still cached'
+    assert r.ttl(run_owner_generation_key(run_id)) >= settings.RUN_OWNER_CACHE_TTL, \
+        'Owner generation expires before the owners read against it'
+    assert async_to_sync(get_run_owner)(run_id) is None, 'Deleted run has an owner'
@@ -0,0 +1,74 @@
+import io
+import uuid
+import msgpack
+import pytest
+from rest_framework.exceptions import ParseError
+from playerhub import codec, schemas
+from playerhub.protocol import MessageProtocolMixin
+from playerhub.renderers import CodecJSONParser, CodecJSONRenderer
+from playerhub.serializers import PollQuestionSerializer
+
+MESSAGE = {'type': 'vote', 'question_id': 'q-1', 'answers': ['Tak', 'Żółw'],
+           'votes': {'Tak': 1, 'Żółw': 0}}
+
+
+@pytest.mark.parametrize('backend', [codec.StdlibBackend, codec.get_backend('orjson')])
+def test_codec_backends_round_trip(backend):
+    assert backend.loads(backend.dumps(MESSAGE)) == MESSAGE, 'Text round trip failed'
+    assert backend.loads(backend.dumpb(MESSAGE)) == MESSAGE, 'Bytes round trip failed'
+
+    with pytest.raises(codec.DecodeError):
+        backend.loads('{"type": ')
+
+
+def test_codec_falls_back_to_stdlib(monkeypatch):
+    monkeypatch.setattr(codec, 'orjson', None)
+    assert codec.get_backend('orjson') is codec.StdlibBackend, 'Missing orjson was not handled'
+    assert codec.get_backend('stdlib') is codec.StdlibBackend, 'Wrong backend'
+
+
+def test_renderer_and_parser():
+    data = {'id': uuid.UUID(int=1), 'name': 'Run'}
+    rendered = CodecJSONRenderer().render(data)
+
+    assert CodecJSONParser().parse(io.BytesIO(rendered)) == {
+        'id': str(uuid.UUID(int=1)),
+        'name': 'Run'
+    }, 'Rendered data does not parse back'
+    assert CodecJSONRenderer().render(None) == b'', 'Empty response was not rendered'
+
+    with pytest.raises(ParseError):
+        CodecJSONParser().parse(io.BytesIO(b'{"name": '))
+
+
+def test_list_field_errors_are_rendered():
+    serializer = PollQuestionSerializer(data={'question': 'Q', 'answers': ['a', 'b' * 200]})
+    assert not serializer.is_valid(), 'Long answer was accepted'
+
+    rendered = CodecJSONParser().parse(io.BytesIO(CodecJSONRenderer().render(serializer.errors)))
+    assert list(rendered['answers']) == ['1'], 'Item errors were not keyed by index'
+
+    _, errors = schemas.POLL_QUESTION.validate({'question': 'Q', 'answers': ['a', 'b' * 200]})
+    assert codec.loads(codec.dumps({'type': 'error', 'error': errors}))['error']['answers']['1'], \
+        'Schema item errors were not encoded'
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('use_msgpack', [False, True])
+async def test_list_field_errors_are_sent(use_msgpack):
+    frames = []
+
+    class Client(MessageProtocolMixin):
+        async def send(self, text_data=None, bytes_data=None):
+            frames.append(text_data if bytes_data is None else bytes_data)
+
+    client = Client()
+    client.use_msgpack = use_msgpack
+    _, errors = schemas.POLL_QUESTION.validate({'question': 'Q', 'answers': ['a', 'b' * 200]})
+    await client.send_message({'type': 'error', 'error': errors})
+
+    if use_msgpack:
+        message = msgpack.unpackb(frames[0], strict_map_key=False)
+    else:
+        message = codec.loads(frames[0])
+    assert message['type'] == 'error' and message['error']['answers'], 'Error frame was not sent'
@@ -0,0 +1,46 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.utils.functional import empty
+from rest_framework_simplejwt.tokens import AccessToken
+from playerhub.caches import users
+from playerhub.middleware import JWTAuthMiddleware, resolve_user, token_user_id
+from .factories import UserFactory
+
+
+async def connect(query_string):
+    """Passes a connection through the middleware and returns the scope the consumer gets."""
+    scopes = []
+
+    async def inner(scope, receive, send):
+        scopes.append(scope)
+
+    await JWTAuthMiddleware(inner)({'type': 'websocket', 'query_string': query_string},
+                                   None, None)
+    return scopes[0]
+
+
+@pytest.mark.django_db
+def test_token_user_is_resolved_lazily():
+    user = UserFactory()
+    token = str(AccessToken.for_user(user))
+
+    scope = async_to_sync(connect)(f'token={token}'.encode())
+    assert scope['user_id'] == user.id, 'Wrong user id'
+    assert scope['user']._wrapped is empty, 'User was loaded before it was read'
+
+    assert async_to_sync(resolve_user)(scope).id == user.id, 'Wrong user'
+    assert users.get(user.id) is not None, 'User was not cached'
+
+    user.save()
+    assert users.get(user.id) is None, 'Saved user is still cached'
+
+
+@pytest.mark.django_db
+def test_invalid_tokens_resolve_to_anonymous_users():
+    scope = async_to_sync(connect)(b'token=invalid')
+    assert scope['user_id'] is None, 'Invalid token was accepted'
+    assert not async_to_sync(resolve_user)(scope).is_authenticated, 'Invalid token authenticated'
+
+    scope = async_to_sync(connect)(b'')
+    assert not async_to_sync(resolve_user)(scope).is_authenticated, 'Missing token authenticated'
+    assert async_to_sync(token_user_id)('a.b.c') is None, 'Malformed token was accepted'
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from playerhub.outbox import CoalescingOutbox, metrics
+from .factories import UserFactory
+
+
+async def make_outbox(maxsize=10):
+    """Returns an outbox whose sends block until `gate` is set, and the list of sent events."""
+    sent = []
+    resyncs = []
+    gate = asyncio.Event()
+
+    async def send(event):
+        await gate.wait()
+        sent.append(event)
+
+    async def on_overflow():
+        resyncs.append(True)
+
+    outbox = CoalescingOutbox(send, maxsize, on_overflow)
+    return outbox, gate, sent, resyncs
+
+
+@pytest.mark.asyncio
+async def test_outbox_coalesces_superseded_events():
+    outbox, gate, sent, _ = await make_outbox()
+    outbox.put({'seq': 1}, 'wipe_update:1')
+    await asyncio.sleep(0)
+
+    outbox.put({'seq': 2}, 'wipe_update:2')
+    outbox.put({'seq': 3})
+    outbox.put({'seq': 4}, 'wipe_update:2')
+    gate.set()
+    await asyncio.sleep(0.05)
+
+    assert [event['seq'] for event in sent] == [1, 3, 4], 'Superseded event was sent'
+    outbox.close()
+
+
+@pytest.mark.asyncio
+async def test_outbox_overflow_resends_state():
+    outbox, gate, sent, resyncs = await make_outbox(maxsize=2)
+    outbox.put({'seq': 1})
+    await asyncio.sleep(0)
+
+    overflows = metrics.overflows
+    for seq in range(2, 6):
+        outbox.put({'seq': seq})
+    assert len(outbox) <= 2, 'Queue grew past its depth'
+    assert metrics.overflows == overflows + 1, 'Overflow was not counted'
+
+    gate.set()
+    await asyncio.sleep(0.05)
+    assert resyncs, 'State was not resent after overflow'
+    assert [event['seq'] for event in sent] == [1, 5], 'Discarded events were sent'
+    outbox.close()
+
+
+@pytest.mark.asyncio
+async def test_outbox_keeps_draining_after_a_failed_send():
+    sent = []
+
+    async def send(event):
+        if event['seq'] == 1:
+            raise ConnectionError('socket is closing')
+        sent.append(event)
+
+    async def on_overflow():
+        raise ConnectionError('snapshot could not be built')
+
+    outbox = CoalescingOutbox(send, 2, on_overflow)
+    outbox.put({'seq': 1})
+    await asyncio.sleep(0.01)
+    for seq in range(2, 5):
+        outbox.put({'seq': seq})
+    await asyncio.sleep(0.01)
+    outbox.put({'seq': 5})
+    await asyncio.sleep(0.01)
+
+    assert [event['seq'] for event in sent] == [5], 'Outbox stopped after a failed send'
+    outbox.close()
+
+
+@pytest.mark.django_db
+def test_outbox_metrics_require_admin(client):
+    client.force_authenticate(user=UserFactory())
+    response = client.get('/api/metrics/overlay-outbox/')
+    assert response.status_code == 403, 'Metrics were exposed to a regular user'
+
+    client.force_authenticate(user=UserFactory(is_staff=True))
+    response = client.get('/api/metrics/overlay-outbox/')
+    assert response.status_code == 200, 'Metrics were not returned'
+    assert 'coalesced' in response.data, 'Counters are missing'
@@ -3,6 +3,7 @@ import pytest
 from django.conf import settings
 import redis
 import json
+from playerhub import poll_store
 r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
 
 
@@ -29,8 +30,11 @@ def test_create_poll_session(client):
     assert r.get(f'poll:token_map:{overlay_token}') == session_id, \
         'Overlay token was not mapped to session ID'
 
-    session_exists = r.get(f'poll:session:{session_id}')
-    assert session_exists is not None, 'Session was not stored in Redis'
+    session = r.hgetall(f'poll:session:{session_id}')
+    assert session['session_id'] == session_id, 'Session was not stored in Redis'
+    assert session['published_question_id'] == '', 'Session has a published question'
+    assert session['moderator_token'] == moderator_token, 'Moderator token was not stored'
+    assert 0 < r.ttl(f'poll:session:{session_id}') <= 86400, 'Session does not expire'
 
 
 def test_add_poll(client):
@@ -52,11 +56,31 @@ def test_add_poll(client):
     assert response_json['question'] == data['question']
     assert response_json['answers'] == data['answers']
 
-    redis_key = f'poll:question:{response_json["id"]}'
-    stored = r.get(redis_key)
+    stored = r.hget(f'poll:session:{session_id}:question_data', response_json['id'])
     assert stored is not None, 'Poll was not stored in Redis'
 
 
+@pytest.mark.django_db
+def test_add_poll_keys_share_session_expiry(client):
+    response = client.post('/api/polls/create_session/', {}, format='json')
+    session_id = response.json()['session_id']
+    moderator_token = response.json()['moderator_url'].split('/m/')[1]
+    r.expire(f'poll:session:{session_id}', 600)
+
+    response = client.post(f'/api/polls/m/{moderator_token}/add_poll/',
+                           {'question': 'Test Question', 'answers': ['Yes', 'No']},
+                           format='json')
+    assert response.status_code == 201, 'Poll was not created'
+    question_id = response.json()['id']
+
+    assert r.hexists(f'poll:session:{session_id}:question_data', question_id), \
+        'Poll was not stored in Redis'
+    for key in [f'poll:session:{session_id}:question_data',
+                f'poll:session:{session_id}:questions',
+                f'poll:session:{session_id}:version']:
+        assert 0 < r.ttl(key) <= 600, f'{key} does not expire with the session'
+
+
 def test_list_poll_questions(client):
     session_id = str(uuid.uuid4())
     moderator_token = f'{session_id}-mod-test'
@@ -67,19 +91,19 @@ def test_list_poll_questions(client):
     r.rpush(f'poll:session:{session_id}:questions',
             question_id_1, question_id_2)
 
-    r.set(f'poll:question:{question_id_1}', json.dumps({
+    r.hset(f'poll:session:{session_id}:question_data', question_id_1, json.dumps({
         'id': question_id_1,
         'question': 'Question 1',
         'answers': ['Yes', 'No'],
         'votes': {'Yes': 0, 'No': 0}
-    }), ex=60)
+    }))
 
-    r.set(f'poll:question:{question_id_2}', json.dumps({
+    r.hset(f'poll:session:{session_id}:question_data', question_id_2, json.dumps({
         'id': question_id_2,
         'question': 'Question 2',
         'answers': ['Yes', 'No'],
         'votes': {'Yes': 0, 'No': 0}
-    }), ex=60)
+    }))
 
     response = client.get(f'/api/polls/m/{moderator_token}/')
     assert response.status_code == 200, 'Questions were not retrieved'
@@ -96,19 +120,78 @@ def test_delete_poll_question(client):
 
     r.set(f'poll:token_map:{client_token}', session_id, ex=60)
     r.rpush(f'poll:session:{session_id}:questions', question_id)
-    r.set(f'poll:question:{question_id}', json.dumps({
+    r.hset(f'poll:session:{session_id}:question_data', question_id, json.dumps({
         'id': question_id,
         'question': 'Question 1',
         'answers': ['Yes', 'No'],
         'votes': {'Yes': 0, 'No': 0}
-    }), ex=60)
+    }))
+    r.hset(f'poll:session:{session_id}:votes', mapping={f'{question_id}:Yes': 1, 'q-other:Yes': 2})
 
     response = client.delete(f'/api/polls/m/{client_token}/delete/{question_id}/')
     assert response.status_code == 200, 'Question was not deleted'
 
     print("Response code:", response.status_code)
-    print("Remaining keys:", r.keys(f'poll:*{question_id}*'))
-    assert r.get(f'poll:question:{question_id}') is None, \
+    print("Remaining keys:", r.keys(f'poll:*{session_id}*'))
+    assert not r.hexists(f'poll:session:{session_id}:question_data', question_id), \
         'Question was not deleted from Redis'
+    assert not r.hexists(f'poll:session:{session_id}:votes', f'{question_id}:Yes'), \
+        'Tallies of the question were not deleted'
+    assert r.hget(f'poll:session:{session_id}:votes', 'q-other:Yes') == '2', \
+        'Tallies of another question were deleted'
     assert question_id not in r.lrange(
         f'poll:session:{session_id}:questions', 0, -1), 'Question was not removed from session'
+
+
+def test_list_poll_questions_skips_expired_questions(client):
+    session_id = str(uuid.uuid4())
+    moderator_token = f'{session_id}-mod-test'
+    question_id_1 = f'q-{uuid.uuid4().hex[:6]}'
+    question_id_2 = f'q-{uuid.uuid4().hex[:6]}'
+    expired_question_id = f'q-{uuid.uuid4().hex[:6]}'
+
+    r.set(f'poll:token_map:{moderator_token}', session_id, ex=60)
+    r.rpush(f'poll:session:{session_id}:questions',
+            question_id_2, expired_question_id, question_id_1)
+
+    for question_id, text in [(question_id_1, 'Question 1'), (question_id_2, 'Question 2')]:
+        r.hset(f'poll:session:{session_id}:question_data', question_id, json.dumps({
+            'id': question_id,
+            'question': text,
+            'answers': ['Yes', 'No'],
+            'votes': {'Yes': 0, 'No': 0}
+        }))
+    r.hset(f'poll:session:{session_id}:votes',
+           mapping={f'{question_id_1}:Yes': 3, f'{question_id_1}:No': 1})
+
+    response = client.get(f'/api/polls/m/{moderator_token}/')
+    assert response.status_code == 200, 'Questions were not retrieved'
+    data = response.json()
+    assert [q['id'] for q in data] == [question_id_2, question_id_1], \
+        'Questions were not returned in session order'
+    assert data[1]['votes'] == {'Yes': 3, 'No': 1}, 'Live tallies were not returned'
+
+
+def test_fetch_questions_uses_one_round_trip(monkeypatch):
+    session_id = str(uuid.uuid4())
+    question_id = f'q-{uuid.uuid4().hex[:6]}'
+    r.rpush(f'poll:session:{session_id}:questions', question_id)
+    r.hset(f'poll:session:{session_id}:question_data', question_id, json.dumps({
+        'id': question_id,
+        'question': 'Question 1',
+        'answers': ['Yes', 'No'],
+    }))
+
+    round_trips = []
+    execute = redis.client.Pipeline.execute
+
+    def counted_execute(pipe, *args, **kwargs):
+        round_trips.append(len(pipe.command_stack))
+        return execute(pipe, *args, **kwargs)
+
+    monkeypatch.setattr(redis.client.Pipeline, 'execute', counted_execute)
+    monkeypatch.setattr(r, 'execute_command', None)
+
+    questions = poll_store.fetch_questions(r, session_id)
+    assert [q['id'] for q in questions] == [question_id], 'Questions were not loaded'
+    assert len(round_trips) == 1, 'Questions were not loaded in one round trip'
@@ -0,0 +1,52 @@
+import uuid
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from playerhub import revocation
+from playerhub.middleware import token_user_id
+from .factories import UserFactory
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = revocation.BloomFilter(capacity=1000, error_rate=0.01)
+    items = [uuid.uuid4().hex for _ in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items), 'Added item was not found'
+    false_positives = sum(uuid.uuid4().hex in bloom for _ in range(1000))
+    assert false_positives < 50, 'Too many false positives'
+
+
+@pytest.mark.django_db
+def test_revoked_tokens_are_rejected():
+    user = UserFactory()
+    token = AccessToken.for_user(user)
+    other = AccessToken.for_user(user)
+    assert async_to_sync(token_user_id)(str(token)) == user.id, 'Valid token was rejected'
+
+    revocation.revoke(token)
+    assert revocation.is_revoked(token), 'Revoked token was accepted'
+    assert not revocation.is_revoked(other), 'Token was revoked with another one'
+    assert async_to_sync(token_user_id)(str(token)) is None, 'WebSocket accepted a revoked token'
+
+    revocation.reset()
+    assert revocation.is_revoked(token), 'Revocation was lost when the filter was rebuilt'
+
+
+@pytest.mark.django_db
+@override_settings(TOKEN_REVOCATION_REFRESH_INTERVAL=0)
+def test_filter_is_only_rebuilt_after_revocations():
+    user = UserFactory()
+    token = AccessToken.for_user(user)
+    revocation.reset()
+
+    assert not revocation.is_revoked(token), 'Valid token was rejected'
+    revoked = revocation._filter
+    assert not revocation.is_revoked(token), 'Valid token was rejected'
+    assert revocation._filter is revoked, 'Filter was rebuilt without a revocation'
+
+    revocation.revoke(AccessToken.for_user(user))
+    assert not revocation.is_revoked(token), 'Valid token was rejected'
+    assert revocation._filter is not revoked, 'Filter was not rebuilt after a revocation'
@@ -0,0 +1,66 @@
+from playerhub import schemas
+from playerhub.timer_engine import segment_state
+
+
+def test_schema_validates_and_coerces():
+    validated_data, errors = schemas.NEW_SEGMENT.validate({
+        'segment_id': '3',
+        'segment_name': '  Boss  ',
+        'count': 0,
+    })
+
+    assert errors is None, 'Valid message was rejected'
+    assert validated_data == {
+        'segment_id': 3,
+        'segment_name': 'Boss',
+        'count': 0,
+        'is_finished': False,
+    }, 'Message was not coerced like the DRF fields'
+
+
+def test_schema_reports_field_errors():
+    validated_data, errors = schemas.WIPE_UPDATE.validate({'segment_id': 0, 'count': 'x'})
+
+    assert validated_data is None, 'Invalid message was accepted'
+    assert errors == {
+        'segment_id': ['Ensure this value is greater than or equal to 1.'],
+        'count': ['A valid integer is required.'],
+    }, 'Wrong errors'
+
+    _, errors = schemas.POLL_VOTE.validate({'question_id': ' '})
+    assert errors == {
+        'question_id': ['This field may not be blank.'],
+        'answer': ['This field is required.'],
+    }, 'Wrong errors'
+
+
+def test_schema_runs_message_validators():
+    _, errors = schemas.VOTE_UPDATE.validate({
+        'type': 'vote',
+        'question_id': 'q-1',
+        'answers': ['Yes', 'No'],
+        'votes': {'Yes': 1, 'Maybe': 2},
+    })
+
+    assert errors == {'non_field_errors': ["Missing votes for answers: ['Maybe']"]}, \
+        'Cross-field validation did not run'
+
+
+def test_schema_dump_matches_broadcast_format():
+    validated_data, _ = schemas.TIMER_START.validate({
+        'type': 'start_timer',
+        'segment_id': 1,
+        'elapsed_time': 12.0,
+        'started_at': '2025-05-01T18:30:00+02:00',
+    })
+    state = segment_state(1, 0, 1746117000000, 0)
+    broadcast = schemas.TIMER_BROADCAST.dump({**validated_data, **state, 'user': 'streamer'})
+
+    assert broadcast == {
+        'type': 'start_timer',
+        'segment_id': 1,
+        'elapsed_time': 0.0,
+        'user': 'streamer',
+        'started_at': '2025-05-01T16:30:00Z',
+        'is_finished': False,
+    }, 'Broadcast does not match the DRF output'
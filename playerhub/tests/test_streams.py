@@ -0,0 +1,56 @@
+import asyncio
+import uuid
+import pytest
+from django.test import override_settings
+from playerhub import codec, streams
+from playerhub.protocol import sequenced_event
+from playerhub.redis_client import get_redis
+
+
+@pytest.mark.asyncio
+async def test_sequenced_events_are_numbered_and_buffered():
+    group_name = f'run_{uuid.uuid4().hex[:8]}'
+
+    first = await sequenced_event(group_name, 'wipe_update', {'type': 'wipe_update', 'count': 1})
+    second = await sequenced_event(group_name, 'wipe_update', {'type': 'wipe_update', 'count': 2})
+
+    seq, events = await streams.events_since(get_redis(), group_name, 1)
+    assert seq == 2, 'Sequence number was not advanced'
+    assert events == [second['text']], 'Wrong events replayed'
+    assert codec.loads(first['text'])['seq'] == 1, 'Event was not numbered'
+
+
+@pytest.mark.asyncio
+async def test_events_since_reports_gap_beyond_buffer():
+    group_name = f'run_{uuid.uuid4().hex[:8]}'
+
+    with override_settings(EVENT_STREAM_LENGTH=2):
+        for _ in range(4):
+            await sequenced_event(group_name, 'wipe_update', {'type': 'wipe_update'})
+
+    client = get_redis()
+    assert (await streams.events_since(client, group_name, 2))[1] is not None, \
+        'Buffered events were not replayed'
+    assert (await streams.events_since(client, group_name, 1))[1] is None, \
+        'Trimmed events were not reported as a gap'
+    assert (await streams.events_since(client, group_name, 9))[1] is None, \
+        'Client ahead of a restarted stream was not reported as a gap'
+    assert await streams.events_since(client, group_name, 4) == (4, []), \
+        'Up-to-date client was sent events'
+
+
+@pytest.mark.asyncio
+async def test_concurrent_events_are_buffered_without_gaps():
+    group_name = f'run_{uuid.uuid4().hex[:8]}'
+
+    sent = await asyncio.gather(*[
+        sequenced_event(group_name, 'wipe_update', {'type': 'wipe_update', 'count': count})
+        for count in range(20)
+    ])
+
+    seq, events = await streams.events_since(get_redis(), group_name, 0)
+    assert seq == 20, 'Sequence number was not advanced'
+    assert [codec.loads(text)['seq'] for text in events] == list(range(1, 21)), \
+        'Buffered events have gaps'
+    assert sorted(event['text'] for event in sent) == sorted(events), \
+        'Sent events differ from the buffered ones'
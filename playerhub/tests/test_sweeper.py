@@ -0,0 +1,70 @@
+import json
+import uuid
+from django.conf import settings
+import redis
+from playerhub.sweeper import sweep_step
+r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+def sweep_all():
+    cursor = None
+    while cursor != 0:
+        cursor, _ = sweep_step(r, cursor or 0)
+
+
+def test_sweep_expires_keys_with_their_session():
+    session_id = uuid.uuid4().hex[:6]
+    question_id = f'q-{uuid.uuid4().hex[:6]}'
+    r.hset(f'poll:session:{session_id}', 'session_id', session_id)
+    r.expire(f'poll:session:{session_id}', 600)
+    r.rpush(f'poll:session:{session_id}:questions', question_id)
+    r.hset(f'poll:session:{session_id}:question_data', question_id,
+           json.dumps({'id': question_id}))
+    r.hset(f'poll:session:{session_id}:votes', f'{question_id}:Yes', 1)
+    r.hset(f'poll:session:{session_id}:voters:{question_id}', 'voter', 1)
+
+    sweep_all()
+
+    for key in [f'poll:session:{session_id}:questions',
+                f'poll:session:{session_id}:question_data',
+                f'poll:session:{session_id}:votes',
+                f'poll:session:{session_id}:voters:{question_id}']:
+        assert 0 < r.ttl(key) <= 600, f'{key} did not get the session expiry'
+
+    r.delete(f'poll:session:{session_id}', f'poll:session:{session_id}:questions',
+             f'poll:session:{session_id}:question_data', f'poll:session:{session_id}:votes',
+             f'poll:session:{session_id}:voters:{question_id}')
+
+
+def test_sweep_reclaims_orphans():
+    session_id = uuid.uuid4().hex[:6]
+    question_id = f'q-{uuid.uuid4().hex[:6]}'
+    r.rpush(f'poll:session:{session_id}:questions', question_id)
+    r.hset(f'poll:session:{session_id}:voters:{question_id}', 'voter', 1)
+
+    sweep_all()
+
+    assert not r.exists(f'poll:session:{session_id}:questions'), \
+        'Question list of an expired session was not deleted'
+    assert not r.exists(f'poll:session:{session_id}:voters:{question_id}'), \
+        'Voters of an expired session were not deleted'
+
+
+def test_sweep_prunes_expired_questions_from_list():
+    session_id = uuid.uuid4().hex[:6]
+    question_id = f'q-{uuid.uuid4().hex[:6]}'
+    r.hset(f'poll:session:{session_id}', 'session_id', session_id)
+    r.expire(f'poll:session:{session_id}', 600)
+    r.hset(f'poll:session:{session_id}:question_data', question_id,
+           json.dumps({'id': question_id}))
+    r.expire(f'poll:session:{session_id}:question_data', 600)
+    r.rpush(f'poll:session:{session_id}:questions', 'q-gone', question_id)
+    r.expire(f'poll:session:{session_id}:questions', 600)
+
+    sweep_all()
+
+    assert r.lrange(f'poll:session:{session_id}:questions', 0, -1) == [question_id], \
+        'Expired question was not pruned from the list'
+
+    r.delete(f'poll:session:{session_id}', f'poll:session:{session_id}:questions',
+             f'poll:session:{session_id}:question_data')
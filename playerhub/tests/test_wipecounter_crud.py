@@ -213,3 +213,44 @@ def test_delete_foreign_user_wipecounter(client):
     wipecounter = WipeCounterFactory(run=run)
     response = client.delete(f'/api/runs/{run.id}/wipecounters/{wipecounter.id}/')
     assert response.status_code == 404, 'User should not be able to delete foreign user wipecounter'
+
+
+@pytest.mark.django_db
+def test_increment_wipecounter(client):
+    """
+    Test to ensure that a delta is applied to the stored count, which never drops below zero.
+    """
+    user = UserFactory()
+    client.force_authenticate(user=user)
+    wipecounter = WipeCounterFactory(run=RunFactory(user=user), count=1)
+    url = f'/api/runs/{wipecounter.run.id}/wipecounters/{wipecounter.id}/increment/'
+
+    response = client.post(url, {'delta': 2}, format='json')
+    assert response.status_code == 200, 'Increment was not applied'
+    assert response.data['count'] == 3, 'Wrong count returned'
+
+    response = client.post(url, {'delta': -5}, format='json')
+    assert response.data['count'] == 0, 'Count dropped below zero'
+    wipecounter.refresh_from_db()
+    assert wipecounter.count == 0, 'Count was not stored'
+
+
+@pytest.mark.django_db
+def test_increment_wipecounter_validation(client):
+    """
+    Test to ensure that zero deltas and wipe counters of other users' runs are rejected.
+    """
+    user = UserFactory()
+    client.force_authenticate(user=user)
+    own = WipeCounterFactory(run=RunFactory(user=user), count=1)
+    foreign = WipeCounterFactory(count=1)
+
+    response = client.post(f'/api/runs/{own.run.id}/wipecounters/{own.id}/increment/',
+                           {'delta': 0}, format='json')
+    assert response.status_code == 400, 'Zero delta was accepted'
+
+    response = client.post(f'/api/runs/{foreign.run.id}/wipecounters/{foreign.id}/increment/',
+                           {'delta': 1}, format='json')
+    assert response.status_code == 404, 'Foreign wipe counter was incremented'
+    foreign.refresh_from_db()
+    assert foreign.count == 1, 'Foreign wipe counter was changed'
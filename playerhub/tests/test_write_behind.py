@@ -0,0 +1,43 @@
+import asyncio
+import threading
+import pytest
+from playerhub.write_behind import WriteBehindBuffer
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_changes_queued_during_a_flush_are_written():
+    written = []
+    writing, release = threading.Event(), threading.Event()
+
+    def write(batch):
+        writing.set()
+        release.wait(1)
+        written.append(batch)
+
+    buffer = WriteBehindBuffer(0.01, write)
+    buffer.add('a', count=1)
+    await asyncio.to_thread(writing.wait, 1)
+    buffer.add('a', count=2)
+    release.set()
+    await asyncio.sleep(0.1)
+
+    assert written == [{'a': {'count': 1}}, {'a': {'count': 2}}], 'Queued change was not written'
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_changes_of_a_failed_flush_are_retried():
+    written = []
+    failures = [RuntimeError('database is unavailable')]
+
+    def write(batch):
+        if failures:
+            raise failures.pop()
+        written.append(batch)
+
+    buffer = WriteBehindBuffer(0.01, write)
+    buffer.add('a', count=1)
+    await asyncio.sleep(0.1)
+
+    assert written == [{'a': {'count': 1}}], 'Failed flush was not retried'
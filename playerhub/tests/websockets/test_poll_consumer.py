@@ -1,3 +1,4 @@
+import asyncio
 import json
 
 import pytest
@@ -45,8 +46,9 @@ async def test_ws_poll_publish_question_broadcast():
     }
 
     await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
-    await sync_to_async(r.set)(f'poll:question:{question_id}', json.dumps(question_data))
-    await sync_to_async(r.set)(f'poll:session:{session_id}', json.dumps({}))
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
+    await sync_to_async(r.hset)(f'poll:session:{session_id}', 'session_id', session_id)
 
     communicator = WebsocketCommunicator(
         application,
@@ -65,10 +67,13 @@ async def test_ws_poll_publish_question_broadcast():
     assert response['question_id'] == question_id
     assert 'question_data' in response
     assert response['question_data']['question'] == 'Question?'
+    published_question_id = await sync_to_async(r.hget)(
+        f'poll:session:{session_id}', 'published_question_id')
+    assert published_question_id == question_id, 'Published question was not stored.'
 
     await communicator.disconnect()
     await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
-    await sync_to_async(r.delete)(f'poll:question:{question_id}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
     await sync_to_async(r.delete)(f'poll:session:{session_id}')
 
 
@@ -87,8 +92,9 @@ async def test_ws_poll_unpublish_question_broadcast():
     }
 
     await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
-    await sync_to_async(r.set)(f'poll:question:{question_id}', json.dumps(question_data))
-    await sync_to_async(r.set)(f'poll:session:{session_id}', json.dumps({}))
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
+    await sync_to_async(r.hset)(f'poll:session:{session_id}', 'session_id', session_id)
 
     communicator = WebsocketCommunicator(
         application,
@@ -103,11 +109,11 @@ async def test_ws_poll_unpublish_question_broadcast():
 
     response = await communicator.receive_json_from()
     assert response['type'] == 'unpublish_question', 'Wrong response type.'
-    assert set(response.keys()) == {'type'}, 'Unexpected keys in response'
+    assert set(response.keys()) == {'type', 'seq'}, 'Unexpected keys in response'
 
     await communicator.disconnect()
     await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
-    await sync_to_async(r.delete)(f'poll:question:{question_id}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
     await sync_to_async(r.delete)(f'poll:session:{session_id}')
 
 
@@ -116,7 +122,7 @@ async def test_ws_poll_vote_update_broadcast():
     """
     Test to ensure that 'vote_update' message is handled correctly.
     """
-    client_token = 'abc-mod-123'
+    client_token = 'abc-viewer'
     session_id = uuid.uuid4().hex[:6]
     question_id = uuid.uuid4().hex[:6]
     question_data = {
@@ -127,8 +133,9 @@ async def test_ws_poll_vote_update_broadcast():
     }
 
     await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
-    await sync_to_async(r.set)(f'poll:question:{question_id}', json.dumps(question_data))
-    await sync_to_async(r.set)(f'poll:session:{session_id}', json.dumps({}))
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
+    await sync_to_async(r.hset)(f'poll:session:{session_id}', 'session_id', session_id)
 
     communicator = WebsocketCommunicator(
         application,
@@ -136,6 +143,8 @@ async def test_ws_poll_vote_update_broadcast():
     )
     connected, _ = await communicator.connect()
     assert connected, 'WebSocket connection failed.'
+    identity = await communicator.receive_json_from()
+    assert identity['type'] == 'voter_identity', 'Voter identity was not issued.'
 
     await communicator.send_json_to({
         'type': 'vote',
@@ -152,14 +161,14 @@ async def test_ws_poll_vote_update_broadcast():
 
     await communicator.disconnect()
     await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
-    await sync_to_async(r.delete)(f'poll:question:{question_id}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
     await sync_to_async(r.delete)(f'poll:session:{session_id}')
 
 
 @pytest.mark.asyncio
-async def test_ws_poll_new_question_broadcast():
+async def test_ws_poll_sync_questions_snapshot():
     """"
-    Test to ensure that 'new_question' message is handled correctly.
+    Test to ensure that 'sync_questions' is answered with a snapshot of all questions.
     """
     client_token = 'abc-mod-123'
     session_id = uuid.uuid4().hex[:6]
@@ -172,7 +181,8 @@ async def test_ws_poll_new_question_broadcast():
     }
 
     await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
-    await sync_to_async(r.set)(f'poll:question:{question_id}', json.dumps(question_data))
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
     await sync_to_async(r.rpush)(f'poll:session:{session_id}:questions', question_id)
 
     communicator = WebsocketCommunicator(
@@ -188,15 +198,16 @@ async def test_ws_poll_new_question_broadcast():
     })
 
     response = await communicator.receive_json_from()
-    assert response['type'] == 'new_question', 'Wrong response type.'
-    assert response['question']['id'] == question_id, 'Wrong question ID.'
-    assert 'question' in response, 'Missing question in response.'
-    assert response['question']['question'] == 'Question?', 'Wrong question.'
-    assert response['question']['answers'] == ['Yes', 'No'], 'Wrong answers.'
+    assert response['type'] == 'questions_snapshot', 'Wrong response type.'
+    assert len(response['questions']) == 1, 'Wrong number of questions.'
+    question = response['questions'][0]
+    assert question['id'] == question_id, 'Wrong question ID.'
+    assert question['question'] == 'Question?', 'Wrong question.'
+    assert question['answers'] == ['Yes', 'No'], 'Wrong answers.'
 
     await communicator.disconnect()
     await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
-    await sync_to_async(r.delete)(f'poll:question:{question_id}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
     await sync_to_async(r.delete)(f'poll:session:{session_id}:questions')
 
 
@@ -216,7 +227,8 @@ async def test_ws_poll_delete_question_broadcast():
         'votes': {'Yes': 0, 'Absolutely': 0}
     }
     await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
-    await sync_to_async(r.set)(f'poll:question:{question_id}', json.dumps(question_data))
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
     await sync_to_async(r.rpush)(f'poll:session:{session_id}:questions', question_id)
 
     # Connect WebSocket
@@ -239,7 +251,7 @@ async def test_ws_poll_delete_question_broadcast():
 
     await communicator.disconnect()
     await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
-    await sync_to_async(r.delete)(f'poll:question:{question_id}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
     await sync_to_async(r.delete)(f'poll:session:{session_id}:questions')
 
 
@@ -266,4 +278,363 @@ async def test_poll_wrong_data():
     assert 'Wrong JSON format' in response['error']
 
     await communicator.disconnect()
-    await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
\ No newline at end of file
+    await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
+
+
+@pytest.mark.asyncio
+async def test_ws_poll_concurrent_votes_are_not_lost():
+    """
+    Test to ensure that votes sent at the same time from many sockets are all counted.
+    """
+    client_token = 'abc-viewer'
+    session_id = uuid.uuid4().hex[:6]
+    question_id = uuid.uuid4().hex[:6]
+    question_data = {
+        'id': question_id,
+        'question': 'Question?',
+        'answers': ['Yes', 'No'],
+        'votes': {'Yes': 0, 'No': 0}
+    }
+
+    await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
+
+    communicators = [
+        WebsocketCommunicator(application, f'ws/polls/{client_token}/') for _ in range(5)
+    ]
+    for communicator in communicators:
+        connected, _ = await communicator.connect()
+        assert connected, 'WebSocket connection failed.'
+        await communicator.receive_json_from()
+
+    await asyncio.gather(*[
+        communicator.send_json_to({
+            'type': 'vote',
+            'question_id': question_id,
+            'answer': 'Yes'
+        }) for communicator in communicators
+    ])
+    for communicator in communicators:
+        response = await communicator.receive_json_from()
+        assert response['type'] == 'vote', 'Wrong response type.'
+
+    tallies = await sync_to_async(r.hgetall)(f'poll:session:{session_id}:votes')
+    assert tallies == {f'{question_id}:Yes': '5', f'{question_id}:No': '0'}, 'Votes were lost.'
+
+    for communicator in communicators:
+        await communicator.disconnect()
+    await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:votes')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:voters:{question_id}')
+
+
+@pytest.mark.asyncio
+async def test_ws_poll_vote_updates_are_coalesced():
+    """
+    Test to ensure that votes received within one flush interval
+    are broadcast to other clients as a single vote update.
+    """
+    client_token = 'abc-viewer'
+    overlay_token = 'abc-overlay'
+    session_id = uuid.uuid4().hex[:6]
+    question_id = uuid.uuid4().hex[:6]
+    question_data = {
+        'id': question_id,
+        'question': 'Question?',
+        'answers': ['Yes', 'No'],
+        'votes': {'Yes': 0, 'No': 0}
+    }
+
+    await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
+    await sync_to_async(r.set)(f'poll:token_map:{overlay_token}', session_id)
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
+
+    voters = [
+        WebsocketCommunicator(application, f'ws/polls/{client_token}/') for _ in range(3)
+    ]
+    overlay = WebsocketCommunicator(application, f'ws/polls/{overlay_token}/')
+    for communicator in [*voters, overlay]:
+        connected, _ = await communicator.connect()
+        assert connected, 'WebSocket connection failed.'
+    for voter in voters:
+        await voter.receive_json_from()
+
+    for voter, answer in zip(voters, ['Yes', 'Yes', 'No']):
+        await voter.send_json_to({
+            'type': 'vote',
+            'question_id': question_id,
+            'answer': answer
+        })
+        ack = await voter.receive_json_from()
+        assert ack['type'] == 'vote', 'Voter did not get an acknowledgement.'
+
+    response = await overlay.receive_json_from()
+    assert response['type'] == 'vote', 'Wrong response type.'
+    assert response['votes'] == {'Yes': 2, 'No': 1}, 'Vote update was not coalesced.'
+    assert await overlay.receive_nothing(), 'More than one vote update was broadcast.'
+
+    for communicator in [*voters, overlay]:
+        await communicator.disconnect()
+    await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
+    await sync_to_async(r.delete)(f'poll:token_map:{overlay_token}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:votes')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:voters:{question_id}')
+
+
+@pytest.mark.asyncio
+async def test_ws_poll_sync_questions_diff_broadcast():
+    """
+    Test to ensure that other clients receive only questions added since the last sync.
+    """
+    client_token = 'abc-mod-123'
+    viewer_token = 'abc-viewer'
+    session_id = uuid.uuid4().hex[:6]
+    question_id = uuid.uuid4().hex[:6]
+    question_data = {
+        'id': question_id,
+        'question': 'Question?',
+        'answers': ['Yes', 'No'],
+        'votes': {'Yes': 0, 'No': 0},
+        'version': 1
+    }
+
+    await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
+    await sync_to_async(r.set)(f'poll:token_map:{viewer_token}', session_id)
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
+    await sync_to_async(r.rpush)(f'poll:session:{session_id}:questions', question_id)
+
+    moderator = WebsocketCommunicator(application, f'ws/polls/{client_token}/')
+    viewer = WebsocketCommunicator(application, f'ws/polls/{viewer_token}/')
+    connected, _ = await moderator.connect()
+    assert connected, 'WebSocket connection failed.'
+    connected, _ = await viewer.connect()
+    assert connected, 'WebSocket connection failed.'
+    identity = await viewer.receive_json_from()
+    assert identity['type'] == 'voter_identity', 'Voter identity was not issued.'
+
+    await moderator.send_json_to({'type': 'sync_questions'})
+    response = await viewer.receive_json_from()
+    assert response['type'] == 'questions_diff', 'Wrong response type.'
+    assert response['version'] == 1, 'Wrong version.'
+    assert [q['id'] for q in response['questions']] == [question_id], 'Wrong questions.'
+
+    await moderator.send_json_to({'type': 'sync_questions'})
+    assert await viewer.receive_nothing(), 'Already synced questions were sent again.'
+
+    await moderator.disconnect()
+    await viewer.disconnect()
+    await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
+    await sync_to_async(r.delete)(f'poll:token_map:{viewer_token}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:questions')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:synced_version')
+
+
+@pytest.mark.asyncio
+async def test_ws_poll_events_reach_only_rendering_roles():
+    """
+    Test to ensure that poll events are delivered only to the roles that render them.
+    """
+    client_token = 'abc-mod-123'
+    viewer_token = 'abc-viewer'
+    overlay_token = 'abc-overlay'
+    session_id = uuid.uuid4().hex[:6]
+    question_id = uuid.uuid4().hex[:6]
+    question_data = {
+        'id': question_id,
+        'question': 'Question?',
+        'answers': ['Yes', 'No']
+    }
+
+    for token in [client_token, viewer_token, overlay_token]:
+        await sync_to_async(r.set)(f'poll:token_map:{token}', session_id)
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
+    await sync_to_async(r.hset)(f'poll:session:{session_id}', 'session_id', session_id)
+
+    moderator = WebsocketCommunicator(application, f'ws/polls/{client_token}/')
+    viewer = WebsocketCommunicator(application, f'ws/polls/{viewer_token}/')
+    overlay = WebsocketCommunicator(application, f'ws/polls/{overlay_token}/')
+    for communicator in [moderator, viewer, overlay]:
+        connected, _ = await communicator.connect()
+        assert connected, 'WebSocket connection failed.'
+    identity = await viewer.receive_json_from()
+    assert identity['type'] == 'voter_identity', 'Voter identity was not issued.'
+
+    await moderator.send_json_to({
+        'type': 'publish_question',
+        'question_id': question_id,
+    })
+
+    response = await overlay.receive_json_from()
+    assert response['type'] == 'publish_question', 'Overlay did not receive the question.'
+    assert await viewer.receive_nothing(), 'Viewer received an event it does not render.'
+
+    for communicator in [moderator, viewer, overlay]:
+        await communicator.disconnect()
+    for token in [client_token, viewer_token, overlay_token]:
+        await sync_to_async(r.delete)(f'poll:token_map:{token}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}')
+
+
+@pytest.mark.asyncio
+async def test_ws_poll_viewer_votes_once():
+    """
+    Test to ensure that a viewer's vote is counted once, also after reconnecting
+    with the voter identity issued on the first connection.
+    """
+    viewer_token = 'abc-viewer'
+    session_id = uuid.uuid4().hex[:6]
+    question_id = uuid.uuid4().hex[:6]
+    question_data = {
+        'id': question_id,
+        'question': 'Question?',
+        'answers': ['Yes', 'No'],
+        'votes': {'Yes': 0, 'No': 0}
+    }
+
+    await sync_to_async(r.set)(f'poll:token_map:{viewer_token}', session_id)
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
+
+    communicator = WebsocketCommunicator(application, f'ws/polls/{viewer_token}/')
+    connected, _ = await communicator.connect()
+    assert connected, 'WebSocket connection failed.'
+    identity = await communicator.receive_json_from()
+    assert identity['type'] == 'voter_identity', 'Voter identity was not issued.'
+
+    await communicator.send_json_to({'type': 'vote', 'question_id': question_id, 'answer': 'Yes'})
+    response = await communicator.receive_json_from()
+    assert response['votes']['Yes'] == 1, 'Vote not counted correctly.'
+    await communicator.disconnect()
+
+    communicator = WebsocketCommunicator(
+        application, f'ws/polls/{viewer_token}/?voter={identity["voter_token"]}')
+    connected, _ = await communicator.connect()
+    assert connected, 'WebSocket connection failed.'
+
+    await communicator.send_json_to({'type': 'vote', 'question_id': question_id, 'answer': 'No'})
+    response = await communicator.receive_json_from()
+    assert response['type'] == 'error', 'Second vote was accepted.'
+
+    tallies = await sync_to_async(r.hgetall)(f'poll:session:{session_id}:votes')
+    assert tallies == {f'{question_id}:Yes': '1', f'{question_id}:No': '0'}, \
+        'Second vote was counted.'
+
+    await communicator.disconnect()
+    await sync_to_async(r.delete)(f'poll:token_map:{viewer_token}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:votes')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:voters:{question_id}')
+
+
+@pytest.mark.asyncio
+async def test_ws_poll_viewer_changes_vote():
+    """
+    Test to ensure that in 'change' mode a new vote moves the viewer's previous vote.
+    """
+    client_token = 'abc-viewer'
+    session_id = uuid.uuid4().hex[:6]
+    question_id = uuid.uuid4().hex[:6]
+    question_data = {
+        'id': question_id,
+        'question': 'Question?',
+        'answers': ['Yes', 'No'],
+        'votes': {'Yes': 0, 'No': 0},
+        'vote_mode': 'change'
+    }
+
+    await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
+
+    communicator = WebsocketCommunicator(application, f'ws/polls/{client_token}/')
+    connected, _ = await communicator.connect()
+    assert connected, 'WebSocket connection failed.'
+    identity = await communicator.receive_json_from()
+    assert identity['type'] == 'voter_identity', 'Voter identity was not issued.'
+
+    for answer in ['Yes', 'No']:
+        await communicator.send_json_to({
+            'type': 'vote',
+            'question_id': question_id,
+            'answer': answer
+        })
+        response = await communicator.receive_json_from()
+        assert response['type'] == 'vote', 'Vote change was rejected.'
+
+    assert response['votes'] == {'Yes': 0, 'No': 1}, 'Vote was not moved.'
+
+    await communicator.disconnect()
+    await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:votes')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:voters:{question_id}')
+
+
+@pytest.mark.asyncio
+async def test_ws_poll_resync_when_events_were_lost():
+    """
+    Test to ensure that a client resuming from a sequence number the replay buffer
+    no longer covers is told to reload its state.
+    """
+    client_token = f'{uuid.uuid4().hex[:6]}-mod'
+    session_id = uuid.uuid4().hex[:6]
+    await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
+
+    communicator = WebsocketCommunicator(application, f'/ws/polls/{client_token}/?since=5')
+    connected, _ = await communicator.connect()
+    assert connected, 'WebSocket connection failed.'
+
+    response = await communicator.receive_json_from()
+    assert response == {'type': 'resync', 'seq': 0}, 'Client was not told to resync.'
+
+    await communicator.disconnect()
+    await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
+
+
+@pytest.mark.asyncio
+async def test_ws_poll_only_viewers_vote():
+    """
+    Test to ensure that votes sent from moderator and overlay sockets are rejected.
+    """
+    client_token = 'abc-mod-123'
+    overlay_token = 'abc-overlay'
+    session_id = uuid.uuid4().hex[:6]
+    question_id = uuid.uuid4().hex[:6]
+    question_data = {
+        'id': question_id,
+        'question': 'Question?',
+        'answers': ['Yes', 'No'],
+        'votes': {'Yes': 0, 'No': 0}
+    }
+
+    await sync_to_async(r.set)(f'poll:token_map:{client_token}', session_id)
+    await sync_to_async(r.set)(f'poll:token_map:{overlay_token}', session_id)
+    await sync_to_async(r.hset)(
+        f'poll:session:{session_id}:question_data', question_id, json.dumps(question_data))
+
+    for token in [client_token, overlay_token]:
+        communicator = WebsocketCommunicator(application, f'ws/polls/{token}/')
+        connected, _ = await communicator.connect()
+        assert connected, 'WebSocket connection failed.'
+
+        await communicator.send_json_to({'type': 'vote', 'question_id': question_id,
+                                         'answer': 'Yes'})
+        response = await communicator.receive_json_from()
+        assert response == {'type': 'error', 'error': 'Only viewers can vote'}, \
+            'Vote from a non-viewer socket was accepted.'
+        await communicator.disconnect()
+
+    assert not await sync_to_async(r.exists)(f'poll:session:{session_id}:votes'), \
+        'Vote was counted.'
+
+    await sync_to_async(r.delete)(f'poll:token_map:{client_token}')
+    await sync_to_async(r.delete)(f'poll:token_map:{overlay_token}')
+    await sync_to_async(r.delete)(f'poll:session:{session_id}:question_data')
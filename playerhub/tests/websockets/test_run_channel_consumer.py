@@ -0,0 +1,206 @@
+import asyncio
+import uuid
+import msgpack
+import pytest
+import redis
+from django.conf import settings
+from channels.testing import WebsocketCommunicator
+from wiperino.asgi import application
+from ..factories import UserFactory, RunFactory, WipeCounterFactory
+from rest_framework_simplejwt.tokens import AccessToken
+from asgiref.sync import sync_to_async
+
+r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+async def subscribe(communicator, stream, **fields):
+    """Subscribes to a stream and checks that the subscription is acknowledged."""
+    await communicator.send_json_to({'type': 'subscribe', 'stream': stream, **fields})
+    ack = await communicator.receive_json_from()
+    assert ack == [stream, {'type': 'subscribed'}], 'Subscription was not acknowledged.'
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_run_channel_multiplexes_streams():
+    """
+    Test to ensure that wipe counter and timer events are delivered on one socket,
+    each tagged with its stream.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    segment = await sync_to_async(WipeCounterFactory)(run=run, count=0)
+    token = str(AccessToken.for_user(user))
+
+    channel = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/streams/')
+    connected, _ = await channel.connect()
+    assert connected, 'WebSocket connection failed'
+
+    await subscribe(channel, 'wipe')
+    stream, snapshot = await channel.receive_json_from()
+    assert stream == 'wipe', 'Wrong stream.'
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent on subscribe.'
+    assert snapshot['segments'][0]['id'] == segment.id, 'Wrong segments in snapshot.'
+
+    await subscribe(channel, 'timer')
+    stream, snapshot = await channel.receive_json_from()
+    assert stream == 'timer', 'Wrong stream.'
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent on subscribe.'
+
+    dashboard = WebsocketCommunicator(application, f'ws/runs/{run.id}/?token={token}')
+    await dashboard.connect()
+    await dashboard.send_json_to({'type': 'wipe_update', 'segment_id': segment.id, 'count': 4})
+    stream, response = await channel.receive_json_from()
+    assert stream == 'wipe', 'Wrong stream.'
+    assert response['type'] == 'wipe_update', 'Wrong response type'
+    assert response['count'] == 4, 'Wrong response data'
+
+    await dashboard.send_json_to({'type': 'run_finished'})
+    stream, response = await channel.receive_json_from()
+    assert [stream, response['type']] == ['wipe', 'run_finished'], \
+        'Event was not tagged with the stream it was broadcast to.'
+
+    await dashboard.disconnect()
+    await channel.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_run_channel_unsubscribe():
+    """
+    Test to ensure that no events of a stream are delivered after unsubscribing from it.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    token = str(AccessToken.for_user(user))
+
+    channel = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/streams/')
+    await channel.connect()
+    await subscribe(channel, 'wipe')
+    await channel.receive_json_from()
+
+    await channel.send_json_to({'type': 'unsubscribe', 'stream': 'wipe'})
+    response = await channel.receive_json_from()
+    assert response == ['wipe', {'type': 'unsubscribed'}], 'Unsubscribe was not acknowledged.'
+
+    dashboard = WebsocketCommunicator(application, f'ws/runs/{run.id}/?token={token}')
+    await dashboard.connect()
+    await dashboard.send_json_to({'type': 'wipe_update', 'segment_id': 1, 'count': 4})
+    await dashboard.receive_json_from()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(channel.receive_json_from(), timeout=0.5)
+
+    await dashboard.disconnect()
+    await channel.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_run_channel_replays_missed_events():
+    """
+    Test to ensure that subscribing with 'since' sends the missed events instead of a snapshot.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    token = str(AccessToken.for_user(user))
+
+    channel = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/streams/')
+    await channel.connect()
+    await subscribe(channel, 'wipe')
+    _, snapshot = await channel.receive_json_from()
+    await channel.disconnect()
+
+    dashboard = WebsocketCommunicator(application, f'ws/runs/{run.id}/?token={token}')
+    await dashboard.connect()
+    for count in (1, 2):
+        await dashboard.send_json_to({'type': 'wipe_update', 'segment_id': 1, 'count': count})
+        await dashboard.receive_json_from()
+    await dashboard.disconnect()
+
+    channel = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/streams/')
+    await channel.connect()
+    await subscribe(channel, 'wipe', since=snapshot['seq'])
+    replayed = [await channel.receive_json_from() for _ in range(2)]
+    assert [(stream, event['count']) for stream, event in replayed] == [('wipe', 1), ('wipe', 2)], \
+        'Missed events were not replayed.'
+    await channel.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_run_channel_poll_stream():
+    """
+    Test to ensure that the poll stream needs a poll overlay token and sends the
+    published question state on subscribe.
+    """
+    run = await sync_to_async(RunFactory)(mode='WIPECOUNTER')
+    session_id = uuid.uuid4().hex[:6]
+    overlay_token = f'{uuid.uuid4().hex[:6]}-overlay-{session_id}'
+    viewer_token = f'{uuid.uuid4().hex[:6]}-viewer-{session_id}'
+    await sync_to_async(r.set)(f'poll:token_map:{overlay_token}', session_id)
+    await sync_to_async(r.set)(f'poll:token_map:{viewer_token}', session_id)
+
+    channel = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/streams/')
+    await channel.connect()
+
+    await channel.send_json_to({'type': 'subscribe', 'stream': 'poll', 'token': viewer_token})
+    response = await channel.receive_json_from()
+    assert response == {'type': 'error', 'error': 'Invalid poll token'}, 'Wrong response.'
+
+    await subscribe(channel, 'poll', token=overlay_token)
+    stream, response = await channel.receive_json_from()
+    assert stream == 'poll', 'Wrong stream.'
+    assert response['type'] == 'unpublish_question', 'Poll state was not sent on subscribe.'
+
+    await sync_to_async(r.delete)(
+        f'poll:token_map:{overlay_token}', f'poll:token_map:{viewer_token}')
+    await channel.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_run_channel_msgpack_frames():
+    """
+    Test to ensure that msgpack clients receive [stream, message] pairs as binary frames.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    token = str(AccessToken.for_user(user))
+
+    channel = WebsocketCommunicator(
+        application, f'ws/overlay/runs/{run.id}/streams/', subprotocols=['msgpack'])
+    _, subprotocol = await channel.connect()
+    assert subprotocol == 'msgpack', 'Subprotocol was not negotiated'
+    await channel.send_to(bytes_data=msgpack.packb({'type': 'subscribe', 'stream': 'wipe'}))
+    assert msgpack.unpackb(await channel.receive_from()) == ['wipe', {'type': 'subscribed'}]
+    stream, snapshot = msgpack.unpackb(await channel.receive_from())
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent on subscribe.'
+
+    dashboard = WebsocketCommunicator(application, f'ws/runs/{run.id}/?token={token}')
+    await dashboard.connect()
+    await dashboard.send_json_to({'type': 'wipe_update', 'segment_id': 1, 'count': 7})
+
+    stream, response = msgpack.unpackb(await channel.receive_from())
+    assert stream == 'wipe', 'Wrong stream.'
+    assert response['count'] == 7, 'Wrong response data'
+
+    await dashboard.disconnect()
+    await channel.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_run_channel_rejects_unknown_streams():
+    """
+    Test to ensure that subscribing to an unknown stream is answered with an error.
+    """
+    run = await sync_to_async(RunFactory)(mode='WIPECOUNTER')
+
+    channel = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/streams/')
+    await channel.connect()
+    await channel.send_json_to({'type': 'subscribe', 'stream': 'chat'})
+    response = await channel.receive_json_from()
+    assert response['type'] == 'error', 'Wrong response type.'
+    assert 'stream' in response['error'], 'Wrong error.'
+    await channel.disconnect()
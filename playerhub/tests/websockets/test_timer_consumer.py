@@ -1,8 +1,10 @@
-from datetime import datetime
+import asyncio
 import pytest
 from channels.testing import WebsocketCommunicator
 from wiperino.asgi import application
-from ..factories import UserFactory, RunFactory, GameFactory
+from playerhub import consumers
+from playerhub.models import Run, Timer
+from ..factories import UserFactory, RunFactory, GameFactory, TimerFactory
 from rest_framework_simplejwt.tokens import AccessToken
 from asgiref.sync import sync_to_async
 
@@ -24,6 +26,8 @@ async def test_ws_timer_connection():
     )
     connected, _ = await communicator.connect()
     assert connected, 'WebSocket connection failed.'
+    state = await communicator.receive_json_from()
+    assert state == {'type': 'timer_state', 'segments': []}, 'Timer state was not sent first.'
     await communicator.disconnect()
 
 
@@ -36,6 +40,7 @@ async def test_ws_timer_start_timer():
     user = await sync_to_async(UserFactory)()
     game = await sync_to_async(GameFactory)()
     run = await sync_to_async(RunFactory)(user=user, game=game, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=12.0, is_finished=False)
     token = str(AccessToken.for_user(user))
 
     ws_url = f'ws/runs/{run.id}/timer/?token={token}'
@@ -45,19 +50,20 @@ async def test_ws_timer_start_timer():
 
     connected1, _ = await communicator_1.connect()
     connected2, _ = await communicator_2.connect()
+    await communicator_1.receive_json_from()
+    await communicator_2.receive_json_from()
 
     await communicator_1.send_json_to({
         'type': 'start_timer',
-        'segment_id': 1,
-        'started_at': datetime.now().isoformat(),
-        'elapsed_time': 0.0,
+        'segment_id': segment.id,
     })
 
     response = await communicator_2.receive_json_from()
 
     assert response['type'] == 'start_timer', 'Wrong response type'
-    assert response['segment_id'] == 1, 'Wrong response data'
-    assert response['elapsed_time'] == 0.0, 'Wrong response data'
+    assert response['segment_id'] == segment.id, 'Wrong response data'
+    assert response['elapsed_time'] == 12.0, 'Wrong response data'
+    assert response['started_at'] is not None, 'Start time was not issued.'
 
     await communicator_1.disconnect()
     await communicator_2.disconnect()
@@ -72,6 +78,7 @@ async def test_ws_timer_pause_timer():
     user = await sync_to_async(UserFactory)()
     game = await sync_to_async(GameFactory)()
     run = await sync_to_async(RunFactory)(user=user, game=game, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=12.0, is_finished=False)
     token = str(AccessToken.for_user(user))
 
     ws_url = f'ws/runs/{run.id}/timer/?token={token}'
@@ -81,18 +88,20 @@ async def test_ws_timer_pause_timer():
 
     connected1, _ = await communicator_1.connect()
     connected2, _ = await communicator_2.connect()
+    await communicator_1.receive_json_from()
+    await communicator_2.receive_json_from()
 
     await communicator_1.send_json_to({
         'type': 'pause_timer',
-        'segment_id': 1,
-        'elapsed_time': 12.0,
+        'segment_id': segment.id,
     })
 
     response = await communicator_2.receive_json_from()
 
     assert response['type'] == 'pause_timer', 'Wrong response type'
-    assert response['segment_id'] == 1, 'Wrong response data'
+    assert response['segment_id'] == segment.id, 'Wrong response data'
     assert response['elapsed_time'] == 12.0, 'Wrong response data'
+    assert response['started_at'] is None, 'Paused timer has a start time.'
 
     await communicator_1.disconnect()
     await communicator_2.disconnect()
@@ -107,6 +116,7 @@ async def test_ws_timer_finish_timer():
     user = await sync_to_async(UserFactory)()
     game = await sync_to_async(GameFactory)()
     run = await sync_to_async(RunFactory)(user=user, game=game, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=12.0, is_finished=False)
     token = str(AccessToken.for_user(user))
 
     ws_url = f'ws/runs/{run.id}/timer/?token={token}'
@@ -116,18 +126,20 @@ async def test_ws_timer_finish_timer():
 
     connected1, _ = await communicator_1.connect()
     connected2, _ = await communicator_2.connect()
+    await communicator_1.receive_json_from()
+    await communicator_2.receive_json_from()
 
     await communicator_1.send_json_to({
         'type': 'finish_timer',
-        'segment_id': 1,
-        'elapsed_time': 12.0,
+        'segment_id': segment.id,
     })
 
     response = await communicator_2.receive_json_from()
 
     assert response['type'] == 'finish_timer', 'Wrong response type'
-    assert response['segment_id'] == 1, 'Wrong response data'
+    assert response['segment_id'] == segment.id, 'Wrong response data'
     assert response['elapsed_time'] == 12.0, 'Wrong response data'
+    assert response['is_finished'] is True, 'Wrong response data'
 
     await communicator_1.disconnect()
     await communicator_2.disconnect()
@@ -151,6 +163,8 @@ async def test_ws_timer_run_finished():
 
     connected1, _ = await communicator_1.connect()
     connected2, _ = await communicator_2.connect()
+    await communicator_1.receive_json_from()
+    await communicator_2.receive_json_from()
 
     await communicator_1.send_json_to({
         'type': 'run_finished',
@@ -182,6 +196,8 @@ async def test_ws_timer_new_segment():
 
     connected1, _ = await communicator_1.connect()
     connected2, _ = await communicator_2.connect()
+    await communicator_1.receive_json_from()
+    await communicator_2.receive_json_from()
 
     await communicator_1.send_json_to({
         'type': 'new_segment',
@@ -218,7 +234,240 @@ async def test_timer_wrong_data():
 
     communicator = WebsocketCommunicator(application, ws_url)
     connected, _ = await communicator.connect()
+    await communicator.receive_json_from()
 
     await communicator.send_to('{not:valid json}')
     response = await communicator.receive_json_from()
-    assert response['type'] == 'error', 'Wrong response type.'
\ No newline at end of file
+    assert response['type'] == 'error', 'Wrong response type.'
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_timer_counts_server_time():
+    """
+    Test to ensure that a paused timer holds the time measured by the server,
+    not the time sent by the client.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=5.0, is_finished=False)
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/timer/?token={token}')
+    await communicator.connect()
+    await communicator.receive_json_from()
+
+    await communicator.send_json_to({'type': 'start_timer', 'segment_id': segment.id})
+    started = await communicator.receive_json_from()
+    await asyncio.sleep(0.2)
+    await communicator.send_json_to({
+        'type': 'pause_timer',
+        'segment_id': segment.id,
+        'elapsed_time': 1000.0,
+    })
+    paused = await communicator.receive_json_from()
+
+    assert started['elapsed_time'] == 5.0, 'Wrong elapsed time at start.'
+    assert 5.2 <= paused['elapsed_time'] < 6.0, 'Elapsed time was not measured by the server.'
+    await communicator.disconnect()
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/timer/?token={token}')
+    await communicator.connect()
+    state = await communicator.receive_json_from()
+    assert state['type'] == 'timer_state', 'Wrong response type.'
+    assert state['segments'] == [{
+        'segment_id': segment.id,
+        'elapsed_time': paused['elapsed_time'],
+        'started_at': None,
+        'is_finished': False,
+    }], 'Timer state was not kept.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_timer_rejects_foreign_segments():
+    """
+    Test to ensure that timers of segments outside the user's run cannot be started.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='SPEEDRUN')
+    foreign_segment = await sync_to_async(TimerFactory)(is_finished=False)
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/timer/?token={token}')
+    await communicator.connect()
+    await communicator.receive_json_from()
+
+    await communicator.send_json_to({'type': 'start_timer', 'segment_id': foreign_segment.id})
+    response = await communicator.receive_json_from()
+    assert response == {'type': 'error', 'error': 'Segment not found'}, 'Wrong response.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_timer_run_finished_stops_timers():
+    """
+    Test to ensure that finishing the run finishes running timers before announcing it.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=1.0, is_finished=False)
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/timer/?token={token}')
+    await communicator.connect()
+    await communicator.receive_json_from()
+
+    await communicator.send_json_to({'type': 'start_timer', 'segment_id': segment.id})
+    await communicator.receive_json_from()
+    await communicator.send_json_to({'type': 'run_finished'})
+
+    finished = await communicator.receive_json_from()
+    assert finished['type'] == 'finish_timer', 'Running timer was not finished.'
+    assert finished['segment_id'] == segment.id, 'Wrong response data'
+    assert finished['is_finished'] is True, 'Wrong response data'
+    assert finished['elapsed_time'] >= 1.0, 'Wrong response data'
+    response = await communicator.receive_json_from()
+    assert response['type'] == 'run_finished', 'Wrong response type'
+
+    await communicator.send_json_to({'type': 'start_timer', 'segment_id': segment.id})
+    response = await communicator.receive_json_from()
+    assert response == {'type': 'error', 'error': 'Segment is finished'}, 'Wrong response.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_timer_clock_sync():
+    """
+    Test to ensure that clock_sync is answered with the server time.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='SPEEDRUN')
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/timer/?token={token}')
+    await communicator.connect()
+    await communicator.receive_json_from()
+
+    await communicator.send_json_to({'type': 'clock_sync', 'client_time': 1000.0})
+    response = await communicator.receive_json_from()
+    assert response['type'] == 'clock_sync', 'Wrong response type'
+    assert response['client_time'] == 1000.0, 'Client time was not echoed.'
+    assert isinstance(response['server_time'], int), 'Server time is missing.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_timer_persists_paused_time_on_disconnect():
+    """
+    Test to ensure that the time a timer was paused at is written to the database.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=2.0, is_finished=False)
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/timer/?token={token}')
+    await communicator.connect()
+    await communicator.receive_json_from()
+    for message_type in ('start_timer', 'pause_timer', 'start_timer', 'pause_timer'):
+        await communicator.send_json_to({'type': message_type, 'segment_id': segment.id})
+        response = await communicator.receive_json_from()
+    await communicator.disconnect()
+
+    await sync_to_async(segment.refresh_from_db)()
+    assert segment.elapsed_time == response['elapsed_time'], 'Paused time was not persisted.'
+    assert segment.is_finished is False, 'Wrong persisted data'
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_timer_persists_time_paused_during_a_flush(monkeypatch):
+    """
+    Test to ensure that a time paused while an earlier one is being written is
+    persisted by a later flush, without another timer action or a disconnect.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=2.0, is_finished=False)
+    token = str(AccessToken.for_user(user))
+
+    # The DB thread also dispatches socket messages, so the flush is held open
+    # on the event loop, after its batch was written.
+    writing, release = asyncio.Event(), asyncio.Event()
+    flush = consumers.timer_buffer.flush
+
+    async def slow_flush(match=None):
+        await flush(match)
+        if not writing.is_set():
+            writing.set()
+            await release.wait()
+
+    monkeypatch.setattr(consumers.timer_buffer, 'interval', 0.01)
+    monkeypatch.setattr(consumers.timer_buffer, 'flush', slow_flush)
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/timer/?token={token}')
+    await communicator.connect()
+    await communicator.receive_json_from()
+    for message_type in ('start_timer', 'pause_timer'):
+        await communicator.send_json_to({'type': message_type, 'segment_id': segment.id})
+        await communicator.receive_json_from()
+    await writing.wait()
+    for message_type in ('start_timer', 'pause_timer'):
+        await communicator.send_json_to({'type': message_type, 'segment_id': segment.id})
+        response = await communicator.receive_json_from()
+    release.set()
+    await asyncio.sleep(0.2)
+
+    await sync_to_async(segment.refresh_from_db)()
+    assert segment.elapsed_time == response['elapsed_time'], 'Paused time was not persisted.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_timer_run_finished_persists_run():
+    """
+    Test to ensure that finishing the run writes the final times and marks the run
+    and all of its segments as finished.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='SPEEDRUN', is_finished=False)
+    running = await sync_to_async(TimerFactory)(run=run, elapsed_time=1.0, is_finished=False)
+    await sync_to_async(TimerFactory)(run=run, elapsed_time=4.0, is_finished=False)
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/timer/?token={token}')
+    await communicator.connect()
+    await communicator.receive_json_from()
+    await communicator.send_json_to({'type': 'start_timer', 'segment_id': running.id})
+    await communicator.receive_json_from()
+    await communicator.send_json_to({'type': 'run_finished'})
+    finished = await communicator.receive_json_from()
+    await communicator.receive_json_from()
+
+    assert (await sync_to_async(Run.objects.get)(id=run.id)).is_finished, 'Run was not finished.'
+    await sync_to_async(running.refresh_from_db)()
+    assert running.elapsed_time == finished['elapsed_time'], 'Final time was not persisted.'
+    unfinished = await sync_to_async(Timer.objects.filter(run=run, is_finished=False).count)()
+    assert unfinished == 0, 'Segments were not finished.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_timer_rejects_foreign_users():
+    """
+    Test to ensure that sockets of users other than the run's owner are rejected.
+    """
+    run = await sync_to_async(RunFactory)(mode='SPEEDRUN')
+    intruder = await sync_to_async(UserFactory)()
+    token = str(AccessToken.for_user(intruder))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/timer/?token={token}')
+    connected, _ = await communicator.connect()
+    assert not connected, 'Socket of a foreign user was accepted.'
@@ -1,9 +1,8 @@
 import asyncio
-from datetime import datetime
 import pytest
 from channels.testing import WebsocketCommunicator
 from wiperino.asgi import application
-from ..factories import UserFactory, RunFactory, GameFactory
+from ..factories import UserFactory, RunFactory, GameFactory, TimerFactory
 from rest_framework_simplejwt.tokens import AccessToken
 from asgiref.sync import sync_to_async
 
@@ -36,6 +35,7 @@ async def test_ws_timer_start_timer_receiver():
     user = await sync_to_async(UserFactory)()
     game = await sync_to_async(GameFactory)()
     run = await sync_to_async(RunFactory)(user=user, game=game, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=12.0, is_finished=False)
     token = str(AccessToken.for_user(user))
 
     ws_broadcaster_url = f'ws/runs/{run.id}/timer/?token={token}'
@@ -48,19 +48,20 @@ async def test_ws_timer_start_timer_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_json_to({
         'type': 'start_timer',
-        'segment_id': 1,
-        'started_at': datetime.now().isoformat(),
-        'elapsed_time': 0.0,
+        'segment_id': segment.id,
     })
 
     response = await communicator_receiver.receive_json_from()
 
     assert response['type'] == 'start_timer', 'Wrong response type'
-    assert response['segment_id'] == 1, 'Wrong response data'
-    assert response['elapsed_time'] == 0.0, 'Wrong response data'
+    assert response['segment_id'] == segment.id, 'Wrong response data'
+    assert response['elapsed_time'] == 12.0, 'Wrong response data'
+    assert response['started_at'] is not None, 'Start time was not issued.'
 
     await communicator_broadcaster.disconnect()
     await communicator_receiver.disconnect()
@@ -75,6 +76,7 @@ async def test_ws_timer_pause_timer_receiver():
     user = await sync_to_async(UserFactory)()
     game = await sync_to_async(GameFactory)()
     run = await sync_to_async(RunFactory)(user=user, game=game, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=12.0, is_finished=False)
     token = str(AccessToken.for_user(user))
 
     ws_broadcaster_url = f'ws/runs/{run.id}/timer/?token={token}'
@@ -87,17 +89,18 @@ async def test_ws_timer_pause_timer_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_json_to({
         'type': 'pause_timer',
-        'segment_id': 1,
-        'elapsed_time': 12.0,
+        'segment_id': segment.id,
     })
 
     response = await communicator_receiver.receive_json_from()
 
     assert response['type'] == 'pause_timer', 'Wrong response type'
-    assert response['segment_id'] == 1, 'Wrong response data'
+    assert response['segment_id'] == segment.id, 'Wrong response data'
     assert response['elapsed_time'] == 12.0, 'Wrong response data'
 
     await communicator_broadcaster.disconnect()
@@ -113,6 +116,7 @@ async def test_ws_timer_finish_timer_receiver():
     user = await sync_to_async(UserFactory)()
     game = await sync_to_async(GameFactory)()
     run = await sync_to_async(RunFactory)(user=user, game=game, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=12.0, is_finished=False)
     token = str(AccessToken.for_user(user))
 
     ws_broadcaster_url = f'ws/runs/{run.id}/timer/?token={token}'
@@ -125,17 +129,18 @@ async def test_ws_timer_finish_timer_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_json_to({
         'type': 'finish_timer',
-        'segment_id': 1,
-        'elapsed_time': 12.0,
+        'segment_id': segment.id,
     })
 
     response = await communicator_receiver.receive_json_from()
 
     assert response['type'] == 'finish_timer', 'Wrong response type'
-    assert response['segment_id'] == 1, 'Wrong response data'
+    assert response['segment_id'] == segment.id, 'Wrong response data'
     assert response['elapsed_time'] == 12.0, 'Wrong response data'
 
     await communicator_broadcaster.disconnect()
@@ -163,6 +168,8 @@ async def test_ws_timer_run_finished_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_json_to({
         'type': 'run_finished',
@@ -197,6 +204,8 @@ async def test_ws_timer_new_segment_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_json_to({
         'type': 'new_segment',
@@ -238,6 +247,8 @@ async def test_wipecounter_wrong_data_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_to('{not:valid json}')
 
@@ -245,4 +256,62 @@ async def test_wipecounter_wrong_data_receiver():
         await asyncio.wait_for(communicator_receiver.receive_json_from(), timeout=0.5)
 
     await communicator_receiver.disconnect()
-    await communicator_broadcaster.disconnect()
\ No newline at end of file
+    await communicator_broadcaster.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_timer_overlay_snapshot_on_connect():
+    """
+    Test to ensure that the timer overlay receives the run and its segments as the first frame.
+    """
+    run = await sync_to_async(RunFactory)(mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=12.5)
+
+    communicator = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/timer/')
+    connected, _ = await communicator.connect()
+    assert connected, 'WebSocket connection failed'
+
+    snapshot = await communicator.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Wrong response type.'
+    assert snapshot['run']['name'] == run.name, 'Wrong run in snapshot.'
+    assert snapshot['segments'][0]['id'] == segment.id, 'Wrong segments in snapshot.'
+    assert snapshot['segments'][0]['elapsed_time'] == 12.5, 'Wrong segments in snapshot.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_timer_overlay_snapshot_running_timer():
+    """
+    Test to ensure that the snapshot carries the start time of a running timer,
+    so the overlay renders it without waiting for the next event.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='SPEEDRUN')
+    segment = await sync_to_async(TimerFactory)(run=run, elapsed_time=3.0, is_finished=False)
+    token = str(AccessToken.for_user(user))
+
+    communicator_broadcaster = WebsocketCommunicator(
+        application, f'ws/runs/{run.id}/timer/?token={token}')
+    await communicator_broadcaster.connect()
+    await communicator_broadcaster.receive_json_from()
+    await communicator_broadcaster.send_json_to({'type': 'start_timer', 'segment_id': segment.id})
+    started = await communicator_broadcaster.receive_json_from()
+
+    communicator_receiver = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/timer/')
+    await communicator_receiver.connect()
+    snapshot = await communicator_receiver.receive_json_from()
+
+    assert snapshot['type'] == 'run_snapshot', 'Wrong response type.'
+    assert snapshot['segments'][0]['id'] == segment.id, 'Wrong segments in snapshot.'
+    assert snapshot['segments'][0]['elapsed_time'] == 3.0, 'Wrong segments in snapshot.'
+    assert snapshot['segments'][0]['started_at'] == started['started_at'], \
+        'Running timer is missing from the snapshot.'
+
+    await communicator_receiver.send_json_to({'type': 'clock_sync', 'client_time': 5.0})
+    response = await communicator_receiver.receive_json_from()
+    assert response['type'] == 'clock_sync', 'Overlay clock_sync was not answered.'
+
+    await communicator_receiver.disconnect()
+    await communicator_broadcaster.disconnect()
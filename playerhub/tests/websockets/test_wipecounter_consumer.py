@@ -1,7 +1,12 @@
+import asyncio
+import msgpack
 import pytest
 from channels.testing import WebsocketCommunicator
 from wiperino.asgi import application
-from ..factories import UserFactory, RunFactory, GameFactory
+from playerhub import consumers
+from playerhub.models import Run, WipeCounter
+from ..factories import UserFactory, RunFactory, GameFactory, WipeCounterFactory
+from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import AccessToken
 from asgiref.sync import sync_to_async
 
@@ -186,3 +191,249 @@ async def test_wipecounter_wrong_data():
     response = await communicator.receive_json_from()
     assert response['type'] == 'error', 'Wrong response type.'
     await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_wipecounter_rejects_frames_that_are_not_objects():
+    """
+    Test to ensure that frames decoding to something other than an object are
+    answered with an error frame instead of closing the consumer.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(
+        application, f'ws/runs/{run.id}/?token={token}', subprotocols=['msgpack'])
+    await communicator.connect()
+
+    for frame in [{'bytes_data': b'\x01'}, {'text_data': '[1]'}]:
+        await communicator.send_to(**frame)
+        response = msgpack.unpackb(await communicator.receive_from())
+        assert response['type'] == 'error', 'Frame was not rejected.'
+
+    await communicator.send_to(bytes_data=msgpack.packb({'type': 'unknown'}))
+    response = msgpack.unpackb(await communicator.receive_from())
+    assert response['error'] == 'Invalid message type', 'Consumer stopped handling messages.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_wipecounter_persists_counts_on_disconnect():
+    """
+    Test to ensure that wipe counts sent over the WebSocket are written to the database.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    segment = await sync_to_async(WipeCounterFactory)(run=run, count=0)
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/?token={token}')
+    await communicator.connect()
+    for count in (1, 2, 3):
+        await communicator.send_json_to({
+            'type': 'wipe_update',
+            'segment_id': segment.id,
+            'count': count
+        })
+        await communicator.receive_json_from()
+    await communicator.disconnect()
+
+    await sync_to_async(segment.refresh_from_db)()
+    assert segment.count == 3, 'Latest count was not persisted.'
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_wipecounter_segment_finished_flushes_count():
+    """
+    Test to ensure that finishing a segment persists its count before the event is broadcast.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    segment = await sync_to_async(WipeCounterFactory)(run=run, count=0, is_finished=False)
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/?token={token}')
+    await communicator.connect()
+    await communicator.send_json_to({'type': 'wipe_update', 'segment_id': segment.id, 'count': 5})
+    await communicator.receive_json_from()
+    await communicator.send_json_to({'type': 'segment_finished', 'segment_id': segment.id})
+    await communicator.receive_json_from()
+
+    await sync_to_async(segment.refresh_from_db)()
+    assert segment.count == 5, 'Count was not flushed.'
+    assert segment.is_finished, 'Segment was not finished.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_wipecounter_run_finished_persists_run():
+    """
+    Test to ensure that finishing the run marks the run and all of its segments as finished.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER', is_finished=False)
+    await sync_to_async(WipeCounterFactory.create_batch)(2, run=run, is_finished=False)
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/?token={token}')
+    await communicator.connect()
+    await communicator.send_json_to({'type': 'run_finished'})
+    await communicator.receive_json_from()
+
+    assert (await sync_to_async(Run.objects.get)(id=run.id)).is_finished, 'Run was not finished.'
+    unfinished = await sync_to_async(
+        WipeCounter.objects.filter(run=run, is_finished=False).count)()
+    assert unfinished == 0, 'Segments were not finished.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_wipecounter_rejects_foreign_users():
+    """
+    Test to ensure that sockets of users other than the run's owner are rejected.
+    """
+    run = await sync_to_async(RunFactory)(mode='WIPECOUNTER')
+    intruder = await sync_to_async(UserFactory)()
+    token = str(AccessToken.for_user(intruder))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/?token={token}')
+    connected, _ = await communicator.connect()
+    assert not connected, 'Socket of a foreign user was accepted.'
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/')
+    connected, _ = await communicator.connect()
+    assert not connected, 'Anonymous socket was accepted.'
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_wipecounter_ownership_follows_transfer():
+    """
+    Test to ensure that the cached owner is dropped when the run is transferred.
+    """
+    owner = await sync_to_async(UserFactory)()
+    new_owner = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=owner, mode='WIPECOUNTER')
+    owner_url = f'ws/runs/{run.id}/?token={AccessToken.for_user(owner)}'
+    new_owner_url = f'ws/runs/{run.id}/?token={AccessToken.for_user(new_owner)}'
+
+    communicator = WebsocketCommunicator(application, owner_url)
+    connected, _ = await communicator.connect()
+    assert connected, 'Socket of the owner was rejected.'
+    await communicator.disconnect()
+
+    run.user = new_owner
+    await sync_to_async(run.save)()
+
+    communicator = WebsocketCommunicator(application, owner_url)
+    connected, _ = await communicator.connect()
+    assert not connected, 'Socket of the previous owner was accepted.'
+
+    communicator = WebsocketCommunicator(application, new_owner_url)
+    connected, _ = await communicator.connect()
+    assert connected, 'Socket of the new owner was rejected.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_wipecounter_concurrent_increments_are_not_lost(monkeypatch):
+    """
+    Test to ensure that increments sent from two sockets at once are both applied
+    and broadcast, and written write-behind rather than on each click.
+    """
+    monkeypatch.setattr(consumers.wipe_counter_buffer, 'interval', 60)
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    segment = await sync_to_async(WipeCounterFactory)(run=run, count=0)
+    token = str(AccessToken.for_user(user))
+
+    ws_url = f'ws/runs/{run.id}/?token={token}'
+    communicator_1 = WebsocketCommunicator(application, ws_url)
+    communicator_2 = WebsocketCommunicator(application, ws_url)
+    await communicator_1.connect()
+    await communicator_2.connect()
+
+    increment = {'type': 'wipe_increment', 'segment_id': segment.id, 'delta': 1}
+    await asyncio.gather(
+        communicator_1.send_json_to(increment),
+        communicator_2.send_json_to(increment),
+    )
+    counts = sorted([(await communicator_1.receive_json_from())['count'] for _ in range(2)])
+    assert counts == [1, 2], 'Authoritative counts were not broadcast.'
+
+    await sync_to_async(segment.refresh_from_db)()
+    assert segment.count == 0, 'Increments were written before the flush.'
+
+    await communicator_1.disconnect()
+    await communicator_2.disconnect()
+    await sync_to_async(segment.refresh_from_db)()
+    assert segment.count == 2, 'An increment was lost.'
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_wipecounter_rest_increment_is_not_overwritten_by_queued_count():
+    """
+    Test to ensure that a REST increment is kept when an absolute count queued
+    on a socket is written afterwards.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    segment = await sync_to_async(WipeCounterFactory)(run=run, count=0)
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/?token={token}')
+    await communicator.connect()
+    await communicator.send_json_to({'type': 'wipe_update', 'segment_id': segment.id, 'count': 5})
+    await communicator.receive_json_from()
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+    response = await sync_to_async(client.post)(
+        f'/api/runs/{run.id}/wipecounters/{segment.id}/increment/', {'delta': 2}, format='json')
+    assert response.status_code == 200, 'Increment was not applied.'
+    assert response.data['count'] == 7, 'Increment was not applied to the queued count.'
+
+    update = await communicator.receive_json_from()
+    assert update['count'] == 7, 'Wrong count broadcast.'
+
+    await communicator.disconnect()
+    await sync_to_async(segment.refresh_from_db)()
+    assert segment.count == 7, 'Queued count overwrote the increment.'
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_wipecounter_rest_increment_adds_to_socket_increments():
+    """
+    Test to ensure that a REST increment is added to increments that a socket
+    applied but has not written yet.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    segment = await sync_to_async(WipeCounterFactory)(run=run, count=3)
+    token = str(AccessToken.for_user(user))
+
+    communicator = WebsocketCommunicator(application, f'ws/runs/{run.id}/?token={token}')
+    await communicator.connect()
+    await communicator.send_json_to({'type': 'wipe_increment', 'segment_id': segment.id,
+                                     'delta': 1})
+    assert (await communicator.receive_json_from())['count'] == 4, 'Wrong count broadcast.'
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+    response = await sync_to_async(client.post)(
+        f'/api/runs/{run.id}/wipecounters/{segment.id}/increment/', {'delta': 2}, format='json')
+    assert response.data['count'] == 6, 'Increment was not applied to the pending count.'
+    await communicator.receive_json_from()
+
+    await communicator.disconnect()
+    await sync_to_async(segment.refresh_from_db)()
+    assert segment.count == 6, 'Pending count overwrote the increment.'
@@ -1,8 +1,10 @@
 import asyncio
+import msgpack
 import pytest
 from channels.testing import WebsocketCommunicator
 from wiperino.asgi import application
-from ..factories import UserFactory, RunFactory, GameFactory
+from playerhub.models import WipeCounter
+from ..factories import UserFactory, RunFactory, GameFactory, WipeCounterFactory
 from rest_framework_simplejwt.tokens import AccessToken
 from asgiref.sync import sync_to_async
 
@@ -45,6 +47,8 @@ async def test_ws_wipe_update_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_json_to({
         'type': 'wipe_update',
@@ -61,6 +65,42 @@ async def test_ws_wipe_update_receiver():
     await communicator_broadcaster.disconnect()
 
 
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_wipe_update_receiver_msgpack():
+    """
+    Test to ensure that a client negotiating the msgpack subprotocol exchanges binary frames.
+    """
+    user = await sync_to_async(UserFactory)()
+    game = await sync_to_async(GameFactory)()
+    run = await sync_to_async(RunFactory)(user=user, game=game, mode='WIPECOUNTER')
+    token = str(AccessToken.for_user(user))
+
+    communicator_broadcaster = WebsocketCommunicator(
+        application, f'ws/runs/{run.id}/?token={token}', subprotocols=['msgpack'])
+    communicator_receiver = WebsocketCommunicator(
+        application, f'ws/overlay/runs/{run.id}/', subprotocols=['msgpack'])
+    connected_broadcaster, subprotocol = await communicator_broadcaster.connect()
+    assert subprotocol == 'msgpack', 'Subprotocol was not negotiated'
+    connected_receiver, subprotocol = await communicator_receiver.connect()
+    assert subprotocol == 'msgpack', 'Subprotocol was not negotiated'
+    snapshot = msgpack.unpackb(await communicator_receiver.receive_from())
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
+
+    await communicator_broadcaster.send_to(bytes_data=msgpack.packb({
+        'type': 'wipe_update',
+        'segment_id': 1,
+        'count': 42
+    }))
+
+    response = msgpack.unpackb(await communicator_receiver.receive_from())
+    assert response['type'] == 'wipe_update', 'Wrong response type.'
+    assert response['count'] == 42, 'Wrong response.'
+
+    await communicator_receiver.disconnect()
+    await communicator_broadcaster.disconnect()
+
+
 @pytest.mark.asyncio
 @pytest.mark.django_db
 async def test_ws_new_segment_receiver():
@@ -81,6 +121,8 @@ async def test_ws_new_segment_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_json_to({
         'type': 'new_segment',
@@ -120,6 +162,8 @@ async def test_ws_segment_finished_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_json_to({
         'type': 'segment_finished',
@@ -154,6 +198,8 @@ async def test_ws_run_finished_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_json_to({
         'type': 'run_finished',
@@ -186,6 +232,8 @@ async def test_wipecounter_wrong_data_receiver():
     connected_receiver, _ = await communicator_receiver.connect()
     assert connected_broadcaster, 'Broadcaster WebSocket connection failed'
     assert connected_receiver, 'Receiver WebSocket connection failed'
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Snapshot was not sent first.'
 
     await communicator_broadcaster.send_to('{not:valid json}')
 
@@ -194,3 +242,150 @@ async def test_wipecounter_wrong_data_receiver():
 
     await communicator_receiver.disconnect()
     await communicator_broadcaster.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_overlay_snapshot_on_connect():
+    """
+    Test to ensure that the overlay receives the run and its wipe counters as the first frame.
+    """
+    run = await sync_to_async(RunFactory)(mode='WIPECOUNTER')
+    segments = [await sync_to_async(WipeCounterFactory)(run=run) for _ in range(2)]
+
+    communicator = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/')
+    connected, _ = await communicator.connect()
+    assert connected, 'WebSocket connection failed'
+
+    snapshot = await communicator.receive_json_from()
+    assert snapshot['type'] == 'run_snapshot', 'Wrong response type.'
+    assert snapshot['run']['id'] == run.id, 'Wrong run in snapshot.'
+    assert snapshot['run']['game_name'] == run.game.name, 'Wrong run in snapshot.'
+    assert [seg['id'] for seg in snapshot['segments']] == [seg.id for seg in segments], \
+        'Wrong segments in snapshot.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_overlay_snapshot_invalidated_on_change():
+    """
+    Test to ensure that a cached snapshot is dropped when a segment of the run changes.
+    """
+    run = await sync_to_async(RunFactory)(mode='WIPECOUNTER')
+    segment = await sync_to_async(WipeCounterFactory)(run=run, count=1)
+
+    communicator = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/')
+    await communicator.connect()
+    snapshot = await communicator.receive_json_from()
+    assert snapshot['segments'][0]['count'] == 1, 'Wrong count in snapshot.'
+    await communicator.disconnect()
+
+    segment.count = 7
+    await sync_to_async(segment.save)()
+
+    communicator = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/')
+    await communicator.connect()
+    snapshot = await communicator.receive_json_from()
+    assert snapshot['segments'][0]['count'] == 7, 'Stale snapshot was served.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_overlay_snapshot_run_not_found():
+    """
+    Test to ensure that an overlay of a missing run receives an error instead of a snapshot.
+    """
+    communicator = WebsocketCommunicator(application, 'ws/overlay/runs/999999/')
+    connected, _ = await communicator.connect()
+    assert connected, 'WebSocket connection failed'
+
+    response = await communicator.receive_json_from()
+    assert response['type'] == 'error', 'Wrong response type.'
+    assert response['error'] == 'Run not found', 'Wrong error message.'
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_overlay_replays_missed_events():
+    """
+    Test to ensure that an overlay reconnecting with ?since= receives only the events it missed.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    token = str(AccessToken.for_user(user))
+
+    communicator_broadcaster = WebsocketCommunicator(
+        application, f'ws/runs/{run.id}/?token={token}')
+    await communicator_broadcaster.connect()
+
+    communicator_receiver = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/')
+    await communicator_receiver.connect()
+    snapshot = await communicator_receiver.receive_json_from()
+    await communicator_receiver.disconnect()
+
+    for count in (1, 2):
+        await communicator_broadcaster.send_json_to({
+            'type': 'wipe_update',
+            'segment_id': 1,
+            'count': count
+        })
+        await communicator_broadcaster.receive_json_from()
+
+    communicator_receiver = WebsocketCommunicator(
+        application, f'ws/overlay/runs/{run.id}/?since={snapshot["seq"]}')
+    await communicator_receiver.connect()
+    missed = [await communicator_receiver.receive_json_from() for _ in range(2)]
+    assert [event['count'] for event in missed] == [1, 2], 'Missed events were not replayed.'
+    assert missed[1]['seq'] == snapshot['seq'] + 2, 'Events were not numbered in order.'
+    assert await communicator_receiver.receive_nothing(), 'Snapshot was sent after replay.'
+
+    await communicator_receiver.disconnect()
+    await communicator_broadcaster.disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db
+async def test_ws_overlay_snapshot_includes_queued_counts():
+    """
+    Test to ensure that an overlay connecting after a wipe_update, but before the
+    count is written to the database, receives the new count in its snapshot.
+    """
+    user = await sync_to_async(UserFactory)()
+    run = await sync_to_async(RunFactory)(user=user, mode='WIPECOUNTER')
+    segment = await sync_to_async(WipeCounterFactory)(run=run, count=0)
+    token = str(AccessToken.for_user(user))
+
+    # Caches the snapshot with the old count.
+    communicator_receiver = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/')
+    await communicator_receiver.connect()
+    await communicator_receiver.receive_json_from()
+    await communicator_receiver.disconnect()
+
+    communicator_broadcaster = WebsocketCommunicator(
+        application, f'ws/runs/{run.id}/?token={token}')
+    await communicator_broadcaster.connect()
+    await communicator_broadcaster.send_json_to({
+        'type': 'wipe_update',
+        'segment_id': segment.id,
+        'count': 5
+    })
+    update = await communicator_broadcaster.receive_json_from()
+
+    count = await sync_to_async(
+        WipeCounter.objects.filter(id=segment.id).values_list('count', flat=True).get)()
+    assert count == 0, 'Count was written before the flush.'
+
+    communicator_receiver = WebsocketCommunicator(application, f'ws/overlay/runs/{run.id}/')
+    await communicator_receiver.connect()
+    snapshot = await communicator_receiver.receive_json_from()
+    assert snapshot['segments'][0]['count'] == 5, 'Snapshot misses the queued count.'
+    assert snapshot['seq'] == update['seq'], 'Wrong sequence number in snapshot.'
+    await communicator_receiver.disconnect()
+
+    await communicator_broadcaster.disconnect()
+    count = await sync_to_async(
+        WipeCounter.objects.filter(id=segment.id).values_list('count', flat=True).get)()
+    assert count == 5, 'Queued count was not written.'
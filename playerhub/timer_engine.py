@@ -0,0 +1,193 @@
+"""
+Server-side state of the speedrun timers.
+
+The state of each segment lives in a Redis hash per run: the time banked by
+earlier intervals, the server time the running interval started at, and
+whether the segment is finished. Start, pause and finish are applied by Lua
+scripts stamped with Redis' own clock, which every worker shares, so clients
+never submit times and all of them extrapolate from the same start timestamp.
+Clients estimate their offset to that clock with a clock_sync round trip.
+
+Segments are loaded from the database the first time they are changed.
+Times are kept in integer milliseconds.
+"""
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from .models import Timer
+from .redis_client import sync_redis as r
+
+START = 'start'
+PAUSE = 'pause'
+FINISH = 'finish'
+
+# KEYS: state; ARGV: segment id, action, ttl[, elapsed ms, finished to load the segment with].
+# Returns {elapsed ms, started at ms or 0, finished, server time ms},
+# or nil if the segment is not loaded and no initial state was passed.
+TIMER_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local segment = ARGV[1]
+local elapsed = redis.call('HGET', KEYS[1], segment .. ':elapsed')
+if not elapsed then
+    if not ARGV[4] then
+        return nil
+    end
+    elapsed = ARGV[4]
+    redis.call('HSET', KEYS[1], segment .. ':elapsed', elapsed, segment .. ':finished', ARGV[5])
+end
+elapsed = tonumber(elapsed)
+local started = tonumber(redis.call('HGET', KEYS[1], segment .. ':started') or '0')
+local finished = tonumber(redis.call('HGET', KEYS[1], segment .. ':finished'))
+
+if finished == 0 then
+    if ARGV[2] == 'start' then
+        if started == 0 then
+            started = now
+            redis.call('HSET', KEYS[1], segment .. ':started', started)
+        end
+    else
+        if started ~= 0 then
+            elapsed = elapsed + now - started
+            started = 0
+            redis.call('HSET', KEYS[1], segment .. ':elapsed', elapsed)
+            redis.call('HDEL', KEYS[1], segment .. ':started')
+        end
+        if ARGV[2] == 'finish' then
+            finished = 1
+            redis.call('HSET', KEYS[1], segment .. ':finished', finished)
+        end
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {elapsed, started, finished, now}
+"""
+
+# KEYS: state; ARGV: ttl. Finishes every loaded segment, stopping running ones.
+# Returns {segment id, elapsed ms, ...} of the segments that were not finished yet.
+FINISH_RUN_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local state = redis.call('HGETALL', KEYS[1])
+local fields = {}
+for i = 1, #state, 2 do
+    fields[state[i]] = state[i + 1]
+end
+
+local finished = {}
+for field, value in pairs(fields) do
+    local segment = string.match(field, '^(%d+):finished$')
+    if segment and value == '0' then
+        local elapsed = tonumber(fields[segment .. ':elapsed'])
+        local started = fields[segment .. ':started']
+        if started then
+            elapsed = elapsed + now - tonumber(started)
+            redis.call('HDEL', KEYS[1], segment .. ':started')
+        end
+        redis.call('HSET', KEYS[1], segment .. ':elapsed', elapsed, field, 1)
+        table.insert(finished, segment)
+        table.insert(finished, elapsed)
+    end
+end
+if #state > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return finished
+"""
+
+# KEYS: state; ARGV: segment id, whether to drop it while it is running.
+DROP_SEGMENT_SCRIPT = """
+if ARGV[2] == '0' and redis.call('HEXISTS', KEYS[1], ARGV[1] .. ':started') == 1 then
+    return 0
+end
+return redis.call('HDEL', KEYS[1], ARGV[1] .. ':elapsed', ARGV[1] .. ':started',
+                  ARGV[1] .. ':finished')
+"""
+
+drop_segment_script = r.register_script(DROP_SEGMENT_SCRIPT)
+
+
+def state_key(run_id):
+    return f'timer:{run_id}'
+
+
+def to_datetime(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc)
+
+
+def segment_state(segment_id, elapsed, started, finished):
+    """Builds the message fields of a segment's state from its stored values."""
+    return {
+        'segment_id': int(segment_id),
+        'elapsed_time': int(elapsed) / 1000,
+        'started_at': to_datetime(int(started)) if int(started) else None,
+        'is_finished': bool(int(finished)),
+    }
+
+
+def load_segment(run_id, user_id, segment_id):
+    """Returns (elapsed_time, is_finished) of a segment of a run owned by the user, or None."""
+    return Timer.objects.filter(
+        id=segment_id, run_id=run_id, run__user_id=user_id
+    ).values_list('elapsed_time', 'is_finished').first()
+
+
+async def apply(script, run_id, segment_id, action, initial=None):
+    """
+    Starts, pauses or finishes a segment at the current server time.
+    `script` is TIMER_SCRIPT registered on the asyncio client, and `initial`
+    the segment's (elapsed_time, is_finished) to load it with.
+    Starting a running segment and pausing a paused one leave it unchanged,
+    as does any action on a finished segment.
+    Returns the segment's state, or None if it is not loaded and `initial` is None.
+    """
+    args = [segment_id, action, settings.TIMER_STATE_TTL]
+    if initial is not None:
+        elapsed_time, is_finished = initial
+        args += [round((elapsed_time or 0) * 1000), int(is_finished)]
+    result = await script(keys=[state_key(run_id)], args=args)
+    if result is None:
+        return None
+    elapsed, started, finished, _ = result
+    return segment_state(segment_id, elapsed, started, finished)
+
+
+async def finish_run(script, run_id):
+    """
+    Finishes every loaded segment of a run. `script` is FINISH_RUN_SCRIPT.
+    Returns the states of the segments that were not finished before.
+    """
+    result = await script(keys=[state_key(run_id)], args=[settings.TIMER_STATE_TTL])
+    return [segment_state(segment_id, elapsed, 0, 1)
+            for segment_id, elapsed in zip(result[::2], result[1::2])]
+
+
+async def run_state(client, run_id):
+    """Returns the states of a run's loaded segments by segment id."""
+    fields = await client.hgetall(state_key(run_id))
+    states = {}
+    for field, value in fields.items():
+        segment_id, name = field.split(':')
+        if name == 'finished':
+            states[int(segment_id)] = segment_state(
+                segment_id, fields[f'{segment_id}:elapsed'],
+                fields.get(f'{segment_id}:started', 0), value)
+    return states
+
+
+async def server_time(client):
+    """Returns the current time of the clock timers are stamped with, in milliseconds."""
+    seconds, microseconds = await client.time()
+    return seconds * 1000 + microseconds // 1000
+
+
+def drop_segment(run_id, segment_id, force=False):
+    """
+    Unloads a segment, so it is loaded from the database again when it is next
+    changed. A running segment is only dropped with `force`.
+    """
+    drop_segment_script(keys=[state_key(run_id)], args=[segment_id, int(force)])
+
+
+def drop_run(run_id):
+    """Unloads every segment of a run."""
+    r.delete(state_key(run_id))
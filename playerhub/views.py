@@ -1,23 +1,28 @@
 import uuid
-import json
 from io import BytesIO
-import redis
 import openpyxl
-from django.conf import settings
+from asgiref.sync import async_to_sync
 from rest_framework.response import Response
 from django.http import HttpResponse
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.views import APIView
 from .models import Run, WipeCounter, Timer, Game
-from .serializers import (RunSerializer, WipeCounterSerializer,
+from . import codec, poll_store, schemas
+from .caches import get_token_session
+from .counters import increment_wipe_count
+from .outbox import metrics as outbox_metrics
+from .protocol import broadcast, coalesce_key
+from .serializers import (RunSerializer, WipeCounterSerializer, WipeIncrementSerializer,
                           TimerSerializer, GameSerializer,
                           CreatePollSessionSerializer, PollQuestionSerializer,
                           ErrorResponseSerializer, SuccessResponseSerializer)
+from .redis_client import sync_redis as r
 from django.shortcuts import get_object_or_404
 from django.views.generic import TemplateView
 
-r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+add_question_script = r.register_script(poll_store.ADD_QUESTION_SCRIPT)
+delete_question_script = r.register_script(poll_store.DELETE_QUESTION_SCRIPT)
 
 
 class RunListView(generics.ListCreateAPIView):
@@ -95,6 +100,33 @@ class WipeCounterView(generics.RetrieveUpdateDestroyAPIView):
             id=self.kwargs['wipecounter_id'])
 
 
+class WipeCounterIncrementView(generics.GenericAPIView):
+    """
+    API view to add a delta to a wipe counter atomically.
+    The resulting count is broadcast to the run's WebSocket group
+    and returned as the same wipe_update message.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = WipeIncrementSerializer
+
+    def post(self, request, run_id, wipecounter_id):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        count = increment_wipe_count(run_id, request.user.id, wipecounter_id,
+                                     serializer.validated_data['delta'])
+        if count is None:
+            serializer = ErrorResponseSerializer({'error': 'Wipe counter not found'})
+            return Response(serializer.data, status=status.HTTP_404_NOT_FOUND)
+
+        payload = {'type': 'wipe_update', 'segment_id': wipecounter_id, 'count': count,
+                   'user': request.user.username}
+        update = schemas.WIPE_UPDATE_BROADCAST.dump(payload)
+        async_to_sync(broadcast)(f'run_{run_id}', 'wipe_update', update,
+                                 coalesce_key('wipe_update', payload))
+        return Response(update)
+
+
 class TimerListView(generics.ListCreateAPIView):
     """
     API view to retrieve list of timers or create a new timer.
@@ -170,15 +202,11 @@ class CreatePollSessionAPIView(generics.ListCreateAPIView):
         viewer_token = f'{session_id}-viewer'
         overlay_token = f'{session_id}-overlay'
 
-        session_data = {
-            'session_id': session_id,
-            'published_question_id': None
-        }
-
-        r.set(f'poll:session:{session_id}', json.dumps(session_data), ex=86400)
-        r.set(f'poll:token_map:{moderator_token}', session_id, ex=86400)
-        r.set(f'poll:token_map:{viewer_token}', session_id, ex=86400)
-        r.set(f'poll:token_map:{overlay_token}', session_id, ex=86400)
+        poll_store.create_session(r, session_id, {
+            'moderator': moderator_token,
+            'viewer': viewer_token,
+            'overlay': overlay_token,
+        })
 
         response_data = {
             'moderator_url': f'/polls/m/{moderator_token}',
@@ -202,20 +230,14 @@ class PollQuestionsListView(generics.ListCreateAPIView):
 
     def get_session_id(self):
         token = self.kwargs.get('client_token')
-        return r.get(f'poll:token_map:{token}')
+        return get_token_session(r, token)
 
     def get_queryset(self):
         session_id = self.get_session_id()
         if not session_id:
             return []
 
-        question_ids = r.lrange(f'poll:session:{session_id}:questions', 0, -1)
-        questions = []
-        for qid in question_ids:
-            q_raw = r.get(f'poll:question:{qid}')
-            if q_raw:
-                questions.append(json.loads(q_raw))
-        return questions
+        return poll_store.fetch_questions(r, session_id)
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -245,11 +267,18 @@ class PollQuestionsListView(generics.ListCreateAPIView):
             'id': question_id,
             'question': validated_data['question'],
             'answers': validated_data['answers'],
-            'votes': votes
+            'votes': votes,
+            'vote_mode': validated_data['vote_mode'],
         }
 
-        r.set(f'poll:question:{question_id}', json.dumps(question_record), ex=86400)
-        r.rpush(f'poll:session:{session_id}:questions', question_id)
+        question_record['version'] = add_question_script(
+            keys=[
+                poll_store.session_key(session_id),
+                poll_store.session_questions_key(session_id),
+                poll_store.session_version_key(session_id),
+                poll_store.session_question_data_key(session_id),
+            ],
+            args=[poll_store.session_ttl_arg(), question_id, codec.dumps(question_record)])
 
         out_serializer = self.get_serializer(question_record)
         return Response(out_serializer.data, status=status.HTTP_201_CREATED)
@@ -262,14 +291,14 @@ class DeletePollQuestionView(generics.DestroyAPIView):
     def destroy(self, request, *args, **kwargs):
         moderator_token = kwargs['client_token']
         question_id = kwargs['question_id']
-        session_id = r.get(f'poll:token_map:{moderator_token}')
+        session_id = get_token_session(r, moderator_token)
 
         if not session_id:
             serializer = ErrorResponseSerializer({'error': 'Invalid token'})
             return Response(serializer.data, status=status.HTTP_404_NOT_FOUND)
 
-        r.lrem(f'poll:session:{session_id}:questions', 0, question_id)
-        r.delete(f'poll:question:{question_id}')
+        delete_question_script(keys=poll_store.delete_question_keys(session_id, question_id),
+                               args=[question_id])
 
         serializer = SuccessResponseSerializer({'detail': 'Question deleted'})
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -411,3 +440,13 @@ class RunExportView(APIView):
         response['Content-Disposition'] = f'attachment; filename={filename}'
 
         return response
+
+
+class OverlayOutboxMetricsView(APIView):
+    """
+    API view exposing the outbound queue counters of the overlay sockets served by this process.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(outbox_metrics.as_dict())
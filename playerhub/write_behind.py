@@ -0,0 +1,162 @@
+"""
+Write-behind persistence of the state clients change over the WebSocket.
+
+Consumers broadcast updates right away and queue the changed fields of each row
+here. Changes to the same row are merged until the next flush, which writes the
+latest values of every queued row in one transaction.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from channels.db import database_sync_to_async
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from .counters import clear_pending_counts, pending_counts
+from .models import Run, WipeCounter, Timer
+from .run_snapshots import invalidate_run_snapshots
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Collects field changes per key and persists them with `write` at most once
+    per flush interval. `write` is called in a worker thread with a dict of
+    key -> {field: value} and must apply the whole batch.
+    """
+
+    def __init__(self, interval, write):
+        self.interval = interval
+        self._write = write
+        self._pending = {}
+        self._task = None
+
+    def add(self, key, **fields):
+        """Queues field changes of a row, replacing unsaved values of the same fields."""
+        self._pending.setdefault(key, {}).update(fields)
+
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Changes queued while a flush is running, and those of a failed flush,
+        # are written by the next round rather than waiting for another add().
+        while self._pending:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Write-behind flush failed, changes are kept for the next flush.')
+
+    async def flush(self, match=None):
+        """
+        Persists the queued changes, or only those whose key satisfies `match`.
+        Changes that could not be written are queued again, behind any newer ones.
+        """
+        if match is None:
+            batch, self._pending = self._pending, {}
+        else:
+            batch = {key: fields for key, fields in self._pending.items() if match(key)}
+            for key in batch:
+                del self._pending[key]
+        if not batch:
+            return
+
+        try:
+            await database_sync_to_async(self._write)(batch)
+        except Exception:
+            for key, fields in batch.items():
+                self._pending[key] = {**fields, **self._pending.get(key, {})}
+            raise
+
+
+def _case(model, field, changes):
+    """Builds a CASE that sets `field` of the changed rows and keeps it on the others."""
+    return Case(
+        *(When(id=row_id, then=Value(fields[field]))
+          for row_id, fields in changes.items() if field in fields),
+        default=F(field),
+        output_field=model._meta.get_field(field),
+    )
+
+
+def _write_segments(model, batch):
+    """
+    Applies buffered segment changes keyed by (run_id, user_id, segment_id),
+    with one UPDATE per run. Only segments of runs owned by the user are written.
+    """
+    by_run = defaultdict(dict)
+    for (run_id, user_id, segment_id), fields in batch.items():
+        by_run[(run_id, user_id)][segment_id] = fields
+
+    with transaction.atomic():
+        for (run_id, user_id), changes in by_run.items():
+            fields = {field for segment_fields in changes.values() for field in segment_fields}
+            model.objects.filter(
+                run_id=run_id, run__user_id=user_id, id__in=changes
+            ).update(**{field: _case(model, field, changes) for field in fields})
+            invalidate_run_snapshots(run_id)
+
+
+def _with_pending_counts(batch):
+    # Counts are written from the pending counts in Redis, which may have moved on
+    # since they were queued here. A queued count without a pending entry was
+    # already written by another flush and is left out.
+    segment_ids = defaultdict(list)
+    for run_id, _, segment_id in batch:
+        segment_ids[run_id].append(segment_id)
+    pending = {run_id: pending_counts(run_id, ids) for run_id, ids in segment_ids.items()}
+
+    changes = {}
+    for key, fields in batch.items():
+        fields = {field: value for field, value in fields.items() if field != 'count'}
+        count = pending[key[0]].get(key[2])
+        if count is not None:
+            fields['count'] = count
+        if fields:
+            changes[key] = fields
+    return changes
+
+
+def write_wipe_counters(batch):
+    """
+    Applies buffered wipe counter changes, see _write_segments(), and drops
+    the written counts from the pending counts. Counts that changed while
+    they were written are written again.
+    """
+    while batch:
+        batch = _with_pending_counts(batch)
+        _write_segments(WipeCounter, batch)
+
+        written = defaultdict(dict)
+        for (run_id, user_id, segment_id), fields in batch.items():
+            if 'count' in fields:
+                written[(run_id, user_id)][segment_id] = fields['count']
+        batch = {
+            (run_id, user_id, segment_id): {}
+            for (run_id, user_id), counts in written.items()
+            for segment_id in clear_pending_counts(run_id, counts)
+        }
+
+
+def write_timers(batch):
+    """Applies buffered timer changes, see _write_segments()."""
+    _write_segments(Timer, batch)
+
+
+def _finish_run(model, run_id, user_id):
+    with transaction.atomic():
+        if Run.objects.filter(id=run_id, user_id=user_id).update(is_finished=True):
+            model.objects.filter(run_id=run_id).update(is_finished=True)
+            invalidate_run_snapshots(run_id)
+
+
+def finish_wipecounter_run(run_id, user_id):
+    """Marks a run owned by the user and all of its wipe counters as finished."""
+    _finish_run(WipeCounter, run_id, user_id)
+
+
+def finish_timer_run(run_id, user_id):
+    """Marks a run owned by the user and all of its timers as finished."""
+    _finish_run(Timer, run_id, user_id)
@@ -1,10 +1,26 @@
 document.addEventListener("DOMContentLoaded", () => {
     const logoutBtn = document.getElementById('logout-btn');
     if (logoutBtn) {
-        logoutBtn.addEventListener('click', () => {
+        logoutBtn.addEventListener('click', async () => {
+            const access = localStorage.getItem('access');
+            const refresh = localStorage.getItem('refresh');
+            if (access) {
+                try {
+                    await fetch('/api/logout/', {
+                        method: 'POST',
+                        headers: {
+                            'Content-Type': 'application/json',
+                            'Authorization': `Bearer ${access}`
+                        },
+                        body: JSON.stringify(refresh ? { refresh: refresh } : {})
+                    });
+                } catch(err) {
+                    console.error(err);
+                }
+            }
             localStorage.removeItem('access');
             localStorage.removeItem('refresh');
             window.location.href = '/login/';
         });
     }
-});
\ No newline at end of file
+});
@@ -1,4 +1,4 @@
-document.addEventListener('DOMContentLoaded', async() => {
+document.addEventListener('DOMContentLoaded', () => {
     const runId = window.location.pathname.split('/')[3];
     const segmentsDiv = document.querySelector('#segments');
     const gameTitle = document.getElementById('game-title');
@@ -7,20 +7,47 @@ document.addEventListener('DOMContentLoaded', async() => {
     const runStatus = document.getElementById('run-status');
     const allSegments = [];
 
-    // Connect to WebSocket to receive live updates for the overlay
-    const socket = new WebSocket(
-        'ws://' + window.location.host + `/ws/overlay/runs/${runId}/`
-    );
+    const reconnectDelay = 2000;
+    let lastSeq = null;
 
-    socket.onopen = () => console.log('WebSocket connected');
-    socket.onerror = (e) => console.error('WebSocket error:', e);
-    socket.onclose = (e) => console.warn('WebSocket closed:', e);
+    /**
+     * Connects to WebSocket to receive live updates for the overlay. After the
+     * connection drops it reconnects with the last received sequence number,
+     * so the server replays the events missed in between.
+     */
+    function connect() {
+        const since = lastSeq === null ? '' : `?since=${lastSeq}`;
+        const socket = new WebSocket(
+            'ws://' + window.location.host + `/ws/overlay/runs/${runId}/${since}`
+        );
+
+        socket.onopen = () => console.log('WebSocket connected');
+        socket.onerror = (e) => console.error('WebSocket error:', e);
+        socket.onclose = (e) => {
+            console.warn('WebSocket closed:', e);
+            setTimeout(connect, reconnectDelay);
+        };
+        socket.onmessage = handleMessage;
+    }
+
+    connect();
 
-    // Handle messages received via WebSocket
-    socket.onmessage = (e) => {
+    // Handle messages received via WebSocket, skipping events already applied
+    function handleMessage(e) {
         const data = JSON.parse(e.data);
 
+        if (data.seq !== undefined) {
+            if (data.type !== 'run_snapshot' && lastSeq !== null && data.seq <= lastSeq) {
+                return;
+            }
+            lastSeq = data.seq;
+        }
+
         switch(data.type) {
+            case 'run_snapshot':
+                applySnapshot(data);
+                break;
+
             case 'wipe_update':
                 updateSegmentCount(Number(data.segment_id), data.count);
                 updateOverall();
@@ -44,53 +71,27 @@ document.addEventListener('DOMContentLoaded', async() => {
             case 'run_finished':
                 runStatus.textContent = 'Finished';
                 break;
+
+            case 'error':
+                console.error('WebSocket error message:', data.error);
+                break;
         }
     }
 
     /**
-     * Fetches details about a specific run and its segments from the public API.
-     * Populates the header and renders segments in the table.
+     * Replaces the header and segments with the run snapshot sent on connect.
      */
-    async function fetchAndDisplayRunDetails() {
-        try {
-            const responseRun = await fetch(`/public-api/runs/${runId}/`, {
-                method: 'GET',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
-            })
-            const responseDataRun = await responseRun.json();
-            if (!responseRun.ok) {
-                const errorText = Object.values(responseDataRun).flat().join(', ');
-                alert(`Error: ${errorText}`);
-                return;
-            }
-
-            gameTitle.textContent = responseDataRun.game_name;
-            runName.textContent = responseDataRun.name;
-
-            const responseWipecounter = await fetch(`/public-api/runs/${runId}/wipecounters/`, {
-                method: 'GET',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
-            })
-
-            const responseDataWipecounter = await responseWipecounter.json();
-            if (!responseWipecounter.ok) {
-                const errorText = Object.values(responseDataWipecounter).flat().join(', ');
-                alert(`Error: ${errorText}`);
-                return;
-            }
-
-            allSegments.push(...responseDataWipecounter);
-            renderSegment();
-            updateOverall();
-
-        } catch (err) {
-            console.error(err);
-            alert('Something went wrong. Try again.');
+    function applySnapshot(snapshot) {
+        gameTitle.textContent = snapshot.run.game_name;
+        runName.textContent = snapshot.run.name;
+        if (snapshot.run.is_finished) {
+            runStatus.textContent = 'Finished';
         }
+
+        allSegments.length = 0;
+        allSegments.push(...snapshot.segments);
+        renderSegment();
+        updateOverall();
     }
 
 
@@ -150,7 +151,4 @@ document.addEventListener('DOMContentLoaded', async() => {
         const total = allSegments.reduce((sum, seg) => sum + seg.count, 0);
         overallWipes.textContent = `${total}`;
     }
-
-    // Initial load of run and segment data
-    await fetchAndDisplayRunDetails();
 });
\ No newline at end of file
@@ -1,4 +1,4 @@
-document.addEventListener("DOMContentLoaded", async() => {
+document.addEventListener("DOMContentLoaded", () => {
     const runId = window.location.pathname.split('/')[3];
     const segmentsDiv = document.querySelector('#segments');
     const gameTitle = document.getElementById('game-title');
@@ -6,21 +6,84 @@ document.addEventListener("DOMContentLoaded", async() => {
     const overallTime = document.getElementById('overall-time');
     const runStatus = document.getElementById('run-status');
     const allSegments = [];
-    const overlayActiveTimers = {};
 
-    const socket = new WebSocket('ws://' + window.location.host + `/ws/overlay/runs/${runId}/timer/`);
+    const reconnectDelay = 2000;
+    const clockSyncSamples = 5;
+    let socket = null;
+    let lastSeq = null;
+    let clockOffset = 0;
+    let clockSyncRemaining = 0;
+    let bestRoundTrip = Infinity;
 
-    socket.onopen = () => console.log('[Overlay WS] Connected');
-    socket.onerror = (e) => console.error('[Overlay WS] Error', e);
-    socket.onclose = (e) => console.warn('[Overlay WS] Closed', e);
+    /**
+     * Opens the overlay socket. After the connection drops it reconnects with
+     * the last received sequence number, so the server replays missed events.
+     */
+    function connect() {
+        const since = lastSeq === null ? '' : `?since=${lastSeq}`;
+        socket = new WebSocket('ws://' + window.location.host + `/ws/overlay/runs/${runId}/timer/${since}`);
+
+        socket.onopen = () => {
+            console.log('[Overlay WS] Connected');
+            clockSyncRemaining = clockSyncSamples;
+            bestRoundTrip = Infinity;
+            syncClock();
+        };
+        socket.onerror = (e) => console.error('[Overlay WS] Error', e);
+        socket.onclose = (e) => {
+            console.warn('[Overlay WS] Closed', e);
+            setTimeout(connect, reconnectDelay);
+        };
+        socket.onmessage = handleMessage;
+    }
+
+    connect();
+
+    /**
+     * Sends a clock_sync probe. Each reply is answered with the next probe.
+     */
+    function syncClock() {
+        socket.send(JSON.stringify({type: 'clock_sync', client_time: Date.now()}));
+    }
+
+    /**
+     * Estimates the offset to the server clock from the probe with the shortest round trip,
+     * assuming the server read its clock halfway through it.
+     */
+    function handleClockSync(data) {
+        const now = Date.now();
+        const roundTrip = now - data.client_time;
+        if (roundTrip < bestRoundTrip) {
+            bestRoundTrip = roundTrip;
+            clockOffset = data.server_time + roundTrip / 2 - now;
+        }
+        if (--clockSyncRemaining > 0) syncClock();
+    }
 
     /**
      * Handles incoming WebSocket messages and routes them by event type.
+     * Events already applied, e.g. replayed after a snapshot, are skipped.
      */
-    socket.onmessage = (e) => {
+    function handleMessage(e) {
         const data = JSON.parse(e.data);
 
+        if (data.type === 'clock_sync') {
+            handleClockSync(data);
+            return;
+        }
+
+        if (data.seq !== undefined) {
+            if (data.type !== 'run_snapshot' && lastSeq !== null && data.seq <= lastSeq) {
+                return;
+            }
+            lastSeq = data.seq;
+        }
+
         switch (data.type) {
+            case 'run_snapshot':
+                applySnapshot(data);
+                break;
+
             case 'start_timer':
                 handleStartTimer(data);
                 break;
@@ -38,6 +101,7 @@ document.addEventListener("DOMContentLoaded", async() => {
                     id: Number(data.segment_id),
                     segment_name: data.segment_name,
                     elapsed_time: Number(data.elapsed_time),
+                    started_at: null,
                     is_finished: data.is_finished
                 });
 
@@ -55,53 +119,20 @@ document.addEventListener("DOMContentLoaded", async() => {
         }
     }
 
-    // Initial data load
-    await fetchAndDisplayRun();
-
     /**
-     * Fetches initial run and segment data from public API.
-     * Displays run name, game title, and preexisting segments.
+     * Replaces the header and segments with the run snapshot sent on connect.
      */
-    async function fetchAndDisplayRun() {
-        try {
-            const responseRun = await fetch(`/public-api/runs/${runId}/`, {
-                method: 'GET',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
-            })
-            const responseDataRun = await responseRun.json();
-
-            gameTitle.textContent = responseDataRun.game_name;
-            runName.textContent = responseDataRun.name;
-
-            if (!responseRun.ok) {
-                const errorText = Object.values(responseDataRun).flat().join(', ');
-                alert(`Error: ${errorText}`);
-                return;
-            }
-
-            const timerRes = await fetch(`/public-api/runs/${runId}/timers/`, {
-                method: 'GET',
-                headers: {
-                    'Content-Type': 'application/json'
-                }
-            })
-            const timerData = await timerRes.json();
-            if (!timerRes.ok) {
-                const errorText = Object.values(timerData).flat().join(', ');
-                alert(`Error: ${errorText}`);
-                return;
-            }
-
-            allSegments.push(...timerData);
-            renderSegmentList();
-            updateOverall();
-
-        } catch (err) {
-            console.error(err);
-            alert('Something went wrong. Try again.');
+    function applySnapshot(snapshot) {
+        gameTitle.textContent = snapshot.run.game_name;
+        runName.textContent = snapshot.run.name;
+        if (snapshot.run.is_finished) {
+            runStatus.textContent = 'Finished';
         }
+
+        allSegments.length = 0;
+        allSegments.push(...snapshot.segments);
+        renderSegmentList();
+        updateOverall();
     }
 
     /**
@@ -112,11 +143,12 @@ document.addEventListener("DOMContentLoaded", async() => {
         segmentsDiv.innerHTML = '';
 
         lastSegments.forEach(seg => {
+            const elapsed = currentElapsed(seg);
             const row = document.createElement('tr');
             row.id = `segment-${seg.id}`;
             row.innerHTML = `
                 <td class="segment-name">${seg.segment_name}</td>
-                 <td class="segment-time" data-id="${seg.id}" data-time-raw="${seg.elapsed_time}">${formatTime(Number(seg.elapsed_time))}</td>
+                 <td class="segment-time" data-id="${seg.id}" data-time-raw="${elapsed}">${formatTime(elapsed)}</td>
             `;
             segmentsDiv.appendChild(row);
         });
@@ -137,73 +169,62 @@ document.addEventListener("DOMContentLoaded", async() => {
         overallTime.textContent = formatTime(total);
     }
 
-     /**
-     * Handles the pause event by stopping interval and updating segment time.
+    /**
+     * Returns the elapsed time of a segment, extrapolated on the server clock while it runs.
      */
-    function handlePauseTimer(data) {
-        const segmentId = Number(data.segment_id);
-        if (overlayActiveTimers[segmentId]) {
-            clearInterval(overlayActiveTimers[segmentId]);
-            delete overlayActiveTimers[segmentId];
+    function currentElapsed(seg) {
+        let elapsed = Number(seg.elapsed_time || 0);
+        if (seg.started_at) {
+            const serverNow = Date.now() + clockOffset;
+            elapsed += Math.max(serverNow - new Date(seg.started_at).getTime(), 0) / 1000;
         }
+        return elapsed;
+    }
+
+    /**
+     * Applies the timer state of a start, pause or finish event to its segment.
+     */
+    function applyTimerState(data) {
         const seg = allSegments.find(s => Number(s.id) === Number(data.segment_id));
         if (seg) {
-            seg.elapsed_time = Number(data.elapsed_time);
-
-        const cell = document.querySelector(`[data-id="${segmentId}"]`);
-        if (cell) {
-            cell.dataset.timeRaw = seg.elapsed_time;
-            cell.textContent = formatTime(seg.elapsed_time);
-        }
+            seg.elapsed_time = Number(data.elapsed_time ?? seg.elapsed_time);
+            seg.started_at = data.started_at || null;
+            seg.is_finished = data.is_finished;
             renderSegmentList();
             updateOverall();
         }
     }
 
+    /**
+     * Handles the pause event by storing the time the server stopped the segment at.
+     */
+    function handlePauseTimer(data) {
+        applyTimerState(data);
+    }
 
     /**
-     * Handles finish event by stopping interval and marking the segment as completed.
+     * Handles finish event by storing the final time and marking the segment as completed.
      */
     function handleFinishTimer(data) {
-        const segmentId = Number(data.segment_id);
-
-        if (overlayActiveTimers[segmentId]) {
-            clearInterval(overlayActiveTimers[segmentId]);
-            delete overlayActiveTimers[segmentId];
-        }
-
-        const seg = allSegments.find(s => Number(s.id) === Number(data.segment_id));
-        if (seg) {
-            seg.elapsed_time = Number(data.elapsed_time ?? seg.elapsed_time);
-            seg.is_finished = true;
-            renderSegmentList();
-            updateOverall();
-        }
+        applyTimerState(data);
     }
 
     /**
-     * Starts the timer interval for a given segment and updates the display.
+     * Handles the start event. The segment is rendered from its start time by the render loop.
      */
     function handleStartTimer(data) {
-        const segmentId = Number(data.segment_id);
-        const startTime = new Date(data.started_at).getTime();
-        const baseElapsed = Number(data.elapsed_time || 0);
+        applyTimerState(data);
+    }
 
-        if (overlayActiveTimers[segmentId]) {
-            clearInterval(overlayActiveTimers[segmentId]);
+    /**
+     * Re-renders the segments while any of them is running.
+     */
+    setInterval(() => {
+        if (allSegments.some(seg => seg.started_at)) {
+            renderSegmentList();
+            updateOverall();
         }
-
-        overlayActiveTimers[segmentId] = setInterval(() => {
-            const elapsed = (Date.now() - startTime) / 1000 + baseElapsed;
-
-            const seg = allSegments.find(s => Number(s.id) === segmentId);
-            if (seg) {
-                seg.elapsed_time = elapsed;
-                renderSegmentList();
-                updateOverall();
-            }
-        },200);
-    }
+    }, 200);
 
     /**
      * Handles time formatting for MM:SS:TT
@@ -9,16 +9,32 @@ document.addEventListener("DOMContentLoaded", async() => {
     const socket = new WebSocket(
         `ws://` + window.location.host + `/ws/runs/${runId}/timer/?token=${token}`);
 
-    socket.onopen = () => console.log("WebSocket connected");
+    socket.onopen = () => {
+        console.log("WebSocket connected");
+        syncClock();
+    };
     socket.onerror = (e) => console.error("WebSocket error:", e);
     socket.onclose = (e) => console.warn("WebSocket closed:", e);
 
-    const activeTimers = {};
+    // Segment id -> {elapsed, startedAt}: seconds banked and the server time the running interval began.
+    const timers = {};
+    const clockSyncSamples = 5;
+    let clockOffset = 0;
+    let bestRoundTrip = Infinity;
+    let clockSyncRemaining = clockSyncSamples;
 
     socket.onmessage = (e) => {
         const data = JSON.parse(e.data);
 
         switch (data.type) {
+            case 'clock_sync':
+                handleClockSync(data);
+                break;
+
+            case 'timer_state':
+                data.segments.forEach(setTimerState);
+                break;
+
             case 'start_timer':
                 handleStartTimer(data);
                 break;
@@ -40,11 +56,85 @@ document.addEventListener("DOMContentLoaded", async() => {
                 recalculateOverall();
                 break;
 
+            case 'error':
+                console.error('[Timer WS] Error:', data.error);
+                break;
+
             default:
                 console.warn('[Timer WS] Unknown type:', data.type);
         }
     }
 
+    /**
+     * Sends clock_sync probes. Each reply is answered with the next probe.
+     */
+    function syncClock() {
+        socket.send(JSON.stringify({
+            type: 'clock_sync',
+            client_time: Date.now()
+        }));
+    }
+
+    /**
+     * Estimates the offset to the server clock from the probe with the shortest round trip,
+     * assuming the server read its clock halfway through it.
+     */
+    function handleClockSync(data) {
+        const now = Date.now();
+        const roundTrip = now - data.client_time;
+        if (roundTrip < bestRoundTrip) {
+            bestRoundTrip = roundTrip;
+            clockOffset = data.server_time + roundTrip / 2 - now;
+        }
+        if (--clockSyncRemaining > 0) syncClock();
+    }
+
+    /**
+     * Returns the current time on the server clock, in milliseconds.
+     */
+    function serverNow() {
+        return Date.now() + clockOffset;
+    }
+
+    /**
+     * Stores the state of a segment's timer sent by the server and renders it.
+     */
+    function setTimerState(data) {
+        const segmentId = data.segment_id;
+        timers[segmentId] = {
+            elapsed: Number(data.elapsed_time || 0),
+            startedAt: data.started_at ? new Date(data.started_at).getTime() : null
+        };
+        renderTimer(segmentId);
+        recalculateOverall();
+    }
+
+    /**
+     * Renders the time of a segment, extrapolating it from the start time while running.
+     */
+    function renderTimer(segmentId) {
+        const timer = timers[segmentId];
+        const timeCell = document.getElementById(`time-segment-${segmentId}`);
+        if (!timer || !timeCell) return;
+
+        let elapsed = timer.elapsed;
+        if (timer.startedAt !== null) {
+            elapsed += Math.max(serverNow() - timer.startedAt, 0) / 1000;
+        }
+        timeCell.textContent = formatTime(elapsed);
+        timeCell.dataset.timeRaw = `${elapsed}`;
+    }
+
+    /**
+     * Renders every running timer.
+     */
+    setInterval(() => {
+        const running = Object.keys(timers).filter(id => timers[id].startedAt !== null);
+        if (!running.length) return;
+        running.forEach(renderTimer);
+        recalculateOverall();
+    }, 100);
+
     /**
      * Renders a single segment row in the table.
      */
@@ -80,6 +170,7 @@ document.addEventListener("DOMContentLoaded", async() => {
         row.appendChild(timeCell);
         row.appendChild(controllerCell);
         tableBody.appendChild(row);
+        renderTimer(data.segment_id || data.id);
     }
 
     /**
@@ -127,241 +218,64 @@ document.addEventListener("DOMContentLoaded", async() => {
         const segmentId = e.target.dataset.id;
         if (!segmentId) return;
 
-        const now = new Date().toISOString();
-
-        if (e.target.classList.contains('start-btn')) {
-
-            const timeCell = document.getElementById(`time-segment-${segmentId}`)
-            const elapsed = parseFloat(timeCell.dataset.timeRaw || 0.0);
-            const now = new Date().toISOString();
-
-            socket.send(JSON.stringify({
-                type: 'start_timer',
-                segment_id: segmentId,
-                started_at: now,
-                elapsed_time: elapsed
-            }));
-        }
-
-        if (e.target.classList.contains('pause-btn')) {
-            const timeCell = document.getElementById(`time-segment-${segmentId}`)
-            const elapsed = parseFloat(timeCell.dataset.timeRaw);
-            socket.send(JSON.stringify({
-                type: 'pause_timer',
-                segment_id: segmentId,
-                elapsed_time: elapsed
-            }));
-        }
-
-        if (e.target.classList.contains('finish-btn')) {
-            const timeCell = document.getElementById(`time-segment-${segmentId}`);
-            const elapsed = parseFloat(timeCell.dataset.timeRaw || 0.0);
-            socket.send(JSON.stringify({
-                type: 'finish_timer',
-                segment_id: segmentId,
-                elapsed_time: elapsed
-            }));
-        }
+        const actions = {
+            'start-btn': 'start_timer',
+            'pause-btn': 'pause_timer',
+            'finish-btn': 'finish_timer'
+        };
+
+        Object.entries(actions).forEach(([buttonClass, type]) => {
+            if (e.target.classList.contains(buttonClass)) {
+                socket.send(JSON.stringify({
+                    type: type,
+                    segment_id: segmentId
+                }));
+            }
+        });
     }
 
     /**
-     * Starts a timer for a given segment.
-     * Sets up setInterval and updates the UI.
+     * Starts rendering a timer from the start time issued by the server.
      */
     function handleStartTimer(data) {
-        const segmentId = data.segment_id;
-        const timeCell = document.getElementById(`time-segment-${segmentId}`)
-        if (!timeCell) return;
-
-        if(activeTimers[segmentId]) {
-            clearInterval(activeTimers[segmentId]);
-        }
-
-        let startTimestamp = new Date(data.started_at).getTime();
-        let existingElapsed = parseFloat(timeCell.dataset.timeRaw || "0");
-        let baseElapsed = (typeof data.elapsed_time === 'number') ? data.elapsed_time : existingElapsed;
-
-        activeTimers[segmentId] = setInterval(() => {
-            const now = Date.now();
-            const elapsed = (now - startTimestamp) / 1000 + baseElapsed;
-            timeCell.textContent = formatTime(elapsed);
-            timeCell.dataset.timeRaw = `${elapsed}`;
-            recalculateOverall();
-        }, 100)
+        setTimerState(data);
     }
 
     /**
-     * Pauses a timer and sends updated elapsed_time to the backend via PATCH.
+     * Stops a timer at the time measured by the server. The server saves it.
      */
-    async function handlePauseTimer(data) {
-        const segmentId = data.segment_id;
-
-        if (activeTimers[segmentId]) {
-            clearInterval(activeTimers[segmentId]);
-            delete activeTimers[segmentId];
-        }
-
-        const timeCell = document.getElementById(`time-segment-${segmentId}`)
-        if (!timeCell) return;
-
-        const currentTime = parseFloat(timeCell.dataset.timeRaw || "0");
-        if (isNaN(currentTime)) return;
-
-        try {
-            const response = await fetch(`/api/runs/${runId}/timers/${segmentId}/`, {
-                method: 'PATCH',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${token}`
-                },
-                body: JSON.stringify({
-                    elapsed_time: currentTime
-                })
-            })
-            const responseData = await response.json();
-            if (!response.ok) {
-                const errorText = Object.values(responseData).flat().join(', ');
-                alert(`Error: ${errorText}`);
-                return;
-            }
-
-        } catch (err) {
-            console.error(err);
-            alert('Something went wrong. Try again.');
-        }
+    function handlePauseTimer(data) {
+        setTimerState(data);
     }
 
     /**
-     * Finishes a timer segment, clears interval, updates backend and UI.
+     * Finishes a timer segment at the time measured by the server and updates the UI.
+     * The server saves it.
      */
-    async function handleFinishTimer(data) {
-        const segmentId = data.segment_id;
-
-        if (activeTimers[segmentId]) {
-            clearInterval(activeTimers[segmentId]);
-            delete activeTimers[segmentId];
-        }
+    function handleFinishTimer(data) {
+        setTimerState(data);
 
-        const timeCell = document.getElementById(`time-segment-${segmentId}`);
+        const timeCell = document.getElementById(`time-segment-${data.segment_id}`);
         if (!timeCell) return;
 
-        const finalTime = parseFloat(timeCell.dataset.timeRaw || "0");
-        if (isNaN(finalTime)) return;
-
-        try {
-
-            const response = await fetch(`/api/runs/${runId}/timers/${segmentId}/`, {
-                method: 'PATCH',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${token}`
-                },
-                body: JSON.stringify({
-                    elapsed_time: finalTime,
-                    is_finished: true
-                })
-            });
-
-            const responseData = await response.json();
-            if (!response.ok) {
-                const errorText = Object.values(responseData).flat().join(', ');
-                alert(`Error: ${errorText}`);
-                return;
-            }
-
-            const row = timeCell.closest('tr');
-            const statusCell = row.querySelector('td:nth-child(2)');
-            const controllerCell = row.querySelector('td:nth-child(4)');
-
-            if (statusCell) statusCell.textContent = 'Finished';
-            if (controllerCell) controllerCell.innerHTML = '';
+        const row = timeCell.closest('tr');
+        const statusCell = row.querySelector('td:nth-child(2)');
+        const controllerCell = row.querySelector('td:nth-child(4)');
 
-        } catch (err) {
-            console.error(err);
-            alert('Something went wrong. Try again.');
-        }
+        if (statusCell) statusCell.textContent = 'Finished';
+        if (controllerCell) controllerCell.innerHTML = '';
     }
 
     /**
      * Finishes the entire run and all its segments.
-     * Updates backend and notifies all clients via WebSocket.
+     * The server stops running timers, saves the run and notifies all clients.
      */
-    async function finishRun() {
-        try {
-            const response = await fetch(`/api/runs/${runId}/`, {
-                method: 'PATCH',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${token}`
-                },
-                body: JSON.stringify({
-                    is_finished: true
-                })
-            });
-            const responseData = await response.json();
-
-            if (!response.ok) {
-                const errorText = Object.values(responseData).flat().join(', ');
-                alert(`Error: ${errorText}`);
-                return;
-            }
-
-            await closeAllSegments();
-
-            socket.send(JSON.stringify({
-                type: 'run_finished'
-            }));
-
-        } catch (err) {
-            console.error(err);
-            alert('Something went wrong. Try again.');
-        }
+    function finishRun() {
+        socket.send(JSON.stringify({
+            type: 'run_finished'
+        }));
     }
 
-    /**
-     * Closes all segment timers by sending PATCH with is_finished = true.
-     */
-    async function closeAllSegments() {
-        try {
-            const response = await fetch(`/api/runs/${runId}/timers/`, {
-                method: 'GET',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${token}`
-                }
-            });
-
-            const responseData = await response.json();
-
-            if (!response.ok) {
-                const errorText = Object.values(responseData).flat().join(', ');
-                alert(`Error: ${errorText}`);
-                return;
-            }
-
-            const finishCalls = responseData.map(async (segment) => {
-                return fetch(`/api/runs/${runId}/timers/${segment.id}/`, {
-                    method: 'PATCH',
-                    headers: {
-                        'Content-Type': 'application/json',
-                        'Authorization': `Bearer ${token}`
-                    },
-                    body: JSON.stringify({
-                        is_finished: true
-                    })
-                });
-            });
-
-            await Promise.all(finishCalls);
-
-        } catch (err) {
-            console.error(err);
-            alert('Something went wrong. Try again.');
-        }
-    }
-
-
-
     /**
      * Recalculates total elapsed time of all visible segments and updates UI.
      */
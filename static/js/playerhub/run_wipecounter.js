@@ -103,8 +103,9 @@ document.addEventListener("DOMContentLoaded", async () => {
 
     /**
      * Handles button clicks in the wipe counter table: increment, decrement, finish.
+     * Changes are sent over the WebSocket, which persists them on the server.
      */
-    async function wipecounterController(e) {
+    function wipecounterController(e) {
         const segmentRow = e.target.closest('tr');
         const segmentId = e.target.dataset.id;
 
@@ -112,113 +113,35 @@ document.addEventListener("DOMContentLoaded", async () => {
 
         if (e.target.classList.contains('btn-small')) {
             if (e.target.id === 'increment-btn') {
-                const countCell = segmentRow.querySelector('td:nth-child(3)');
-                const currentCount = parseInt(countCell.textContent);
-                const newCount = currentCount + 1
-
-                try {
-                    const response = await fetch(`/api/runs/${runId}/wipecounters/${segmentId}/`, {
-                    method: 'PATCH',
-                    headers: {
-                        'Content-Type': 'application/json',
-                        'Authorization': `Bearer ${token}`
-                    },
-                    body: JSON.stringify({
-                        count: newCount
-                    })
-                });
-                    const responseData = await response.json();
-
-                    if (!response.ok) {
-                        const errorText = Object.values(responseData).flat().join(', ');
-                        alert(`Error: ${errorText}`);
-                        return;
-                    }
-                    countCell.textContent = responseData.count;
-
-                    overallWipesCountCell.textContent = `${parseInt(overallWipesCountCell.textContent) + 1}`;
-
-                    socket.send(JSON.stringify({
-                        type: 'wipe_update',
-                        segment_id: segmentId,
-                        count: newCount,
-                    }));
-
-                    } catch (err) {
-                        console.error(err);
-                        alert('Something went wrong. Try again.');
-                    }
+                sendWipeIncrement(segmentId, 1);
             }
             if (e.target.id === 'decrement-btn') {
                 const countCell = segmentRow.querySelector('td:nth-child(3)');
-                const currentCount = parseInt(countCell.textContent);
-                if (currentCount === 0) return;
-                const newCount = currentCount - 1
-                try {
-                    const response = await fetch(`/api/runs/${runId}/wipecounters/${segmentId}/`, {
-                        method: 'PATCH',
-                        headers: {
-                            'Content-Type': 'application/json',
-                            'Authorization': `Bearer ${token}`
-                        },
-                        body: JSON.stringify({
-                        count: newCount
-                        })
-                    })
-                    const responseData = await response.json();
-                    if (!response.ok) {
-                        const errorText = Object.values(responseData).flat().join(', ');
-                        alert(`Error: ${errorText}`);
-                        return;
-                    }
-                    countCell.textContent = responseData.count;
-                    overallWipesCountCell.textContent = `${parseInt(overallWipesCountCell.textContent) - 1}`;
-
-                    socket.send(JSON.stringify({
-                        type: 'wipe_update',
-                        segment_id: segmentId,
-                        count: newCount,
-                    }));
-
-                } catch (err) {
-                    console.error(err);
-                    alert('Something went wrong. Try again.');
-                }
+                if (parseInt(countCell.textContent) === 0) return;
+                sendWipeIncrement(segmentId, -1);
             }
             if (e.target.id === 'finish-segment-btn') {
-                try {
-                    const response = await fetch(`/api/runs/${runId}/wipecounters/${segmentId}/`, {
-                        method: 'PATCH',
-                        headers: {
-                            'Content-Type': 'application/json',
-                            'Authorization': `Bearer ${token}`
-                        },
-                        body: JSON.stringify({
-                            is_finished: true
-                        })
-                    })
-
-                    const responseData = await response.json();
-                    if (!response.ok) {
-                        const errorText = Object.values(responseData).flat().join(', ');
-                        alert(`Error: ${errorText}`);
-                        return;
-                    }
-
-                    socket.send(JSON.stringify({
-                        type: 'segment_finished',
-                        segment_id: segmentId,
-                    }));
-
-                } catch (err) {
-                    console.error(err);
-                    alert('Something went wrong. Try again.');
-                }
+                socket.send(JSON.stringify({
+                    type: 'segment_finished',
+                    segment_id: segmentId,
+                }));
             }
         }
     }
 
 
+    /**
+     * Sends a relative change of a segment's wipe count. The server applies it
+     * atomically and broadcasts the resulting count as a wipe_update.
+     */
+    function sendWipeIncrement(segmentId, delta) {
+        socket.send(JSON.stringify({
+            type: 'wipe_increment',
+            segment_id: segmentId,
+            delta: delta,
+        }));
+    }
+
     /**
      * Sends a POST request to add a new segment to the table.
      */
@@ -262,87 +185,13 @@ document.addEventListener("DOMContentLoaded", async () => {
     }
 
     /**
-     * Sends a PATCH request to mark a run as finished.
-     */
-    async function finishRun() {
-        try {
-            const response = await fetch(`/api/runs/${runId}/`, {
-                method: 'PATCH',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${token}`
-                },
-                body: JSON.stringify({
-                    is_finished: true
-                })
-            });
-            const responseData = await response.json();
-
-            if (!response.ok) {
-                const errorText = Object.values(responseData).flat().join(', ');
-                alert(`Error: ${errorText}`);
-                return;
-            }
-
-            await closeAllSegments();
-            socket.send(JSON.stringify({
-                type: 'run_finished',
-            }));
-
-        } catch (err) {
-            console.error(err);
-            alert('Something went wrong. Try again.');
-        }
-    }
-
-
-    /**
-     * Sends a PATCH request to mark all segments connected with run as finished.
+     * Finishes the run. The server persists the finished run and its segments
+     * together with any wipe counts it has not written yet.
      */
-    async function closeAllSegments() {
-
-        try {
-            const response = await fetch(`/api/runs/${runId}/wipecounters/`, {
-            method: 'GET',
-            headers: {
-                'Content-Type': 'application/json',
-                'Authorization': `Bearer ${token}`
-            }
-        });
-            const responseData = await response.json();
-            if (!response.ok) {
-                const errorText = Object.values(responseData).flat().join(', ');
-                alert(`Error: ${errorText}`);
-                return;
-            }
-
-            // Changing status to 'finished' in all segments connected to the run
-            const finishRun = responseData.map(async(segment) => {
-                const response = await fetch(`/api/runs/${runId}/wipecounters/${segment.id}/`, {
-                    method: 'PATCH',
-                    headers: {
-                        'Content-Type': 'application/json',
-                        'Authorization': `Bearer ${token}`
-                    },
-                    body: JSON.stringify({
-                        is_finished: true
-                    })
-                });
-                    const responseData = await response.json();
-                    if (!response.ok) {
-                        const errorText = Object.values(responseData).flat().join(', ');
-                        alert(`Error: ${errorText}`);
-                        return;
-                    }
-            })
-
-            await Promise.all(finishRun);
-
-
-        } catch (err) {
-            console.error(err);
-            alert('Something went wrong. Try again.');
-        }
+    function finishRun() {
+        socket.send(JSON.stringify({
+            type: 'run_finished',
+        }));
     }
 
     function renderSegmentRow(data) {
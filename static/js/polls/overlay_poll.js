@@ -1,6 +1,8 @@
 document.addEventListener('DOMContentLoaded', () => {
     const overlayToken = window.location.pathname.split('/')[3];
-    const socket = new WebSocket(`ws://${window.location.host}/ws/polls/${overlayToken}/`);
+    const reconnectDelay = 2000;
+    let lastSeq = null;
+    let resumed = false;
 
     const questionEl = document.getElementById('overlay-question');
     const answersEl = document.getElementById('overlay-answers');
@@ -81,14 +83,38 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById('chart-wrapper').classList.remove('hidden');
     }
 
-    socket.onopen = () => console.log('WebSocket connected');
-    socket.onerror = (e) => console.error('WebSocket error:', e);
-    socket.onclose = (e) => console.warn('WebSocket closed:', e);
+    /**
+     * Opens the overlay socket. After the connection drops it reconnects with
+     * the last received sequence number, so the server replays missed events.
+     * The first frame after connecting is always applied, since it may be the
+     * published question resent after the event stream restarted.
+     */
+    function connect() {
+        resumed = false;
+        const since = lastSeq === null ? '' : `?since=${lastSeq}`;
+        const socket = new WebSocket(`ws://${window.location.host}/ws/polls/${overlayToken}/${since}`);
+
+        socket.onopen = () => console.log('WebSocket connected');
+        socket.onerror = (e) => console.error('WebSocket error:', e);
+        socket.onclose = (e) => {
+            console.warn('WebSocket closed:', e);
+            setTimeout(connect, reconnectDelay);
+        };
+        socket.onmessage = handleMessage;
+    }
 
-    socket.onmessage = (e) => {
+    function handleMessage(e) {
         try {
             const data = JSON.parse(e.data);
 
+            if (data.seq !== undefined) {
+                if (resumed && data.seq <= lastSeq) {
+                    return;
+                }
+                resumed = true;
+                lastSeq = data.seq;
+            }
+
             if (data.type === 'publish_question') {
                 const question = data.question_data;
 
@@ -120,4 +146,6 @@ document.addEventListener('DOMContentLoaded', () => {
             alert('Something went wrong. Try again.');
         }
     }
+
+    connect();
 })
\ No newline at end of file
@@ -4,6 +4,7 @@ document.addEventListener('DOMContentLoaded', async() => {
     const answersWrapper = document.getElementById('answers-wrapper');
     const addAnswerBtn = document.getElementById('add-answer');
     const submitBtn = document.getElementById('submit-question');
+    const allowVoteChangeInput = document.getElementById('allow-vote-change');
     const moderatorToken = window.location.pathname.split('/')[3];
 
 
@@ -25,6 +26,12 @@ document.addEventListener('DOMContentLoaded', async() => {
                 alert('Error: ' + data.error);
             }
 
+            if (data.type === 'questions_snapshot') {
+                data.questions
+                    .filter(q => !document.getElementById(q.id))
+                    .forEach(q => addQuestionToDom(q.id, q.question, q.answers));
+            }
+
             if (data.type === 'publish_question') {
                 document.querySelectorAll('.question').forEach(div => div.classList.remove('active'));
                 const el = document.getElementById(data.question_id);
@@ -96,7 +103,11 @@ document.addEventListener('DOMContentLoaded', async() => {
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({ question, answers})
+                body: JSON.stringify({
+                    question,
+                    answers,
+                    vote_mode: allowVoteChangeInput.checked ? 'change' : 'single'
+                })
             });
 
             if (!response.ok) {
@@ -107,6 +118,7 @@ document.addEventListener('DOMContentLoaded', async() => {
             const data = await response.json();
             addQuestionToDom(data.id, data.question, data.answers);
             questionInput.value = '';
+            allowVoteChangeInput.checked = false;
             answersWrapper.innerHTML = '';
             addAnswerBtn.click();
             addAnswerBtn.click();
@@ -2,17 +2,17 @@ document.addEventListener('DOMContentLoaded', async() => {
     const viewerToken = window.location.pathname.split('/')[3];
     const pollsContainer = document.getElementById('polls');
 
-    const voterIdKey = 'voter_id';
-    let voterId = localStorage.getItem(voterIdKey);
-    if (!voterId) {
-        voterId = crypto.randomUUID();
-        localStorage.setItem(voterIdKey, voterId);
-    }
+    // Signed identity issued by the server, used to count one vote per viewer
+    const voterTokenKey = 'voter_token';
+    const voterToken = localStorage.getItem(voterTokenKey);
+    const voterQuery = voterToken ? `?voter=${encodeURIComponent(voterToken)}` : '';
 
     const votedKey = 'voted_questions';
     const votedQuestions = JSON.parse(localStorage.getItem(votedKey) || '{}');
+    const changeableQuestions = {};
 
-    const socket = new WebSocket('ws://' + window.location.host + `/ws/polls/${viewerToken}/`);
+    const socket = new WebSocket(
+        'ws://' + window.location.host + `/ws/polls/${viewerToken}/${voterQuery}`);
     socket.onopen = () => console.log('WebSocket connected');
     socket.onerror = e => console.error('WebSocket connection error', e);
     socket.onclose = e => console.warn('WebSocket closed:', e);
@@ -20,13 +20,17 @@ document.addEventListener('DOMContentLoaded', async() => {
     socket.onmessage = e => {
         try {
             const data = JSON.parse(e.data);
+            if (data.type === 'voter_identity') {
+                localStorage.setItem(voterTokenKey, data.voter_token);
+            }
+
             if (data.type === 'error') {
                 console.error('Error occurred:', data.error);
                 alert('Error occurred: ' + (data.error.message || JSON.stringify(data.error)));
             }
 
-            if (data.type === 'new_question') {
-                renderQuestion(data.question);
+            if (data.type === 'questions_diff') {
+                data.questions.forEach(renderQuestion);
             }
 
             if (data.type === 'vote_update') {
@@ -65,7 +69,8 @@ document.addEventListener('DOMContentLoaded', async() => {
         const div = document.createElement('div');
         div.className = 'question-block';
         div.id = q.id;
-        const hasVoted = votedQuestions[q.id];
+        changeableQuestions[q.id] = q.vote_mode === 'change';
+        const hasVoted = votedQuestions[q.id] && !changeableQuestions[q.id];
 
         div.innerHTML = `
           <h3>${q.question}</h3>
@@ -92,7 +97,7 @@ document.addEventListener('DOMContentLoaded', async() => {
 
         inputs.forEach(input => {
             const qid = input.name.replace('q-', '');
-            if (!votedQuestions[qid]) {
+            if (!votedQuestions[qid] || changeableQuestions[qid]) {
             votes[qid] = input.value;
             }
         });
@@ -105,7 +110,6 @@ document.addEventListener('DOMContentLoaded', async() => {
         Object.entries(votes).forEach(([question_id, answer]) => {
             socket.send(JSON.stringify({
                 type: 'vote',
-                voter_id: voterId,
                 question_id,
                 answer
             }));
@@ -113,6 +117,7 @@ document.addEventListener('DOMContentLoaded', async() => {
 
         Object.keys(votes).forEach(qid => {
             votedQuestions[qid] = true
+            if (changeableQuestions[qid]) return;
             const questionDiv = document.getElementById(qid);
             if (questionDiv) {
                 questionDiv.innerHTML = `
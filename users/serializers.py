@@ -3,6 +3,11 @@ from django.contrib.auth.models import User
 from django.utils.http import urlsafe_base64_decode
 from django.utils.encoding import force_str
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from playerhub import revocation
 
 
 class CreateUserSerializer(serializers.ModelSerializer):
@@ -71,3 +76,34 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
     def save(self):
         self.user.set_password(self.validated_data['password'])
         self.user.save()
+
+
+class LogoutSerializer(serializers.Serializer):
+    """
+    Serializer for logging out.
+    Accepts the refresh token to revoke along with the access token of the request.
+    """
+    refresh = serializers.CharField(required=False)
+
+    def validate_refresh(self, value):
+        try:
+            token = RefreshToken(value)
+        except TokenError:
+            raise serializers.ValidationError("Invalid or expired token.")
+
+        user = self.context['request'].user
+        if str(token.get(api_settings.USER_ID_CLAIM)) != str(user.pk):
+            raise serializers.ValidationError("Invalid or expired token.")
+        return token
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Serializer for refreshing access tokens.
+    Rejects refresh tokens that were revoked on logout.
+    """
+
+    def validate(self, attrs):
+        if revocation.is_revoked(self.token_class(attrs['refresh'])):
+            raise InvalidToken('Token is revoked')
+        return super().validate(attrs)
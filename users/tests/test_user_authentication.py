@@ -146,3 +146,44 @@ def test_password_reset_confirm_invalid_token(client):
         'Password was reset with invalid token'
     assert 'Invalid or expired token' in str(response.data), \
         'Password was reset with invalid token'
+
+
+@pytest.mark.django_db
+def test_logout_revokes_tokens(client):
+    """
+    Test to ensure that logging out revokes the access and refresh tokens.
+
+    Expects both tokens to be rejected after a 200 OK logout response.
+    """
+    user = User.objects.create_user(username='logoutuser', password='testpass1234')
+    refresh = RefreshToken.for_user(user)
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {refresh.access_token}'}
+
+    assert client.get('/api/runs/', **headers).status_code == 200, 'User was not authenticated'
+
+    response = client.post('/api/logout/', {'refresh': str(refresh)}, **headers)
+    assert response.status_code == 200, 'User was not logged out'
+
+    assert client.get('/api/runs/', **headers).status_code == 401, \
+        'Revoked access token was accepted'
+    response = client.post('/api/token/refresh/', {'refresh': str(refresh)})
+    assert response.status_code == 401, 'Revoked refresh token was accepted'
+
+
+@pytest.mark.django_db
+def test_logout_foreign_refresh_token(client):
+    """
+    Test to ensure that users cannot revoke refresh tokens of other users.
+
+    Expects a 400 Bad Request response and the token to remain valid.
+    """
+    user = User.objects.create_user(username='logoutuser', password='testpass1234')
+    other = User.objects.create_user(username='otheruser', password='testpass1234')
+    refresh = RefreshToken.for_user(other)
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    response = client.post('/api/logout/', {'refresh': str(refresh)}, **headers)
+    assert response.status_code == 400, 'Foreign refresh token was revoked'
+
+    response = client.post('/api/token/refresh/', {'refresh': str(refresh)})
+    assert response.status_code == 200, 'Refresh token was revoked'
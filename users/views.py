@@ -1,8 +1,8 @@
 from rest_framework import generics
-from .serializers import (CreateUserSerializer, PasswordResetRequestSerializer,
-                          PasswordResetConfirmSerializer)
+from .serializers import (CreateUserSerializer, LogoutSerializer, PasswordResetRequestSerializer,
+                          PasswordResetConfirmSerializer, RevocableTokenRefreshSerializer)
 from django.contrib.auth.views import TemplateView
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -11,6 +11,8 @@ from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.core.mail import send_mail
+from rest_framework_simplejwt.views import TokenRefreshView
+from playerhub import revocation
 
 
 class RegisterView(generics.CreateAPIView):
@@ -74,6 +76,35 @@ class PasswordResetConfirmView(GenericAPIView):
         )
 
 
+class LogoutView(GenericAPIView):
+    """
+    View to log out by revoking the access token of the request and,
+    if given, the refresh token, so neither is accepted again.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = LogoutSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        revocation.revoke(request.auth)
+        if 'refresh' in serializer.validated_data:
+            revocation.revoke(serializer.validated_data['refresh'])
+
+        return Response({
+            'message': 'Logged out.'},
+            status=status.HTTP_200_OK
+        )
+
+
+class RevocableTokenRefreshView(TokenRefreshView):
+    """
+    View to refresh access tokens, rejecting refresh tokens revoked on logout.
+    """
+    serializer_class = RevocableTokenRefreshSerializer
+
+
 class RegisterPageView(TemplateView):
     """
     View to render a registration form.
@@ -30,6 +30,28 @@ ALLOWED_HOSTS = []
 
 DJANGO_SECRET_KEY = config('DJANGO_SECRET_KEY')
 REDIS_URL = config('REDIS_URL', default='redis://127.0.0.1:6379/0')
+REDIS_MAX_CONNECTIONS = config('REDIS_MAX_CONNECTIONS', default=50, cast=int)
+REDIS_POOL_TIMEOUT = config('REDIS_POOL_TIMEOUT', default=5, cast=float)
+POLL_VOTE_FLUSH_INTERVAL = config('POLL_VOTE_FLUSH_INTERVAL', default=0.2, cast=float)
+POLL_TOKEN_CACHE_SIZE = config('POLL_TOKEN_CACHE_SIZE', default=10000, cast=int)
+POLL_TOKEN_CACHE_TTL = config('POLL_TOKEN_CACHE_TTL', default=60, cast=float)
+USER_CACHE_SIZE = config('USER_CACHE_SIZE', default=10000, cast=int)
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=30, cast=float)
+TOKEN_REVOCATION_REFRESH_INTERVAL = config(
+    'TOKEN_REVOCATION_REFRESH_INTERVAL', default=5.0, cast=float)
+TOKEN_REVOCATION_BLOOM_CAPACITY = config(
+    'TOKEN_REVOCATION_BLOOM_CAPACITY', default=100000, cast=int)
+TOKEN_REVOCATION_BLOOM_ERROR_RATE = config(
+    'TOKEN_REVOCATION_BLOOM_ERROR_RATE', default=0.001, cast=float)
+RUN_SNAPSHOT_TTL = config('RUN_SNAPSHOT_TTL', default=300, cast=int)
+RUN_OWNER_CACHE_TTL = config('RUN_OWNER_CACHE_TTL', default=3600, cast=int)
+EVENT_STREAM_LENGTH = config('EVENT_STREAM_LENGTH', default=200, cast=int)
+EVENT_STREAM_TTL = config('EVENT_STREAM_TTL', default=86400, cast=int)
+OVERLAY_OUTBOX_SIZE = config('OVERLAY_OUTBOX_SIZE', default=100, cast=int)
+WIPE_COUNT_FLUSH_INTERVAL = config('WIPE_COUNT_FLUSH_INTERVAL', default=1.0, cast=float)
+TIMER_STATE_TTL = config('TIMER_STATE_TTL', default=604800, cast=int)
+TIMER_FLUSH_INTERVAL = config('TIMER_FLUSH_INTERVAL', default=1.0, cast=float)
+JSON_CODEC = config('JSON_CODEC', default='orjson')
 
 
 # Application definition
@@ -62,8 +84,17 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'playerhub.authentication.RevocableJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'playerhub.renderers.CodecJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'playerhub.renderers.CodecJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
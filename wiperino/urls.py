@@ -3,7 +3,7 @@ from django.urls import path
 from playerhub import views as playerhub_views
 from playerhub.views import PollQuestionsListView
 from users import views as users_views
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenObtainPairView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -15,6 +15,8 @@ urlpatterns = [
          playerhub_views.WipeCounterListView.as_view(), name='api-wipecounters'),
     path('api/runs/<int:run_id>/wipecounters/<int:wipecounter_id>/',
          playerhub_views.WipeCounterView.as_view(), name='api-wipecounter'),
+    path('api/runs/<int:run_id>/wipecounters/<int:wipecounter_id>/increment/',
+         playerhub_views.WipeCounterIncrementView.as_view(), name='api-wipecounter-increment'),
     path('api/runs/<int:run_id>/timers/',
          playerhub_views.TimerListView.as_view(), name='api-timers'),
     path('api/runs/<int:run_id>/timers/<int:timer_id>/',
@@ -44,12 +46,18 @@ urlpatterns = [
     # API endpoints - user authorization
     path('api/register/', users_views.RegisterView.as_view(), name='api-register'),
     path('api/login/', TokenObtainPairView.as_view(), name='api-login'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='api-token-refresh'),
+    path('api/token/refresh/',
+         users_views.RevocableTokenRefreshView.as_view(), name='api-token-refresh'),
+    path('api/logout/', users_views.LogoutView.as_view(), name='api-logout'),
     path('api/password-reset-request/',
          users_views.PasswordResetRequestView.as_view(), name='api-password-reset-request'),
     path('api/password-reset-confirm/',
          users_views.PasswordResetConfirmView.as_view(), name='api-password-reset-confirm'),
 
+    # Metrics
+    path('api/metrics/overlay-outbox/',
+         playerhub_views.OverlayOutboxMetricsView.as_view(), name='overlay-outbox-metrics'),
+
     # Export Functions
     path('api/runs/<int:run_id>/export/',
          playerhub_views.RunExportView.as_view(), name='run-export'),